@@ -0,0 +1,157 @@
+"""Admission control for /api/analyze: a bounded inference queue with deadlines.
+
+Inference runs on a small thread pool (SKINTAG_INFERENCE_CONCURRENCY, default
+1: one SigLIP forward already uses every core), so the event loop stays free
+to accept, shed and answer health checks while a forward pass runs. Requests
+then wait for an inference slot in arrival order, and are shed instead of
+piling up:
+
+    queue_full     more than SKINTAG_MAX_QUEUE requests already waiting -> 429
+                   with a Retry-After estimated from recent service times
+    deadline       no slot before the request's deadline -> 503; the deadline
+                   is SKINTAG_DEADLINE_S after arrival, or sooner if the client
+                   sends X-Deadline-Ms
+    disconnected   the client went away while waiting -> 499, no forward pass
+
+Shed requests are counted in skintag_shed_total{reason}; the waiting count is
+the skintag_queue_depth gauge.
+
+    admission.check_queue(request)      # before reading the upload
+    async with admission.slot(request):
+        result = await admission.run(predict, image)
+"""
+
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from app import metrics
+
+CLIENT_DEADLINE_HEADER = "x-deadline-ms"
+
+
+class AdmissionController:
+    """Bounded FIFO of requests waiting for one of `concurrency` inference slots.
+
+    All bookkeeping happens on the event loop, so plain counters suffice.
+    """
+
+    def __init__(self, concurrency: int = 1, max_queue: int = 16, deadline_s: float = 10.0,
+                 poll_s: float = 0.1):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.deadline_s = deadline_s
+        self.poll_s = poll_s  # how often waiting requests check for a disconnected client
+        self.waiting = 0
+        self.running = 0
+        self.service_s = 0.5  # moving average of slot hold time, for Retry-After
+        self._semaphore = None
+        self._executor = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(concurrency=int(os.getenv("SKINTAG_INFERENCE_CONCURRENCY", "1")),
+                   max_queue=int(os.getenv("SKINTAG_MAX_QUEUE", "16")),
+                   deadline_s=float(os.getenv("SKINTAG_DEADLINE_S", "10")))
+
+    def _ensure_started(self):
+        # Per process: scripts/serve.py forks workers after importing the app
+        if self._pid != os.getpid():
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="skintag-inference")
+            self._pid = os.getpid()
+
+    def _deadline(self, request) -> float:
+        """perf_counter() time by which inference must have started."""
+        arrived = request.scope.get("state", {}).get("metrics_start") or time.perf_counter()
+        budget = self.deadline_s
+        client_ms = request.headers.get(CLIENT_DEADLINE_HEADER)
+        if client_ms:
+            try:
+                budget = min(budget, float(client_ms) / 1000)
+            except ValueError:
+                pass
+        return arrived + budget
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have cleared."""
+        backlog = self.waiting + self.running
+        return max(1, math.ceil(backlog * self.service_s / self.concurrency))
+
+    def _shed(self, request, reason: str, status: int, detail: str, headers=None):
+        metrics.shed_total.inc(reason)
+        metrics.set_error(request, f"shed_{reason}")
+        raise HTTPException(status_code=status, detail=detail, headers=headers)
+
+    def check_queue(self, request):
+        """Shed with 429 if the queue is full.
+
+        Called before the upload is read, so a shed request costs no body
+        parsing; slot() checks again once the body is in.
+        """
+        if self.waiting >= self.max_queue:
+            self._shed(request, "queue_full", 429, "Server busy, try again shortly",
+                       headers={"Retry-After": str(self.retry_after())})
+
+    @asynccontextmanager
+    async def slot(self, request):
+        """Hold an inference slot for the body of the block, or shed the request."""
+        self._ensure_started()
+        self.check_queue(request)
+
+        deadline = self._deadline(request)
+        self.waiting += 1
+        # One acquire() for the whole wait keeps the request's place in line
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            while not acquire.done():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._shed(request, "deadline", 503, "Request could not be started before its deadline",
+                               headers={"Retry-After": str(self.retry_after())})
+                await asyncio.wait({acquire}, timeout=min(remaining, self.poll_s))
+                if not acquire.done() and await request.is_disconnected():
+                    self._shed(request, "disconnected", 499, "Client disconnected")
+        except BaseException:
+            if acquire.done() and not acquire.cancelled():
+                self._semaphore.release()
+            else:
+                acquire.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+
+        start = time.perf_counter()
+        self.running += 1
+        try:
+            if await request.is_disconnected():
+                self._shed(request, "disconnected", 499, "Client disconnected")
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+            self.service_s = 0.8 * self.service_s + 0.2 * (time.perf_counter() - start)
+
+    async def run(self, fn, *args):
+        """Run blocking inference on the inference threads."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def idle(self) -> bool:
+        """No request running or waiting (read from other threads, e.g. app/shadow.py)."""
+        return self.running == 0 and self.waiting == 0
+
+    def status(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "running": self.running,
+            "max_queue": self.max_queue,
+            "concurrency": self.concurrency,
+            "deadline_s": self.deadline_s,
+            "service_ms": round(self.service_s * 1000, 1),
+        }
@@ -18,19 +18,26 @@ APP_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = APP_DIR.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
-import io
+import hmac
 import pickle
+import threading
+import time
 import yaml
 import torch
 import numpy as np
 from PIL import Image
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import UploadFile
 
 from src.model.embeddings import EmbeddingExtractor
 from src.model.triage import TriageSystem
 from src.utils.model_hub import download_model_from_hf, download_e2e_model_from_hf, get_model_config
+from app import metrics
+from app.admission import AdmissionController
+from app.registry import ModelRegistry, ModelVersion, artifact_fingerprint
 
 app = FastAPI(title="SkinTag", description="AI-powered skin lesion triage screening tool")
 
@@ -43,33 +50,210 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global state (loaded on startup)
+# Per-stage latency, request / error counters and in-flight gauges (GET /metrics)
+app.add_middleware(metrics.AnalyzeMetricsMiddleware, mode_fn=lambda: _inference_mode())
+
+# Loaded model versions; requests lease the active one (see app/registry.py)
+registry = ModelRegistry()
+_reload_lock = threading.Lock()
+
+# Bounded inference queue for /api/analyze (see app/admission.py)
+admission = AdmissionController.from_env()
+
+# Global state (loaded in the background after startup)
 _state = {
-    "extractor": None,
-    "classifier": None,
-    "condition_classifier": None,  # 10-class condition estimator
-    "e2e_model": None,  # End-to-end fine-tuned model (if available)
     "triage": None,
     "config": None,
-    "inference_mode": None,  # "e2e" or "embedding+head"
+    "profiler": None,  # BatchProfiler over /api/analyze requests (SKINTAG_PROFILE=analyze)
+    "phase": "starting",  # see PHASES
+    "load_error": None,
+    "started_at": time.time(),
+    "reload": None,  # last hot reload: status, version / error
+    "shadow": None,  # ShadowEvaluator for a candidate model (SKINTAG_SHADOW_DIR)
 }
 
+# Loading phases, in order. /api/analyze serves from "degraded" on (binary
+# result only until the condition classifier is in); /api/ready turns 200 at "ready".
+PHASES = ("starting", "loading", "degraded", "warming", "ready")
+SERVING_PHASES = ("degraded", "warming", "ready")
+
 
 @app.on_event("startup")
-async def load_models():
-    """Load models and config on server startup.
+async def start_loading():
+    """Start loading models in a background thread so the server answers at once.
+
+    /api/live responds immediately; /api/ready reports the loading phase.
+    """
+    metrics.install()
+    watch_interval = float(os.getenv("SKINTAG_WATCH_MODELS", "0"))
+    if watch_interval > 0:
+        threading.Thread(target=_watch_models, args=(watch_interval,),
+                         name="skintag-model-watcher", daemon=True).start()
+    if _state["phase"] == "ready":
+        # Loaded before this worker was forked (scripts/serve.py); the weights
+        # are shared copy-on-write with the other workers
+        return
+    threading.Thread(target=load_models, name="skintag-model-loader", daemon=True).start()
+
+
+def load_models():
+    """Load config and models (blocking), advancing _state["phase"].
 
     Downloads models from Hugging Face Hub if enabled, otherwise loads from local cache.
     Prefers fine-tuned end-to-end model if available (better accuracy),
-    falls back to embedding extractor + classifier head.
+    falls back to embedding extractor + classifier head. The binary model comes
+    first so requests can be served (degraded) while the condition classifier
+    loads; a warmup forward pass precedes "ready".
+    """
+    try:
+        _state["phase"] = "loading"
+        config_path = PROJECT_ROOT / "configs" / "config.yaml"
+        with open(config_path) as f:
+            _state["config"] = yaml.safe_load(f)
+
+        # Load triage system
+        triage_config = _state["config"].get("triage", {})
+        _state["triage"] = TriageSystem(triage_config)
+
+        device, cache_dir, embedding_model = _model_sources()
+        model, hf_source = _load_primary_model(device, cache_dir, embedding_model)
+        model.version = registry.next_version(model.fingerprint)
+        registry.activate(model)
+        _state["phase"] = "degraded"
+        print(f"Serving binary results (inference mode: {model.inference_mode}); "
+              f"loading condition classifier...")
+
+        _load_condition_classifier(model, cache_dir, hf_source)
+        _state["phase"] = "warming"
+        _warmup(model)
+        _state["phase"] = "ready"
+        print(f"Triage system ready (model {model.version}, inference mode: {model.inference_mode}, "
+              f"{time.time() - _state['started_at']:.1f}s after start)")
+        _load_shadow()
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        _state["load_error"] = f"{type(e).__name__}: {e}"
+        _state["phase"] = "failed"
+        print(f"Model loading failed: {_state['load_error']}")
+
+
+def reload_models(cache_dir=None, embedding_model=None) -> ModelVersion:
+    """Load a new model version next to the active one, warm it up and swap it in.
+
+    The active version keeps serving throughout; requests already running
+    finish on it and it is released once they have drained. Raises if the new
+    version cannot be loaded, leaving the active version in place.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        raise RuntimeError("A model reload is already in progress")
+    try:
+        start = time.time()
+        _state["reload"] = {"status": "loading", "started_at": start}
+        device, default_cache_dir, default_embedding_model = _model_sources()
+        cache_dir = Path(cache_dir) if cache_dir else default_cache_dir
+        model, hf_source = _load_primary_model(device, cache_dir, embedding_model or default_embedding_model)
+        if not model.model_loaded:
+            raise RuntimeError(f"No trained model found for {model.source}")
+        _load_condition_classifier(model, cache_dir, hf_source)
+        _warmup(model)
+        model.version = registry.next_version(model.fingerprint)
+        registry.activate(model)
+        metrics.model_reloads_total.inc("ok")
+        _state["reload"] = {"status": "done", "version": model.version, "seconds": round(time.time() - start, 2)}
+        return model
+    except Exception as e:
+        metrics.model_reloads_total.inc("failed")
+        _state["reload"] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+        raise
+    finally:
+        _reload_lock.release()
+
+
+def _watch_models(interval: float):
+    """Hot-reload when the local model artifacts change (SKINTAG_WATCH_MODELS=<seconds>).
+
+    A change must look the same on two consecutive polls before it triggers,
+    so files still being copied in are not loaded half-written.
     """
-    config_path = PROJECT_ROOT / "configs" / "config.yaml"
-    with open(config_path) as f:
-        _state["config"] = yaml.safe_load(f)
+    pending = failed = None
+    while True:
+        time.sleep(interval)
+        current = registry.current
+        if _state["phase"] != "ready" or current is None or current.source.startswith("hf:"):
+            continue
+        _, cache_dir, _ = _model_sources()
+        fingerprint = artifact_fingerprint(cache_dir)
+        if fingerprint in (current.fingerprint, failed):
+            pending = None
+            continue
+        if fingerprint != pending:
+            pending = fingerprint
+            continue
+        print(f"Model artifacts in {cache_dir} changed; reloading")
+        pending = None
+        try:
+            reload_models()
+        except Exception as e:
+            failed = fingerprint
+            print(f"Model reload failed (still serving {current.version}): {e}")
 
-    cache_dir = PROJECT_ROOT / "results" / "cache"
+
+def _model_sources():
+    """(device, cache_dir, embedding_model) for loading models."""
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    use_hf = os.getenv("USE_HF_MODELS", "false").lower() in ("true", "1", "yes")
+    # SKINTAG_CACHE_DIR / SKINTAG_EMBEDDING_MODEL point the server at other local
+    # artifacts, e.g. the tiny stand-in model used by scripts/load_test.py
+    cache_dir = Path(os.getenv("SKINTAG_CACHE_DIR", PROJECT_ROOT / "results" / "cache"))
+    embedding_model = os.getenv("SKINTAG_EMBEDDING_MODEL", _state["config"]["model"]["name"])
+    return device, cache_dir, embedding_model
+
+
+def _load_shadow():
+    """Load the candidate model from SKINTAG_SHADOW_DIR for shadow evaluation, if set.
+
+    SKINTAG_SHADOW_DIR has the results/cache layout (fine-tuned model or
+    classifier pickles); SKINTAG_SHADOW_SAMPLE is the fraction of requests
+    copied to it and SKINTAG_SHADOW_LOG the log path. A shadow that fails to
+    load is reported and skipped.
+    """
+    shadow_dir = os.getenv("SKINTAG_SHADOW_DIR")
+    if not shadow_dir:
+        return
+    from app.registry import fingerprint_digest
+    from app.shadow import ShadowEvaluator
+
+    try:
+        device, _, embedding_model = _model_sources()
+        model, _ = _load_primary_model(device, Path(shadow_dir),
+                                       os.getenv("SKINTAG_SHADOW_EMBEDDING_MODEL", embedding_model), use_hf=False)
+        if not model.model_loaded:
+            raise RuntimeError(f"No trained model found in {shadow_dir}")
+        _load_condition_classifier(model, Path(shadow_dir), None)
+        _warmup(model, n_passes=1)
+        model.version = f"shadow-{fingerprint_digest(model.fingerprint)}"
+        log_path = os.getenv("SKINTAG_SHADOW_LOG", PROJECT_ROOT / "results" / "shadow" / "shadow_log.jsonl")
+        _state["shadow"] = ShadowEvaluator(model, _shadow_predict, log_path,
+                                           sample_rate=float(os.getenv("SKINTAG_SHADOW_SAMPLE", "0.1")),
+                                           idle_fn=admission.idle)
+        print(f"Shadow model {model.version} ({model.inference_mode}) logging to {log_path}")
+    except Exception as e:
+        print(f"Shadow model not loaded: {type(e).__name__}: {e}")
+
+
+def _load_primary_model(device, cache_dir, embedding_model, use_hf=None):
+    """Load the binary model from the HF Hub (USE_HF_MODELS) or the local cache.
+
+    The SigLIP extractor of an embedding+head model is loaded eagerly when
+    there is a classifier to serve.
+
+    Returns:
+        (ModelVersion without a version id yet, hf_source): hf_source is a dict
+        with the HF repo details and model_dir when loaded from the Hub (where
+        the condition classifier is looked up next), else None
+    """
+    if use_hf is None:
+        use_hf = os.getenv("USE_HF_MODELS", "false").lower() in ("true", "1", "yes")
 
     # Download from Hugging Face if enabled
     if use_hf:
@@ -78,6 +262,8 @@ async def load_models():
             model_config = get_model_config()
             repo_id = model_config["repo_id"]
             revision = model_config.get("revision")
+            model_dir = None
+            model = ModelVersion(version=None, source=f"hf:{repo_id}@{revision or 'main'}")
 
             # Try loading fine-tuned end-to-end model first (best accuracy)
             try:
@@ -87,8 +273,8 @@ async def load_models():
                     revision=revision,
                     cache_subdir="skintag"
                 )
-                _state["e2e_model"] = EndToEndClassifier.load_for_inference(str(model_dir), device=device)
-                _state["inference_mode"] = "e2e"
+                model.e2e_model = EndToEndClassifier.load_for_inference(str(model_dir), device=device)
+                model.inference_mode = "e2e"
                 print(f"✓ Loaded fine-tuned model from HF: {repo_id} (device={device})")
 
             except Exception as e:
@@ -102,130 +288,266 @@ async def load_models():
                     cache_subdir="skintag"
                 )
                 with open(classifier_path, "rb") as f:
-                    _state["classifier"] = pickle.load(f)
+                    model.classifier = pickle.load(f)
                 print(f"✓ Loaded classifier from HF: {classifier_path.name}")
 
-                _state["extractor"] = EmbeddingExtractor(device=device)
-                _state["inference_mode"] = "embedding+head"
-
-            # Load condition classifier -- check co-downloaded Misc/ files first, then separate download
-            if _state["inference_mode"] == "e2e":
-                for cond_name in ["xgboost_finetuned_condition.pkl", "xgboost_finetuned_binary.pkl"]:
-                    misc_cond = Path(model_dir) / "Misc" / cond_name
-                    if misc_cond.exists():
-                        with open(misc_cond, "rb") as f:
-                            _state["condition_classifier"] = pickle.load(f)
-                        print(f"✓ Loaded condition classifier: {misc_cond.name}")
-                        break
-            if _state["condition_classifier"] is None:
-                try:
-                    cond_path = download_model_from_hf(
-                        repo_id=repo_id,
-                        filename=model_config["condition_classifier_filename"],
-                        revision=revision,
-                        cache_subdir="skintag"
-                    )
-                    with open(cond_path, "rb") as f:
-                        _state["condition_classifier"] = pickle.load(f)
-                    print(f"✓ Loaded condition classifier from HF: {cond_path.name}")
-                except Exception as e:
-                    print(f"Condition classifier not available: {e}")
-
-            print(f"✓ Models loaded from Hugging Face (mode={_state['inference_mode']}, device={device})")
+                model.extractor = EmbeddingExtractor(device=device).load_model()
+                model.inference_mode = "embedding+head"
+
+            print(f"✓ Models loaded from Hugging Face (mode={model.inference_mode}, device={device})")
+            model.fingerprint = (repo_id, revision, str(model_dir))
+            return model, {"model_config": model_config, "repo_id": repo_id, "revision": revision, "model_dir": model_dir}
 
         except Exception as e:
             print(f"Failed to load from Hugging Face: {e}")
             print("Falling back to local cache...")
-            use_hf = False
 
     # Load from local cache
-    if not use_hf:
-        # Try loading fine-tuned end-to-end model first
-        # Check v2 path (siglip_finetuned subdir), then v1 path
-        e2e_dir = cache_dir / "finetuned_model"
-        v2_dir = e2e_dir / "siglip_finetuned"
-        if (v2_dir / "config.json").exists():
-            e2e_dir = v2_dir
-        if (e2e_dir / "config.json").exists():
+    model = ModelVersion(version=None, source=str(cache_dir), fingerprint=artifact_fingerprint(cache_dir))
+    # Try loading fine-tuned end-to-end model first
+    # Check v2 path (siglip_finetuned subdir), then v1 path
+    e2e_dir = cache_dir / "finetuned_model"
+    v2_dir = e2e_dir / "siglip_finetuned"
+    if (v2_dir / "config.json").exists():
+        e2e_dir = v2_dir
+    if (e2e_dir / "config.json").exists():
+        try:
+            from src.model.deep_classifier import EndToEndClassifier
+            model.e2e_model = EndToEndClassifier.load_for_inference(str(e2e_dir), device=device)
+            model.inference_mode = "e2e"
+            print(f"Loaded fine-tuned end-to-end model from {e2e_dir}")
+        except Exception as e:
+            print(f"Failed to load e2e model: {e}, falling back to embedding+head")
+
+    # Fall back to embedding extractor + pickled classifier
+    if model.inference_mode is None:
+        for model_name in ["classifier_multitask.pkl",
+                            "classifier_deep_mlp.pkl", "classifier_logistic_regression.pkl",
+                            "classifier_deep.pkl", "classifier_logistic.pkl", "classifier.pkl"]:
+            model_path = cache_dir / model_name
+            if model_path.exists():
+                with open(model_path, "rb") as f:
+                    model.classifier = pickle.load(f)
+                print(f"Loaded classifier: {model_name}")
+                break
+
+        if model.classifier is None:
+            print("WARNING: No trained classifier found. Set USE_HF_MODELS=true or run train.py first.")
+
+        model.extractor = EmbeddingExtractor(model_name=embedding_model, device=device)
+        if model.classifier is not None:
+            model.extractor.load_model()  # otherwise loaded by the first request
+        model.inference_mode = "embedding+head"
+        print(f"Embedding extractor ready (device={device})")
+    return model, None
+
+
+def _load_condition_classifier(model, cache_dir, hf_source):
+    """Load the separate 10-class condition classifier, if the primary model needs one."""
+    if hf_source is not None:
+        # Check co-downloaded Misc/ files first, then separate download
+        if _has_joint_condition_head(model):
+            print("✓ Primary model has a condition head (separate condition classifier not needed)")
+        elif model.inference_mode == "e2e":
+            for cond_name in ["xgboost_finetuned_condition.pkl", "xgboost_finetuned_binary.pkl"]:
+                misc_cond = Path(hf_source["model_dir"]) / "Misc" / cond_name
+                if misc_cond.exists():
+                    with open(misc_cond, "rb") as f:
+                        model.condition_classifier = pickle.load(f)
+                    print(f"✓ Loaded condition classifier: {misc_cond.name}")
+                    break
+        if model.condition_classifier is None and not _has_joint_condition_head(model):
             try:
-                from src.model.deep_classifier import EndToEndClassifier
-                _state["e2e_model"] = EndToEndClassifier.load_for_inference(str(e2e_dir), device=device)
-                _state["inference_mode"] = "e2e"
-                print(f"Loaded fine-tuned end-to-end model from {e2e_dir}")
+                cond_path = download_model_from_hf(
+                    repo_id=hf_source["repo_id"],
+                    filename=hf_source["model_config"]["condition_classifier_filename"],
+                    revision=hf_source["revision"],
+                    cache_subdir="skintag"
+                )
+                with open(cond_path, "rb") as f:
+                    model.condition_classifier = pickle.load(f)
+                print(f"✓ Loaded condition classifier from HF: {cond_path.name}")
             except Exception as e:
-                print(f"Failed to load e2e model: {e}, falling back to embedding+head")
-
-        # Fall back to embedding extractor + pickled classifier
-        if _state["inference_mode"] is None:
-            for model_name in ["classifier_deep_mlp.pkl", "classifier_logistic_regression.pkl",
-                                "classifier_deep.pkl", "classifier_logistic.pkl", "classifier.pkl"]:
-                model_path = cache_dir / model_name
-                if model_path.exists():
-                    with open(model_path, "rb") as f:
-                        _state["classifier"] = pickle.load(f)
-                    print(f"Loaded classifier: {model_name}")
-                    break
+                print(f"Condition classifier not available: {e}")
+        return
 
-            if _state["classifier"] is None:
-                print("WARNING: No trained classifier found. Set USE_HF_MODELS=true or run train.py first.")
-
-            _state["extractor"] = EmbeddingExtractor(device=device)
-            _state["inference_mode"] = "embedding+head"
-            print(f"Embedding extractor ready (device={device})")
-
-        # Load condition classifier (10-class) -- check v2 paths first
-        cond_candidates = [
-            cache_dir / "finetuned_model" / "classifiers" / "xgboost_finetuned_condition.pkl",
-            cache_dir / "finetuned_model" / "classifiers" / "xgboost_condition.pkl",
-            cache_dir / "classifier_condition.pkl",
-        ]
-        for cond_path in cond_candidates:
-            if cond_path.exists():
-                with open(cond_path, "rb") as f:
-                    _state["condition_classifier"] = pickle.load(f)
-                print(f"Loaded condition classifier: {cond_path}")
-                break
-        else:
+    # Load condition classifier (10-class) -- check v2 paths first.
+    # Skipped when the primary model already predicts conditions jointly.
+    cond_candidates = [
+        cache_dir / "finetuned_model" / "classifiers" / "xgboost_finetuned_condition.pkl",
+        cache_dir / "finetuned_model" / "classifiers" / "xgboost_condition.pkl",
+        cache_dir / "classifier_condition.pkl",
+    ]
+    if _has_joint_condition_head(model):
+        cond_candidates = []
+        print("Primary model has a condition head (separate condition classifier not needed)")
+    for cond_path in cond_candidates:
+        if cond_path.exists():
+            with open(cond_path, "rb") as f:
+                model.condition_classifier = pickle.load(f)
+            print(f"Loaded condition classifier: {cond_path}")
+            break
+    else:
+        if not _has_joint_condition_head(model):
             print("No condition classifier found (condition estimation disabled)")
 
-    # Load triage system
-    triage_config = _state["config"].get("triage", {})
-    _state["triage"] = TriageSystem(triage_config)
-    print(f"Triage system ready (inference mode: {_state['inference_mode']})")
+
+def _warmup(model, n_passes: int = 2):
+    """Full forward passes on a blank image before reporting ready.
+
+    The first passes pay for lazy work (paging in mapped weights, allocator
+    growth, kernel selection) that would otherwise land on the first requests.
+    They are kept out of the serving stage histograms.
+    """
+    if not model.model_loaded:
+        return
+    image = Image.new("RGB", (448, 448), (180, 140, 120))
+    start = time.time()
+    with metrics.unobserved():
+        for _ in range(n_passes):
+            proba, cond_proba, embedding = _classify(model, image)
+            if cond_proba is None:
+                _predict_condition_proba(model, image, embedding)
+    print(f"Warmup: {n_passes} forward passes in {time.time() - start:.2f}s")
+
+
+def _has_joint_condition_head(model):
+    """True if the primary model predicts conditions alongside malignancy."""
+    if model.inference_mode == "e2e":
+        return bool(getattr(model.e2e_model, "has_condition_head", False))
+    return hasattr(model.classifier, "predict_joint")
+
+
+def _inference_mode():
+    model = registry.current
+    return model.inference_mode if model is not None else None
 
 
 @app.on_event("shutdown")
 async def cleanup():
-    if _state["extractor"] is not None:
-        _state["extractor"].unload_model()
+    if _state["profiler"] is not None:
+        # On the inference thread it was started on; exports a partially recorded window
+        await admission.run(_state["profiler"].stop)
+    model = registry.current
+    if model is not None and model.extractor is not None:
+        model.extractor.unload_model()
+
+
+def _request_profiler(model):
+    """Profiler stepped once per /api/analyze request (a no-op unless enabled).
+
+    Created on the first request so the lazily loaded SigLIP model exists and
+    its attention / MLP blocks can be labelled. Called from _infer: the torch
+    profiler and the stack sampler follow the thread that starts them, so it
+    records the inference thread (the first one, with
+    SKINTAG_INFERENCE_CONCURRENCY > 1).
+    """
+    from src.utils.profiling import BatchProfiler, profiling_enabled
+
+    if _state["profiler"] is None:
+        module = None
+        if profiling_enabled("analyze"):
+            if model.inference_mode == "e2e":
+                module = model.e2e_model.model
+            elif model.extractor is not None:
+                module = model.extractor.load_model().model
+        _state["profiler"] = BatchProfiler("analyze", model=module).start()
+    return _state["profiler"]
+
+
+# The multipart body is parsed in the handler, after the queue-full check,
+# so the upload field is declared for the OpenAPI docs only
+_ANALYZE_BODY = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"],
+    "properties": {"file": {"type": "string", "format": "binary"}}}}}}}
+
+
+@app.post("/api/analyze", openapi_extra=_ANALYZE_BODY)
+async def analyze_image(request: Request):
+    """Analyze an uploaded skin lesion image (multipart field "file").
+
+    Returns triage assessment with risk score, urgency tier, recommendation
+    and the model_version that produced it. While the condition classifier is
+    still loading the response carries only the binary result and "degraded": true.
+    Sheds load with 429 / 503 / 499 per app/admission.py; a full queue is
+    refused before the upload is read.
+    """
+    phase = _state["phase"]
+    if phase not in SERVING_PHASES:
+        metrics.set_error(request, "not_ready")
+        detail = f"Model loading failed: {_state['load_error']}" if phase == "failed" else f"Model loading ({phase})"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+    admission.check_queue(request)
+
+    # Read and validate image; oversized uploads are refused before taking an inference slot
+    async with request.form(max_files=1) as form:
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HTTPException(status_code=422, detail="Missing image upload (multipart field 'file')")
+        max_bytes = _decode_options()["max_bytes"]
+        if max_bytes is not None and file.size is not None and file.size > max_bytes:
+            metrics.set_error(request, "image_too_large")
+            raise HTTPException(status_code=413, detail=f"Image exceeds {max_bytes / 2**20:.0f} MB")
+        contents = await file.read()
+    metrics.upload_read(request)
+
+    # Wait for an inference slot, or be shed (queue full, deadline, client gone)
+    async with admission.slot(request):
+        metrics.inference_started(request)
+        # The whole analysis runs on one model version, even if a reload swaps
+        # in another meanwhile
+        with registry.lease() as model:
+            if model.inference_mode == "e2e" and model.e2e_model is None:
+                metrics.set_error(request, "model_not_loaded")
+                raise HTTPException(status_code=503, detail="Model not loaded.")
+            if model.inference_mode == "embedding+head" and model.classifier is None:
+                metrics.set_error(request, "model_not_loaded")
+                raise HTTPException(status_code=503, detail="Model not loaded. Run train.py first.")
+
+            image, response, mal_prob = await admission.run(_infer, request, model, contents, phase)
+
+    with metrics.stage("triage"):
+        result = _triage(response, mal_prob)
+    metrics.requests_total.inc(model.inference_mode, result.urgency_tier)
+
+    response.update({
+        "risk_score": round(result.risk_score, 4),
+        "urgency_tier": result.urgency_tier,
+        "recommendation": result.recommendation,
+        "confidence": result.confidence,
+        "disclaimer": result.disclaimer,
+        "model_version": model.version,
+    })
 
+    # Sampled copy for the shadow model; dropped rather than queued if it is behind
+    shadow = _state["shadow"]
+    if shadow is not None and phase == "ready":
+        shadow.submit(image, model.version, response)
 
-@app.post("/api/analyze")
-async def analyze_image(file: UploadFile = File(...)):
-    """Analyze an uploaded skin lesion image.
+    return JSONResponse(response, headers={"X-Model-Version": model.version})
 
-    Returns triage assessment with risk score, urgency tier, recommendation.
+
+def _infer(request, model, contents: bytes, phase: str):
+    """Decode the upload and run the models (on an inference thread).
+
+    Returns:
+        (image, response with probabilities and condition estimate, mal_prob)
     """
-    if _state["inference_mode"] == "e2e" and _state["e2e_model"] is None:
-        raise HTTPException(status_code=503, detail="Model not loaded.")
-    if _state["inference_mode"] == "embedding+head" and _state["classifier"] is None:
-        raise HTTPException(status_code=503, detail="Model not loaded. Run train.py first.")
+    from src.data.decode import ImageTooLarge, decode_image, processor_input_size
 
-    # Read and validate image
+    profiler = _request_profiler(model)
+    processor = model.e2e_model.processor if model.inference_mode == "e2e" else model.extractor.processor
     try:
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents)).convert("RGB")
+        with profiler.region("decode"), metrics.stage("decode"):
+            image = decode_image(contents, target_size=processor_input_size(processor), **_decode_options())
+    except ImageTooLarge as e:
+        metrics.set_error(request, "image_too_large")
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception:
+        metrics.set_error(request, "invalid_image")
         raise HTTPException(status_code=400, detail="Invalid image file")
 
-    # Classify -- use end-to-end model or embedding+head
-    embedding = None
-    if _state["inference_mode"] == "e2e":
-        proba = _state["e2e_model"].predict_proba([image])
-    else:
-        embedding = _state["extractor"].extract([image])  # (1, 1152)
-        proba = _state["classifier"].predict_proba(embedding.numpy())
-
+    proba, cond_proba, embedding = _classify(model, image)
     mal_prob = float(proba[0, 1]) if proba.ndim == 2 else float(proba[0])
 
     response = {
@@ -235,9 +557,31 @@ async def analyze_image(file: UploadFile = File(...)):
         },
     }
 
-    # Condition estimation (10-class) - adds triage_categories to response
-    _add_condition_estimate(response, image, embedding)
+    # Condition estimation (10-class) - adds triage_categories to response.
+    # Degraded: only a multi-task primary's own condition output is used.
+    if phase == "degraded":
+        response["degraded"] = True
+    if phase != "degraded" or cond_proba is not None:
+        with profiler.region("condition"), metrics.stage("condition"):
+            _add_condition_estimate(model, response, image, embedding, cond_proba=cond_proba)
+    profiler.step()
+    return image, response, mal_prob
+
+
+def _decode_options() -> dict:
+    """decode_image() keyword arguments from the decode section of config.yaml."""
+    from src.data.decode import DEFAULT_MAX_BYTES, DEFAULT_MAX_PIXELS
+
+    cfg = (_state["config"] or {}).get("decode", {})
+    return {
+        "reduce": cfg.get("reduced", True),
+        "max_bytes": cfg.get("max_bytes", DEFAULT_MAX_BYTES),
+        "max_pixels": cfg.get("max_pixels", DEFAULT_MAX_PIXELS),
+    }
+
 
+def _triage(response: dict, mal_prob: float):
+    """Triage assessment, using the dominant triage category (if estimated) as context."""
     # Determine dominant triage category for context-aware recommendations
     dominant_category = None
     if "triage_categories" in response:
@@ -245,60 +589,97 @@ async def analyze_image(file: UploadFile = File(...)):
         dominant_category = max(cats, key=lambda k: cats[k]["probability"])
 
     # Triage assessment with category context
-    result = _state["triage"].assess(mal_prob, dominant_category=dominant_category)
+    return _state["triage"].assess(mal_prob, dominant_category=dominant_category)
 
-    response.update({
-        "risk_score": round(result.risk_score, 4),
-        "urgency_tier": result.urgency_tier,
-        "recommendation": result.recommendation,
-        "confidence": result.confidence,
-        "disclaimer": result.disclaimer,
-    })
 
-    return JSONResponse(response)
+def _shadow_predict(model, image: Image.Image) -> dict:
+    """The shadow model's counterpart of an /api/analyze result, for app/shadow.py."""
+    proba, cond_proba, embedding = _classify(model, image)
+    mal_prob = float(proba[0, 1]) if proba.ndim == 2 else float(proba[0])
+    response = {"probabilities": {"malignant": round(mal_prob, 4)}}
+    _add_condition_estimate(model, response, image, embedding, cond_proba=cond_proba)
+    result = _triage(response, mal_prob)
+    return {"p": response["probabilities"]["malignant"], "tier": result.urgency_tier,
+            "cond": response.get("condition_estimate")}
+
 
+def _classify(model, image: Image.Image):
+    """Binary probabilities for one image with the primary model.
 
-def _add_condition_estimate(response: dict, image: Image.Image, embedding) -> None:
-    """Add condition estimate and 3-category triage to response if classifier is available."""
-    cond_obj = _state["condition_classifier"]
+    Uses the end-to-end model or embedding+head. Multi-task models return
+    condition probabilities from the same forward pass.
+
+    Returns:
+        (proba, cond_proba or None, embedding or None)
+    """
+    embedding = None
+    cond_proba = None
+    if model.inference_mode == "e2e":
+        if _has_joint_condition_head(model):
+            proba, cond_proba = model.e2e_model.predict_joint([image])
+        else:
+            proba = model.e2e_model.predict_proba([image])
+    else:
+        embedding = model.extractor.extract([image])  # (1, 1152)
+        with metrics.stage("head_predict"):
+            if _has_joint_condition_head(model):
+                proba, cond_proba = model.classifier.predict_joint(embedding.numpy())
+            else:
+                proba = model.classifier.predict_proba(embedding.numpy())
+    return proba, cond_proba, embedding
+
+
+def _predict_condition_proba(model, image: Image.Image, embedding):
+    """Run the separate condition classifier; returns (1, n_conditions) or None."""
+    cond_obj = model.condition_classifier
     if cond_obj is None:
-        return
+        return None
 
+    # Unpack v2 dict format: {"classifier": clf, "scaler": scaler}
+    if isinstance(cond_obj, dict):
+        cond_clf = cond_obj["classifier"]
+        cond_scaler = cond_obj.get("scaler")
+    else:
+        cond_clf = cond_obj
+        cond_scaler = None
+
+    # Get embedding for condition classifier
+    if embedding is not None:
+        cond_input = embedding.numpy() if hasattr(embedding, 'numpy') else embedding
+    elif model.e2e_model and hasattr(model.e2e_model, 'extract_embeddings'):
+        emb = model.e2e_model.extract_embeddings([image])
+        cond_input = emb.cpu().numpy() if emb is not None else None
+        if cond_input is None and model.extractor:
+            cond_input = model.extractor.extract([image]).numpy()
+    elif model.extractor:
+        cond_input = model.extractor.extract([image]).numpy()
+    else:
+        return None
+
+    if cond_input is None:
+        return None
+
+    if cond_scaler is not None:
+        cond_input = cond_scaler.transform(cond_input)
+
+    return cond_clf.predict_proba(cond_input)
+
+
+def _add_condition_estimate(model, response: dict, image: Image.Image, embedding, cond_proba=None) -> None:
+    """Add condition estimate and 3-category triage to response if condition output is available.
+
+    cond_proba comes from a multi-task primary model when present; otherwise
+    the separate condition classifier is run on the embedding.
+    """
     try:
         from src.data.taxonomy import (
             CONDITION_NAMES, Condition, CONDITION_TRIAGE,
             TriageCategory, TRIAGE_CATEGORY_NAMES,
         )
 
-        # Unpack v2 dict format: {"classifier": clf, "scaler": scaler}
-        if isinstance(cond_obj, dict):
-            cond_clf = cond_obj["classifier"]
-            cond_scaler = cond_obj.get("scaler")
-        else:
-            cond_clf = cond_obj
-            cond_scaler = None
-
-        # Get embedding for condition classifier
-        if embedding is not None:
-            cond_input = embedding.numpy() if hasattr(embedding, 'numpy') else embedding
-        elif _state["e2e_model"] and hasattr(_state["e2e_model"], 'extract_embeddings'):
-            emb = _state["e2e_model"].extract_embeddings([image])
-            cond_input = emb.cpu().numpy() if emb is not None else None
-            if cond_input is None and _state["extractor"]:
-                cond_input = _state["extractor"].extract([image]).numpy()
-        elif _state["extractor"]:
-            cond_input = _state["extractor"].extract([image]).numpy()
-        else:
-            return
-
-        if cond_input is None:
-            return
-
-        if cond_scaler is not None:
-            cond_input = cond_scaler.transform(cond_input)
-
-        cond_proba = cond_clf.predict_proba(cond_input)
-        if cond_proba.ndim != 2:
+        if cond_proba is None:
+            cond_proba = _predict_condition_proba(model, image, embedding)
+        if cond_proba is None or cond_proba.ndim != 2:
             return
 
         # Top-3 individual conditions
@@ -358,18 +739,139 @@ def _add_condition_estimate(response: dict, image: Image.Image, embedding) -> No
         print(f"Warning: Failed to add condition estimate: {e}")
 
 
+@app.get("/api/live")
+async def live():
+    """Liveness: the process is up and its event loop responds (models may still be loading)."""
+    return {"status": "alive", "phase": _state["phase"], "uptime_s": round(time.time() - _state["started_at"], 1)}
+
+
+@app.get("/api/ready")
+async def ready(degraded_ok: bool = False):
+    """Readiness: 200 once models are loaded and warmed up, else 503 with the loading phase.
+
+    degraded_ok=true also accepts the degraded phase (binary results only),
+    for load balancers that should route traffic as early as possible.
+    """
+    phase = _state["phase"]
+    accepted = SERVING_PHASES if degraded_ok else ("ready",)
+    body = {
+        "ready": phase in accepted,
+        "phase": phase,
+        "degraded": phase == "degraded",
+        "inference_mode": _inference_mode(),
+        "model_version": registry.current.version if registry.current else None,
+        "uptime_s": round(time.time() - _state["started_at"], 1),
+    }
+    if _state["load_error"]:
+        body["error"] = _state["load_error"]
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
 @app.get("/api/health")
 async def health():
-    active_model = _state["extractor"] or _state["e2e_model"]
+    model = registry.current
 
     return {
         "status": "ok",
-        "inference_mode": _state["inference_mode"],
-        "model_loaded": _state["e2e_model"] is not None or _state["classifier"] is not None,
-        "device": active_model.device if active_model else "unknown",
+        "phase": _state["phase"],
+        "inference_mode": _inference_mode(),
+        "model_version": model.version if model else None,
+        "model_loaded": model is not None and model.model_loaded,
+        "device": model.device if model else "unknown",
+        "queue": admission.status(),
+    }
+
+
+def _check_admin(request: Request):
+    """Admin endpoints need X-Admin-Token = SKINTAG_ADMIN_TOKEN, or a loopback client if no token is set."""
+    token = os.getenv("SKINTAG_ADMIN_TOKEN")
+    if token:
+        if not hmac.compare_digest(request.headers.get("x-admin-token", ""), token):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+    elif request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Set SKINTAG_ADMIN_TOKEN to allow remote admin requests")
+
+
+@app.post("/api/admin/reload")
+async def admin_reload(request: Request, cache_dir: str = None, embedding_model: str = None, wait: bool = False):
+    """Hot-swap to a freshly loaded model version without dropping requests.
+
+    Loads from SKINTAG_CACHE_DIR (or cache_dir) in the background, warms the
+    new version up, then swaps it in; in-flight requests finish on the old
+    version, which is released once they drain. Returns 202 at once, or the
+    new version with wait=true. Under scripts/serve.py only the worker that
+    handles the request reloads; use SKINTAG_WATCH_MODELS to reload them all.
+    """
+    _check_admin(request)
+    if _state["phase"] != "ready":
+        raise HTTPException(status_code=409, detail=f"Initial model loading not finished ({_state['phase']})")
+    if _reload_lock.locked():
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+
+    if not wait:
+        threading.Thread(target=_reload_quietly, args=(cache_dir, embedding_model),
+                         name="skintag-model-reload", daemon=True).start()
+        return JSONResponse({"status": "loading", "current": registry.current.version}, status_code=202)
+    try:
+        model = await run_in_threadpool(reload_models, cache_dir, embedding_model)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed, still serving "
+                                                    f"{registry.current.version}: {type(e).__name__}: {e}")
+    return {"status": "done", **model.describe()}
+
+
+def _reload_quietly(cache_dir, embedding_model):
+    try:
+        reload_models(cache_dir, embedding_model)
+    except Exception as e:
+        print(f"Model reload failed (still serving {registry.current.version}): {e}")
+
+
+@app.get("/api/admin/models")
+async def admin_models(request: Request):
+    """Active model version, versions still draining, recent activations, the last reload and the shadow."""
+    _check_admin(request)
+    shadow = _state["shadow"]
+    return {**registry.status(), "reload": _state["reload"],
+            "shadow": shadow.status() if shadow is not None else None}
+
+
+@app.get("/api/memory")
+async def memory():
+    """Unique vs shared memory of this process and, under scripts/serve.py, every worker.
+
+    Summing pss over processes gives the real combined footprint; the gap to
+    the summed rss is what sharing the model weights saves.
+    """
+    from src.utils.resource_monitor import child_pids, memory_breakdown
+
+    master = os.getenv("SKINTAG_SERVE_MASTER_PID")
+    pids = [int(master)] + child_pids(master) if master else [os.getpid()]
+    processes = []
+    for pid in pids:
+        breakdown = memory_breakdown(pid)
+        if breakdown is None:
+            continue
+        role = "master" if master and pid == int(master) else "worker"
+        processes.append({"pid": pid, "role": role, "self": pid == os.getpid(),
+                          **{f"{k}_mb": round(v / 2**20, 1) for k, v in breakdown.items()}})
+    if not processes:
+        raise HTTPException(status_code=501, detail="Memory breakdown needs /proc/<pid>/smaps_rollup (Linux)")
+    return {
+        "pid": os.getpid(),
+        "workers": sum(p["role"] == "worker" for p in processes),
+        "processes": processes,
+        "total_rss_mb": round(sum(p["rss_mb"] for p in processes), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in processes), 1),
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of the serving metrics."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index():
     index_path = APP_DIR / "templates" / "index.html"
@@ -0,0 +1,136 @@
+"""Serving metrics for the SkinTag API, exposed at GET /metrics.
+
+Stage latencies come from stage() blocks in the handler and in the model code
+(preprocess, backbone_forward, head_predict) through the telemetry stage
+observer. AnalyzeMetricsMiddleware is a plain ASGI wrapper around
+/api/analyze that tracks in-flight requests, handler latency and errors by
+type without Starlette's BaseHTTPMiddleware overhead.
+
+Stages: upload_read (request start until the upload is in memory), decode,
+preprocess, backbone_forward, head_predict, condition, triage. Shadow model
+work (app/shadow.py) is recorded under shadow_<stage>.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from src.utils.resource_monitor import _rss_bytes, memory_breakdown
+from src.utils.telemetry import MetricsRegistry, set_stage_observer, stage
+
+ANALYZE_PATH = "/api/analyze"
+
+registry = MetricsRegistry()
+stage_seconds = registry.histogram(
+    "skintag_stage_seconds", "Time spent per /api/analyze stage", ["stage"])
+request_seconds = registry.histogram(
+    "skintag_request_seconds", "Total /api/analyze time including upload", ["inference_mode"])
+requests_total = registry.counter(
+    "skintag_requests_total", "Completed analyses", ["inference_mode", "urgency_tier"])
+errors_total = registry.counter(
+    "skintag_errors_total", "Failed /api/analyze requests by error type", ["error"])
+in_flight = registry.gauge(
+    "skintag_in_flight_requests", "/api/analyze requests currently being handled")
+shed_total = registry.counter(
+    "skintag_shed_total", "/api/analyze requests shed before inference by reason", ["reason"])
+model_reloads_total = registry.counter(
+    "skintag_model_reloads_total", "Model hot reloads by result", ["result"])
+queue_depth = registry.gauge(
+    "skintag_queue_depth", "/api/analyze requests received but not yet running inference")
+shadow_requests_total = registry.counter(
+    "skintag_shadow_requests_total", "Requests copied to the shadow model, by outcome", ["result"])
+registry.callback_gauge(
+    "skintag_process_resident_memory_bytes", "Resident set size of the server process", _rss_bytes)
+registry.callback_gauge(
+    "skintag_process_unique_memory_bytes", "Memory private to this worker",
+    lambda: (memory_breakdown() or {}).get("unique"))
+registry.callback_gauge(
+    "skintag_process_shared_memory_bytes", "Memory shared with other processes (forked or mapped weights)",
+    lambda: (memory_breakdown() or {}).get("shared"))
+
+
+_stage_prefix = threading.local()
+
+
+def install():
+    """Route stage() timings (including those inside model code) to stage_seconds."""
+    def observe(name, seconds):
+        if not getattr(_stage_prefix, "muted", False):
+            stage_seconds.observe(seconds, getattr(_stage_prefix, "value", "") + name)
+
+    set_stage_observer(observe)
+
+
+def prefix_stages(prefix: str):
+    """Label stage timings of the calling thread as prefix + stage (e.g. shadow_backbone_forward)."""
+    _stage_prefix.value = prefix
+
+
+@contextmanager
+def unobserved():
+    """Drop stage timings of the calling thread inside the block (e.g. warmup passes)."""
+    previous = getattr(_stage_prefix, "muted", False)
+    _stage_prefix.muted = True
+    try:
+        yield
+    finally:
+        _stage_prefix.muted = previous
+
+
+def upload_read(request):
+    """Record upload_read: request start until the body has been read."""
+    start = request.scope.get("state", {}).get("metrics_start")
+    if start is not None:
+        stage_seconds.observe(time.perf_counter() - start, "upload_read")
+
+
+def inference_started(request):
+    """The request leaves the queue (counted once)."""
+    state = request.scope.get("state", {})
+    if state.get("metrics_queued"):
+        state["metrics_queued"] = False
+        queue_depth.dec()
+
+
+def set_error(request, error: str):
+    """Label the error type of a request that is about to fail."""
+    request.scope.setdefault("state", {})["metrics_error"] = error
+
+
+class AnalyzeMetricsMiddleware:
+    """ASGI middleware: in-flight / queue gauges, request latency and error counts."""
+
+    def __init__(self, app, mode_fn=lambda: None):
+        self.app = app
+        self.mode_fn = mode_fn
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != ANALYZE_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        state["metrics_start"] = time.perf_counter()
+        state["metrics_queued"] = True
+        in_flight.inc()
+        queue_depth.inc()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as exc:
+            state.setdefault("metrics_error", type(exc).__name__)
+            raise
+        finally:
+            in_flight.dec()
+            if state.get("metrics_queued"):
+                queue_depth.dec()
+            request_seconds.observe(time.perf_counter() - state["metrics_start"], str(self.mode_fn()))
+            if status >= 400 or "metrics_error" in state:
+                errors_total.inc(state.get("metrics_error", f"http_{status}"))
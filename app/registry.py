@@ -0,0 +1,171 @@
+"""Versioned in-process model registry for zero-downtime hot swaps.
+
+Every request takes a lease on the active ModelVersion and uses only that
+version until it finishes. activate() swaps the active version atomically:
+new requests see the new version at once, requests already holding a lease
+finish on the old one, and the old version's models are released when its
+last lease is returned.
+
+    with registry.lease() as model:
+        proba, cond_proba, embedding = _classify(model, image)
+    registry.activate(new_version)   # old version drains, then unloads
+"""
+
+import gc
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import torch
+
+# Local artifacts that make up a model version (fingerprinted for version ids
+# and for the file watcher)
+ARTIFACT_GLOBS = (
+    "finetuned_model/*.json", "finetuned_model/*.safetensors", "finetuned_model/*.pt",
+    "finetuned_model/siglip_finetuned/*", "finetuned_model/classifiers/*.pkl",
+    "classifier*.pkl",
+)
+
+
+@dataclass(eq=False)
+class ModelVersion:
+    """One loaded set of models: the binary model plus the optional condition classifier."""
+
+    version: str
+    source: str
+    inference_mode: Optional[str] = None  # "e2e" or "embedding+head"
+    extractor: Any = None
+    classifier: Any = None
+    condition_classifier: Any = None  # 10-class condition estimator (unused with a multi-task primary)
+    e2e_model: Any = None  # End-to-end fine-tuned model (if available)
+    fingerprint: tuple = ()  # artifact_fingerprint() of a local source, or the HF repo / revision
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def model_loaded(self) -> bool:
+        return self.e2e_model is not None or self.classifier is not None
+
+    @property
+    def device(self) -> str:
+        active_model = self.extractor or self.e2e_model
+        return active_model.device if active_model else "unknown"
+
+    def unload(self):
+        """Drop every model reference so the memory can be reclaimed."""
+        if self.extractor is not None and self.extractor.model is not None:
+            self.extractor.unload_model()
+        self.extractor = self.classifier = self.condition_classifier = self.e2e_model = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "inference_mode": self.inference_mode,
+            "condition_classifier": self.condition_classifier is not None,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def artifact_fingerprint(cache_dir) -> tuple:
+    """(relative path, size, mtime_ns) of every model artifact under cache_dir."""
+    cache_dir = Path(cache_dir)
+    entries = set()
+    for pattern in ARTIFACT_GLOBS:
+        for path in cache_dir.glob(pattern):
+            if path.is_file():
+                stat = path.stat()
+                entries.add((str(path.relative_to(cache_dir)), stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(entries))
+
+
+def fingerprint_digest(fingerprint) -> str:
+    """Short stable hash of a fingerprint, for version ids."""
+    return hashlib.sha1(repr(fingerprint).encode()).hexdigest()[:8]
+
+
+class ModelRegistry:
+    """Holds the active ModelVersion and the retired versions still draining."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+        self._leases = {}  # id(version) -> active leases
+        self._retired = []  # swapped out, waiting for their leases to drain
+        self._sequence = 0
+        self.history = []  # (version, activated_at), most recent last
+
+    @property
+    def current(self) -> Optional[ModelVersion]:
+        return self._current
+
+    def next_version(self, fingerprint=()) -> str:
+        """Version id: activation sequence number plus a hash of the artifacts."""
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+        return f"v{sequence}-{fingerprint_digest(fingerprint)}"
+
+    @contextmanager
+    def lease(self):
+        """Pin the active version for the duration of a request (yields None if none is active)."""
+        with self._lock:
+            version = self._current
+            if version is not None:
+                self._leases[id(version)] = self._leases.get(id(version), 0) + 1
+        try:
+            yield version
+        finally:
+            if version is not None:
+                self._release(version)
+
+    def _release(self, version: ModelVersion):
+        with self._lock:
+            remaining = self._leases[id(version)] - 1
+            if remaining:
+                self._leases[id(version)] = remaining
+                return
+            del self._leases[id(version)]
+            drained = version in self._retired
+            if drained:
+                self._retired.remove(version)
+        if drained:
+            self._free(version)
+
+    def activate(self, version: ModelVersion) -> Optional[ModelVersion]:
+        """Make version active for new requests; returns the version it replaced.
+
+        The replaced version is unloaded as soon as no request holds it.
+        """
+        with self._lock:
+            previous, self._current = self._current, version
+            self.history.append((version.version, time.time()))
+            idle = previous is not None and id(previous) not in self._leases
+            if previous is not None and not idle:
+                self._retired.append(previous)
+        print(f"Activated model {version.version} ({version.inference_mode}, {version.source})")
+        if idle:
+            self._free(previous)
+        return previous
+
+    def _free(self, version: ModelVersion):
+        version.unload()
+        print(f"Released model {version.version}")
+
+    def status(self) -> dict:
+        with self._lock:
+            current = self._current
+            draining = [{"version": v.version, "leases": self._leases.get(id(v), 0)} for v in self._retired]
+            active_leases = self._leases.get(id(current), 0) if current is not None else 0
+        return {
+            "current": current.describe() if current is not None else None,
+            "active_leases": active_leases,
+            "draining": draining,
+            "history": [{"version": v, "activated_at": t} for v, t in self.history[-10:]],
+        }
@@ -0,0 +1,127 @@
+"""Shadow evaluation of a candidate model on live traffic, off the request hot path.
+
+/api/analyze offers each response to ShadowEvaluator.submit(), which samples
+it and does a put_nowait on a small bounded queue; when the queue is full the
+copy is dropped, so the primary model never waits for the shadow. One
+background thread runs the shadow model and appends a JSON line per request
+with both models' outputs ([primary, shadow]). A SigLIP forward already uses
+every core, so the thread only starts a shadow prediction while the primary
+is idle (no request running or waiting for a slot, see app/admission.py);
+a copy that finds no idle moment within max_wait_s is dropped as "busy":
+
+    {"t":1760000000.123,"pv":"v3-1a2b3c4d","sv":"shadow-9f8e7d6c","p":[0.1234,0.4567],
+     "tier":["low","moderate"],"cond":["Melanocytic Nevus","Melanoma"],"ms":41.2}
+
+scripts/shadow_report.py computes agreement and tier-flip rates from the log.
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+
+from app import metrics
+
+IDLE_POLL_S = 0.005
+
+
+class ShadowEvaluator:
+    """Bounded request queue plus a worker thread running the shadow model.
+
+    Args:
+        model: ModelVersion to evaluate
+        predict_fn: (model, image) -> {"p": malignant probability, "tier": urgency tier,
+            "cond": top condition or None}
+        log_path: append-only JSON-lines log
+        sample_rate: fraction of requests copied to the shadow
+        max_queue: copies waiting beyond this are dropped
+        idle_fn: () -> True when the primary is idle; shadow predictions wait for it
+        max_wait_s: drop a copy still waiting for an idle primary after this long
+    """
+
+    def __init__(self, model, predict_fn, log_path, sample_rate: float = 0.1, max_queue: int = 16,
+                 idle_fn=None, max_wait_s: float = 5.0):
+        self.model = model
+        self.predict_fn = predict_fn
+        self.log_path = Path(log_path)
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self.idle_fn = idle_fn
+        self.max_wait_s = max_wait_s
+        self._queue = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, image, primary_version: str, response: dict) -> bool:
+        """Offer a request to the shadow model without blocking; True if it was queued."""
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return False
+        if self._pid != os.getpid():
+            self._start()
+        primary = (primary_version, response["probabilities"]["malignant"],
+                   response["urgency_tier"], response.get("condition_estimate"))
+        try:
+            self._queue.put_nowait((time.time(), image, primary))
+        except queue.Full:
+            metrics.shadow_requests_total.inc("dropped")
+            return False
+        return True
+
+    def _start(self):
+        # Started lazily in each process: threads do not survive scripts/serve.py's fork
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            jobs = queue.Queue(maxsize=self.max_queue)
+            threading.Thread(target=self._run, args=(jobs,), name="skintag-shadow", daemon=True).start()
+            self._queue, self._pid = jobs, os.getpid()
+
+    def _run(self, jobs):
+        metrics.prefix_stages("shadow_")
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        # O_APPEND plus one write per line keeps lines whole with several workers
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        while True:
+            received_at, image, (version, p, tier, cond) = jobs.get()
+            if not self._wait_idle(received_at):
+                metrics.shadow_requests_total.inc("busy")
+                continue
+            start = time.perf_counter()
+            try:
+                shadow = self.predict_fn(self.model, image)
+            except Exception as e:
+                metrics.shadow_requests_total.inc("error")
+                print(f"Shadow prediction failed: {e}")
+                continue
+            record = {
+                "t": round(received_at, 3),
+                "pv": version,
+                "sv": self.model.version,
+                "p": [p, shadow["p"]],
+                "tier": [tier, shadow["tier"]],
+                "cond": [cond, shadow["cond"]],
+                "ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+            os.write(fd, (json.dumps(record, separators=(",", ":")) + "\n").encode())
+            metrics.shadow_requests_total.inc("done")
+
+    def _wait_idle(self, received_at: float) -> bool:
+        """Block until the primary is idle; False if that takes past max_wait_s after received_at."""
+        while self.idle_fn is not None and not self.idle_fn():
+            if time.time() - received_at > self.max_wait_s:
+                return False
+            time.sleep(IDLE_POLL_S)
+        return True
+
+    def status(self) -> dict:
+        return {
+            "version": self.model.version,
+            "source": self.model.source,
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize() if self._pid == os.getpid() else 0,
+            "max_queue": self.max_queue,
+            "log": str(self.log_path),
+        }
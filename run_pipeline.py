@@ -10,7 +10,10 @@ Usage:
     python run_pipeline.py                   # Full pipeline (multi-dataset, all models)
     python run_pipeline.py --quick           # Quick smoke test (500 samples, logistic only)
     python run_pipeline.py --skip-train      # Skip training, run eval + app on existing models
+    python run_pipeline.py --resume          # Skip stages whose inputs/config/code are unchanged
+    python run_pipeline.py --resume --force train_models   # ...but re-run training (and what depends on it)
     python run_pipeline.py --no-app          # Everything except launching the web app
+    python run_pipeline.py --profile extract # torch profiler + Python sampling -> results/profiles/
     python run_pipeline.py --app-only        # Just launch the web app
 """
 
@@ -36,6 +39,17 @@ os.environ.setdefault("PYTHONPATH", str(PROJECT_ROOT))
 
 _warnings = []
 _stage_times = {}
+_stage_failed = set()
+_stage_profiles = []  # one resource record per stage, in run order (see src/utils/resource_monitor.py)
+
+# Dataset manifests (relative to PROJECT_ROOT); also part of the load_data fingerprint
+_DATASET_MANIFESTS = {
+    "HAM10000": Path("data") / "HAM10000_metadata.csv",
+    "DDI": Path("data") / "ddi" / "ddi_metadata.csv",
+    "Fitzpatrick17k": Path("data") / "fitzpatrick17k" / "fitzpatrick17k.csv",
+    "PAD-UFES-20": Path("data") / "pad_ufes" / "metadata.csv",
+    "BCN20000": Path("data") / "bcn20000" / "bcn20000_metadata.csv",
+}
 
 
 def _banner(msg):
@@ -54,18 +68,28 @@ def _warn(stage, msg, exc=None):
 
 
 def _run_stage(name, fn, *args, **kwargs):
-    """Run a pipeline stage with timing and error capture."""
+    """Run a pipeline stage with timing, resource accounting and error capture."""
+    from src.utils.resource_monitor import StageMonitor
+
     _banner(name)
     t0 = time.time()
+    monitor = StageMonitor(name)
     try:
-        result = fn(*args, **kwargs)
+        with monitor:
+            result = fn(*args, **kwargs)
         elapsed = time.time() - t0
         _stage_times[name] = elapsed
-        print(f"\n  [{name}] completed in {elapsed:.1f}s")
+        _stage_profiles.append(monitor.record)
+        peak = monitor.record["peak_rss_mb"]
+        print(f"\n  [{name}] completed in {elapsed:.1f}s"
+              + (f" (peak RSS {peak:.0f} MB)" if peak is not None else ""))
         return result
     except Exception as exc:
         elapsed = time.time() - t0
         _stage_times[name] = elapsed
+        _stage_failed.add(name)
+        if monitor.record is not None:
+            _stage_profiles.append(monitor.record)
         _warn(name, f"Stage failed after {elapsed:.1f}s", exc)
         traceback.print_exc()
         return None
@@ -96,18 +120,11 @@ def stage_check_environment():
     print("  All required packages available.")
 
     # Check data
-    data_dir = PROJECT_ROOT / "data"
     datasets_found = []
     datasets_missing = []
 
-    checks = {
-        "HAM10000": data_dir / "HAM10000_metadata.csv",
-        "DDI": data_dir / "ddi" / "ddi_metadata.csv",
-        "Fitzpatrick17k": data_dir / "fitzpatrick17k" / "fitzpatrick17k.csv",
-        "PAD-UFES-20": data_dir / "pad_ufes" / "metadata.csv",
-        "BCN20000": data_dir / "bcn20000" / "bcn20000_metadata.csv",
-    }
-    for name, path in checks.items():
+    for name, rel_path in _DATASET_MANIFESTS.items():
+        path = PROJECT_ROOT / rel_path
         if path.exists():
             datasets_found.append(name)
             print(f"  [OK] {name}: {path}")
@@ -150,6 +167,7 @@ def stage_load_data(sample_n=0):
     import numpy as np
     from src.data.loader import load_multi_dataset
     from src.data.schema import samples_to_arrays
+    from src.utils.resource_monitor import note_items
 
     config_path = PROJECT_ROOT / "configs" / "config.yaml"
     with open(config_path) as f:
@@ -186,6 +204,7 @@ def stage_load_data(sample_n=0):
     cache_dir.mkdir(parents=True, exist_ok=True)
     metadata.to_csv(cache_dir / "metadata.csv", index=False)
 
+    note_items(len(image_paths), "images")
     return image_paths, labels, metadata
 
 
@@ -193,15 +212,17 @@ def stage_load_data(sample_n=0):
 # Stage 3: Extract embeddings
 # ---------------------------------------------------------------------------
 
-def stage_extract_embeddings(image_paths):
+def stage_extract_embeddings(image_paths, refresh=False):
     """Extract SigLIP embeddings (cached to disk).
 
     Accepts file paths — images are loaded per-batch during extraction,
-    so only a few images are in RAM at any time.
+    so only a few images are in RAM at any time. refresh=True discards the
+    cached file first (its inputs changed since it was written).
     """
     import yaml
     import torch
     from src.model.embeddings import EmbeddingExtractor
+    from src.utils.resource_monitor import note_items
 
     config_path = PROJECT_ROOT / "configs" / "config.yaml"
     with open(config_path) as f:
@@ -218,11 +239,22 @@ def stage_extract_embeddings(image_paths):
     print(f"  Cache: {cache_path}")
     print(f"  Images: {len(image_paths)} (streaming from disk)")
 
+    if cache_path.exists() and not refresh:
+        cached_rows = len(torch.load(cache_path, mmap=True, weights_only=True))
+        if cached_rows != len(image_paths):
+            print(f"  Cached embeddings have {cached_rows} rows for {len(image_paths)} images, re-extracting")
+            refresh = True
+    if refresh and cache_path.exists():
+        print("  Discarding stale embedding cache")
+        cache_path.unlink()
+
     extractor = EmbeddingExtractor(device=device)
-    embeddings = extractor.extract_dataset(image_paths, batch_size=batch_size, cache_path=cache_path)
+    embeddings = extractor.extract_dataset(image_paths, batch_size=batch_size, cache_path=cache_path,
+                                           reduced=config.get("decode", {}).get("reduced", True))
     extractor.unload_model()  # free GPU/RAM
 
     print(f"  Embeddings shape: {embeddings.shape}")
+    note_items(len(embeddings), "images")
     return embeddings
 
 
@@ -233,15 +265,17 @@ def stage_extract_embeddings(image_paths):
 def stage_train_models(embeddings, labels, metadata):
     """Train baseline, logistic, and deep models. Returns results dict."""
     import yaml
-    import pickle
     import json
+    import shutil
     import numpy as np
     from sklearn.model_selection import train_test_split
     from sklearn.metrics import f1_score
 
-    from src.model.classifier import SklearnClassifier
-    from src.model.baseline import MajorityClassBaseline
-    from src.model.deep_classifier import DeepClassifier
+    from src.model.head_training import train_heads
+    from src.data.taxonomy import Condition
+    from src.data.loader import get_demographic_groups
+    from src.evaluation.prediction_store import PredictionStore, model_version
+    from src.utils.resource_monitor import note_items
     from src.data.sampler import (
         compute_combined_balanced_weights,
         compute_domain_balanced_weights,
@@ -269,12 +303,22 @@ def stage_train_models(embeddings, labels, metadata):
     else:
         stratify_key = labels
 
-    X_train, X_test, y_train, y_test, meta_train, meta_test = train_test_split(
-        emb_np, labels, metadata,
+    X_train, X_test, y_train, y_test, meta_train, meta_test, idx_train, idx_test = train_test_split(
+        emb_np, labels, metadata, np.arange(len(labels)),
         test_size=0.2, random_state=seed, stratify=stratify_key,
     )
     meta_test.to_csv(cache_dir / "test_metadata.csv", index=False)
     print(f"  Train: {len(y_train)}, Test: {len(y_test)}")
+    note_items(len(y_train), "training samples")
+
+    # Per-sample predictions of every model, read back by evaluation
+    split = np.full(len(labels), "train", dtype=object)
+    split[idx_test] = "test"
+    store = PredictionStore.create(
+        cache_dir / "predictions", sample_ids=np.arange(len(labels)), split=split, labels=labels,
+        groups=get_demographic_groups(metadata),
+        condition_labels=metadata["condition_label"].values.astype(float) if "condition_label" in metadata.columns else None,
+    )
 
     # Domain + Fitzpatrick balanced weights
     sample_weights = None
@@ -289,59 +333,106 @@ def stage_train_models(embeddings, labels, metadata):
             sample_weights = compute_domain_balanced_weights(train_domains, y_train)
             print(f"  Domain-balanced weights applied")
 
-    # Train each model type
-    results = {}
-    model_specs = [
-        ("baseline", lambda: MajorityClassBaseline()),
-        ("logistic", lambda: SklearnClassifier(classifier_type="logistic")),
-        ("xgboost", lambda: SklearnClassifier(classifier_type="xgboost")),
-        ("deep", lambda: DeepClassifier(embedding_dim=emb_np.shape[1], device=device)),
+    # Condition / multi-task prerequisites (labels from the already-split metadata)
+    train_condition = config.get("training", {}).get("condition_classifier", False)
+    train_multitask = config.get("training", {}).get("multitask", False)
+    has_condition_labels = "condition_label" in metadata.columns and metadata["condition_label"].notna().sum() > 0
+    if has_condition_labels:
+        cond_train = meta_train["condition_label"].values.astype(float)
+        cond_test = meta_test["condition_label"].values.astype(float)
+        train_mask = ~np.isnan(cond_train)
+        test_mask = ~np.isnan(cond_test)
+    train_condition = train_condition and has_condition_labels
+    enough_condition = train_condition and train_mask.sum() > 100 and test_mask.sum() > 10
+
+    # Independent heads train concurrently in a process pool over one shared
+    # copy of the embeddings (src/model/head_training.py). Workers write the
+    # pickles; metrics, the prediction store and the tables are done here.
+    # training.incremental.enabled streams the sklearn heads' rows off the shared file
+    inc_cfg = config["training"].get("incremental", {})
+    incremental = ({"chunk_size": inc_cfg.get("chunk_size", 8192), "epochs": inc_cfg.get("epochs", 5)}
+                   if inc_cfg.get("enabled", False) else None)
+    jobs = [
+        {"name": model_type, "family": model_type, "model_path": cache_dir / f"classifier_{model_type}.pkl",
+         "rows": idx_train, "y": y_train, "sample_weight": sample_weights,
+         "incremental": incremental if model_type in ("logistic", "xgboost") else None}
+        for model_type in ("baseline", "logistic", "xgboost", "deep")
     ]
+    if enough_condition:
+        y_cond_train = cond_train[train_mask].astype(int)
+        y_cond_test = cond_test[test_mask].astype(int)
+        n_classes = len(np.unique(y_cond_train))
+        for model_type in ("logistic", "deep"):
+            jobs.append({
+                "name": f"condition_{model_type}", "family": model_type,
+                "model_path": cache_dir / f"classifier_condition_{model_type}.pkl",
+                "rows": idx_train[train_mask], "y": y_cond_train,
+                "sample_weight": sample_weights[train_mask] if sample_weights is not None else None,
+                "model_kwargs": {"n_classes": n_classes} if model_type == "deep" else {},
+                "incremental": incremental if model_type == "logistic" else None,
+            })
+    if train_multitask and has_condition_labels:
+        jobs.append({
+            "name": "multitask", "family": "multitask", "model_path": cache_dir / "classifier_multitask.pkl",
+            "rows": idx_train, "y": y_train, "sample_weight": sample_weights, "condition_labels": cond_train,
+            "model_kwargs": {
+                "n_conditions": len(Condition),
+                "condition_weight": config["training"].get("multitask_condition_weight", 0.5),
+            },
+        })
+
+    print()
+    outcomes = {}
+    for outcome in train_heads(jobs, emb_np, n_workers=config["training"].get("parallel_workers"), device=device):
+        outcomes[outcome["name"]] = outcome
+        status = "FAILED" if "error" in outcome else f"fit in {outcome['fit_seconds']:.1f}s"
+        print(f"    {outcome['name']}: {status} ({outcome['threads']} thread(s))")
+
+    def _outcome(name, label):
+        """Columns of a finished job, or None after logging its failure."""
+        outcome = outcomes[name]
+        if "error" in outcome:
+            _warn(label, "Model training failed", RuntimeError(outcome["error"]))
+            print(outcome["traceback"], file=sys.stderr)
+            return None
+        return outcome["columns"]
 
-    for model_type, make_clf in model_specs:
+    results = {}
+    for model_type in ("baseline", "logistic", "xgboost", "deep"):
         print(f"\n  --- Training {model_type} ---")
-        try:
-            clf = make_clf()
-            if model_type == "baseline":
-                clf.fit(X_train, y_train)
-            else:
-                clf.fit(X_train, y_train, sample_weight=sample_weights)
-
-            y_pred_train = clf.predict(X_train)
-            y_pred_test = clf.predict(X_test)
-
-            train_acc = float(np.mean(y_pred_train == y_train))
-            test_acc = float(np.mean(y_pred_test == y_test))
-            test_f1 = float(f1_score(y_test, y_pred_test, average="macro", zero_division=0))
-            train_f1 = float(f1_score(y_train, y_pred_train, average="macro", zero_division=0))
-            test_f1_bin = float(f1_score(y_test, y_pred_test, pos_label=1, zero_division=0))
-
-            print(f"    Train acc={train_acc:.3f}  F1={train_f1:.3f}")
-            print(f"    Test  acc={test_acc:.3f}  F1={test_f1:.3f}  F1(malignant)={test_f1_bin:.3f}")
-
-            results[model_type] = {
-                "train_accuracy": train_acc,
-                "test_accuracy": test_acc,
-                "train_f1_macro": train_f1,
-                "test_f1_macro": test_f1,
-                "test_f1_malignant": test_f1_bin,
-            }
+        columns = _outcome(model_type, f"Train/{model_type}")
+        if columns is None:
+            continue
 
-            # Save model
-            model_path = cache_dir / f"classifier_{model_type}.pkl"
-            with open(model_path, "wb") as f:
-                pickle.dump(clf, f)
-            print(f"    Saved: {model_path}")
+        # One pass over all embeddings; train/test metrics slice it
+        y_pred_train = columns["pred"][idx_train]
+        y_pred_test = columns["pred"][idx_test]
+
+        train_acc = float(np.mean(y_pred_train == y_train))
+        test_acc = float(np.mean(y_pred_test == y_test))
+        test_f1 = float(f1_score(y_test, y_pred_test, average="macro", zero_division=0))
+        train_f1 = float(f1_score(y_train, y_pred_train, average="macro", zero_division=0))
+        test_f1_bin = float(f1_score(y_test, y_pred_test, pos_label=1, zero_division=0))
+
+        print(f"    Train acc={train_acc:.3f}  F1={train_f1:.3f}")
+        print(f"    Test  acc={test_acc:.3f}  F1={test_f1:.3f}  F1(malignant)={test_f1_bin:.3f}")
+
+        results[model_type] = {
+            "train_accuracy": train_acc,
+            "test_accuracy": test_acc,
+            "train_f1_macro": train_f1,
+            "test_f1_macro": test_f1,
+            "test_f1_malignant": test_f1_bin,
+        }
 
-            # Default classifier
-            default_type = config["training"].get("classifier", "logistic")
-            if model_type == default_type or model_type == "logistic":
-                with open(cache_dir / "classifier.pkl", "wb") as f:
-                    pickle.dump(clf, f)
+        model_path = cache_dir / f"classifier_{model_type}.pkl"
+        store.write_model(model_type, columns, version=model_version(model_path))
+        print(f"    Saved: {model_path}")
 
-        except Exception as exc:
-            _warn(f"Train/{model_type}", f"Model training failed", exc)
-            traceback.print_exc()
+        # Default classifier
+        default_type = config["training"].get("classifier", "logistic")
+        if model_type == default_type or model_type == "logistic":
+            shutil.copyfile(model_path, cache_dir / "classifier.pkl")
 
     # Save results JSON
     with open(cache_dir / "training_results.json", "w") as f:
@@ -357,68 +448,38 @@ def stage_train_models(embeddings, labels, metadata):
     # ------------------------------------------------------------------
     # Condition classification (10-class) — if enabled and labels exist
     # ------------------------------------------------------------------
-    train_condition = config.get("training", {}).get("condition_classifier", False)
-    has_condition_labels = "condition_label" in metadata.columns and metadata["condition_label"].notna().sum() > 0
-
-    if train_condition and has_condition_labels:
+    if train_condition:
         print(f"\n\n  === Condition Classification (10-class) ===")
 
-        # Extract condition labels from the already-split metadata DataFrames
-        cond_train = meta_train["condition_label"].values.astype(float)
-        cond_test = meta_test["condition_label"].values.astype(float)
-
-        # Filter out NaN condition labels
-        train_mask = ~np.isnan(cond_train)
-        test_mask = ~np.isnan(cond_test)
-
-        if train_mask.sum() > 100 and test_mask.sum() > 10:
-            X_cond_train = X_train[train_mask]
-            y_cond_train = cond_train[train_mask].astype(int)
-            X_cond_test = X_test[test_mask]
-            y_cond_test = cond_test[test_mask].astype(int)
-
-            n_classes = len(np.unique(y_cond_train))
+        if enough_condition:
             print(f"  Condition train: {len(y_cond_train)}, test: {len(y_cond_test)}, classes: {n_classes}")
 
             cond_results = {}
-            cond_model_specs = [
-                ("logistic", lambda: SklearnClassifier(classifier_type="logistic")),
-                ("deep", lambda: DeepClassifier(
-                    embedding_dim=emb_np.shape[1], n_classes=n_classes, device=device
-                )),
-            ]
-
-            for model_type, make_clf in cond_model_specs:
+            for model_type in ("logistic", "deep"):
                 print(f"\n  --- Training condition/{model_type} ---")
-                try:
-                    clf = make_clf()
-                    clf.fit(X_cond_train, y_cond_train, sample_weight=sample_weights[train_mask] if sample_weights is not None else None)
+                columns = _outcome(f"condition_{model_type}", f"Train/condition_{model_type}")
+                if columns is None:
+                    continue
 
-                    y_pred_test = clf.predict(X_cond_test)
-                    test_acc = float(np.mean(y_pred_test == y_cond_test))
-                    test_f1 = float(f1_score(y_cond_test, y_pred_test, average="macro", zero_division=0))
+                y_pred_test = columns["pred"][idx_test][test_mask]
+                test_acc = float(np.mean(y_pred_test == y_cond_test))
+                test_f1 = float(f1_score(y_cond_test, y_pred_test, average="macro", zero_division=0))
 
-                    print(f"    Test acc={test_acc:.3f}  F1 macro={test_f1:.3f}")
+                print(f"    Test acc={test_acc:.3f}  F1 macro={test_f1:.3f}")
 
-                    cond_results[model_type] = {
-                        "test_accuracy": test_acc,
-                        "test_f1_macro": test_f1,
-                    }
+                cond_results[model_type] = {
+                    "test_accuracy": test_acc,
+                    "test_f1_macro": test_f1,
+                }
 
-                    # Save model
-                    model_path = cache_dir / f"classifier_condition_{model_type}.pkl"
-                    with open(model_path, "wb") as f:
-                        pickle.dump(clf, f)
-                    print(f"    Saved: {model_path}")
+                model_path = cache_dir / f"classifier_condition_{model_type}.pkl"
+                store.write_model(f"condition_{model_type}", columns,
+                                  version=model_version(model_path), task="condition")
+                print(f"    Saved: {model_path}")
 
-                    # Default condition classifier (prefer logistic)
-                    if model_type == "logistic":
-                        with open(cache_dir / "classifier_condition.pkl", "wb") as f:
-                            pickle.dump(clf, f)
-
-                except Exception as exc:
-                    _warn(f"Train/condition_{model_type}", f"Condition model training failed", exc)
-                    traceback.print_exc()
+                # Default condition classifier (prefer logistic)
+                if model_type == "logistic":
+                    shutil.copyfile(model_path, cache_dir / "classifier_condition.pkl")
 
             # Save condition results
             with open(cache_dir / "condition_training_results.json", "w") as f:
@@ -433,6 +494,42 @@ def stage_train_models(embeddings, labels, metadata):
             print(f"  Skipping condition training: insufficient labeled data "
                   f"(train={train_mask.sum()}, test={test_mask.sum()})")
 
+    # ------------------------------------------------------------------
+    # Joint binary + condition head — one embedding, one forward at serving
+    # ------------------------------------------------------------------
+    if train_multitask and has_condition_labels:
+        print(f"\n\n  === Multi-Task Head (binary + condition) ===")
+        columns = _outcome("multitask", "Train/multitask")
+        if columns is not None:
+            y_pred_train = columns["pred"][idx_train]
+            y_pred_test = columns["pred"][idx_test]
+            cond_proba_test = columns["condition_proba"][idx_test]
+            y_cond_pred = cond_proba_test[test_mask].argmax(1)
+            y_cond_true = cond_test[test_mask].astype(int)
+
+            results["multitask"] = {
+                "train_accuracy": float(np.mean(y_pred_train == y_train)),
+                "test_accuracy": float(np.mean(y_pred_test == y_test)),
+                "train_f1_macro": float(f1_score(y_train, y_pred_train, average="macro", zero_division=0)),
+                "test_f1_macro": float(f1_score(y_test, y_pred_test, average="macro", zero_division=0)),
+                "test_f1_malignant": float(f1_score(y_test, y_pred_test, pos_label=1, zero_division=0)),
+                "condition_test_accuracy": float(np.mean(y_cond_pred == y_cond_true)) if test_mask.any() else float("nan"),
+                "condition_test_f1_macro": float(
+                    f1_score(y_cond_true, y_cond_pred, average="macro", zero_division=0)
+                ) if test_mask.any() else float("nan"),
+            }
+            r = results["multitask"]
+            print(f"    Binary    acc={r['test_accuracy']:.3f}  F1={r['test_f1_macro']:.3f}  "
+                  f"F1(malignant)={r['test_f1_malignant']:.3f}")
+            print(f"    Condition acc={r['condition_test_accuracy']:.3f}  F1 macro={r['condition_test_f1_macro']:.3f}")
+
+            model_path = cache_dir / "classifier_multitask.pkl"
+            store.write_model("multitask", columns, version=model_version(model_path), task="multitask")
+            print(f"    Saved: {model_path}")
+
+            with open(cache_dir / "training_results.json", "w") as f:
+                json.dump(results, f, indent=2)
+
     return results
 
 
@@ -457,6 +554,8 @@ def stage_finetune(image_paths, labels, metadata, epochs=10, unfreeze_layers=4):
 
     from src.model.deep_classifier import EndToEndClassifier
     from src.data.sampler import compute_stratified_split_key
+    from src.utils.resource_monitor import note_items
+    from src.data.taxonomy import Condition
 
     config_path = PROJECT_ROOT / "configs" / "config.yaml"
     with open(config_path) as f:
@@ -493,6 +592,15 @@ def stage_finetune(image_paths, labels, metadata, epochs=10, unfreeze_layers=4):
     y_train = labels[train_idx]
     y_test = labels[test_idx]
 
+    # Joint condition head when enabled and condition labels exist
+    cond_train, cond_test, n_conditions = None, None, 0
+    if config["training"].get("multitask", False) and "condition_label" in metadata.columns:
+        cond_all = metadata["condition_label"].values.astype(float)
+        if (~np.isnan(cond_all)).any():
+            cond_train, cond_test = cond_all[train_idx], cond_all[test_idx]
+            n_conditions = len(Condition)
+            print(f"  Multi-task fine-tuning: binary + {n_conditions}-class condition head")
+
     # Load images into memory (required for end-to-end training)
     print(f"  Loading {len(train_paths)} training images into memory...")
     train_images = []
@@ -512,6 +620,7 @@ def stage_finetune(image_paths, labels, metadata, epochs=10, unfreeze_layers=4):
 
     # Train end-to-end
     print(f"  Fine-tuning SigLIP (last {unfreeze_layers} layers, {epochs} epochs)")
+    note_items(len(train_images) * epochs, "image-epochs")
     print(f"  Device: {device}")
 
     model = EndToEndClassifier(
@@ -520,6 +629,8 @@ def stage_finetune(image_paths, labels, metadata, epochs=10, unfreeze_layers=4):
         n_classes=2,
         dropout=0.3,
         unfreeze_layers=unfreeze_layers,
+        n_conditions=n_conditions,
+        condition_weight=config["training"].get("multitask_condition_weight", 0.5),
         lr_head=1e-3,
         lr_backbone=1e-5,
         epochs=epochs,
@@ -528,10 +639,14 @@ def stage_finetune(image_paths, labels, metadata, epochs=10, unfreeze_layers=4):
         device=device,
     )
 
-    model.fit(train_images, y_train, val_images=test_images, val_labels=y_test)
+    model.fit(
+        train_images, y_train, val_images=test_images, val_labels=y_test,
+        condition_labels=cond_train, val_condition_labels=cond_test,
+    )
 
     # Evaluate
-    y_pred = model.predict(test_images)
+    test_out = model.predict_all(test_images)
+    y_pred, cond_proba = test_out["pred"], test_out["condition_proba"]
     test_acc = float(np.mean(y_pred == y_test))
     test_f1 = float(f1_score(y_test, y_pred, average="macro", zero_division=0))
     test_f1_bin = float(f1_score(y_test, y_pred, pos_label=1, zero_division=0))
@@ -539,6 +654,19 @@ def stage_finetune(image_paths, labels, metadata, epochs=10, unfreeze_layers=4):
     print(f"\n  Fine-tuned results:")
     print(f"    Test acc={test_acc:.3f}  F1 macro={test_f1:.3f}  F1(malignant)={test_f1_bin:.3f}")
 
+    cond_results = {}
+    if cond_proba is not None:
+        cond_mask = ~np.isnan(cond_test)
+        if cond_mask.any():
+            y_cond_true = cond_test[cond_mask].astype(int)
+            y_cond_pred = cond_proba[cond_mask].argmax(1)
+            cond_results = {
+                "condition_test_accuracy": float(np.mean(y_cond_pred == y_cond_true)),
+                "condition_test_f1_macro": float(f1_score(y_cond_true, y_cond_pred, average="macro", zero_division=0)),
+            }
+            print(f"    Condition acc={cond_results['condition_test_accuracy']:.3f}  "
+                  f"F1 macro={cond_results['condition_test_f1_macro']:.3f}")
+
     # Export
     export_dir = cache_dir / "finetuned_model"
     model.export_for_inference(str(export_dir))
@@ -549,6 +677,7 @@ def stage_finetune(image_paths, labels, metadata, epochs=10, unfreeze_layers=4):
         "test_accuracy": test_acc,
         "test_f1_macro": test_f1,
         "test_f1_malignant": test_f1_bin,
+        **cond_results,
         "epochs": epochs,
         "unfreeze_layers": unfreeze_layers,
         "training_history": model.training_history,
@@ -572,15 +701,16 @@ def stage_evaluate():
     """Run fairness evaluation on all trained models."""
     import yaml
     import json
-    import pickle
     import numpy as np
     import pandas as pd
     import torch
     from sklearn.model_selection import train_test_split
 
     from src.evaluation.metrics import robustness_report, compare_models
+    from src.evaluation.prediction_store import PredictionStore, load_or_predict
     from src.data.loader import get_demographic_groups
     from src.model.triage import TriageSystem
+    from src.utils.resource_monitor import note_items
 
     config_path = PROJECT_ROOT / "configs" / "config.yaml"
     with open(config_path) as f:
@@ -605,24 +735,35 @@ def stage_evaluate():
             f"Re-run training (without --skip-train) to regenerate matching artifacts."
         )
 
-    # Reconstruct test split
     labels_all = all_meta["label"].values if "label" in all_meta.columns else None
     if labels_all is None:
         from src.data.loader import BINARY_MAPPING
         labels_all = np.array([BINARY_MAPPING.get(dx, 0) for dx in all_meta["dx"]])
 
-    indices = np.arange(len(all_meta))
-    _, test_idx = train_test_split(indices, test_size=0.2, random_state=seed, stratify=labels_all)
+    # Predictions written at training time; models are only re-run when retrained since
+    store = PredictionStore.open(cache_dir / "predictions")
+    if store is not None and store.n_samples != len(all_meta):
+        print("  Prediction store does not match metadata.csv, predicting from models")
+        store = None
+
+    # Test split: the one training used, else reconstruct it
+    if store is not None:
+        test_idx = np.asarray(store.index("test")["sample_id"])
+    else:
+        indices = np.arange(len(all_meta))
+        _, test_idx = train_test_split(indices, test_size=0.2, random_state=seed, stratify=labels_all)
 
     X_test = embeddings[test_idx].numpy()
     y_test = labels_all[test_idx]
+    note_items(len(y_test), "test samples")
     test_meta = all_meta.iloc[test_idx].reset_index(drop=True)
-    groups = get_demographic_groups(test_meta)
+    groups = store.groups("test") if store is not None else get_demographic_groups(test_meta)
 
     triage = TriageSystem(config.get("triage", {}))
+    boot_cfg = config.get("evaluation", {}).get("bootstrap", {})
 
     # Evaluate each trained model
-    model_names = ["baseline", "logistic", "xgboost", "deep"]
+    model_names = ["baseline", "logistic", "xgboost", "deep", "multitask"]
     all_results = {}
 
     for model_name in model_names:
@@ -631,18 +772,18 @@ def stage_evaluate():
             print(f"  [--] {model_name}: not found, skipping")
             continue
 
-        with open(model_path, "rb") as f:
-            clf = pickle.load(f)
-
-        y_pred = clf.predict(X_test)
-        y_proba = clf.predict_proba(X_test) if hasattr(clf, "predict_proba") else None
+        predictions = load_or_predict(model_name, model_path, X_test, store)
+        y_pred, y_proba = predictions["pred"], predictions.get("proba")
 
         report = robustness_report(
             y_test, y_pred, groups=groups,
             class_names=["benign", "malignant"], y_proba=y_proba,
+            n_bootstrap=boot_cfg.get("n_bootstrap", 0),
+            bootstrap_seed=boot_cfg.get("seed", seed),
+            ci_level=boot_cfg.get("ci_level", 0.95),
         )
 
-        print(f"\n  {model_name}: acc={report['overall_accuracy']:.3f}  "
+        print(f"\n  {model_name} ({predictions['source']}): acc={report['overall_accuracy']:.3f}  "
               f"bal_acc={report['balanced_accuracy']:.3f}  "
               f"F1={report['f1_macro']:.3f}  "
               f"AUC={report.get('auc', float('nan')):.3f}")
@@ -653,6 +794,11 @@ def stage_evaluate():
             if gap_key in report:
                 eq = report[gap_key]
                 print(f"    {axis} eq. odds gap: sens={eq['sensitivity_gap']:.3f} spec={eq['specificity_gap']:.3f}")
+                ci = report.get("confidence_intervals", {}).get(gap_key)
+                if ci:
+                    lo, hi = ci["max_gap"]
+                    print(f"      max gap {eq['max_gap']:.3f}  "
+                          f"{100 * report['confidence_intervals']['ci_level']:.0f}% CI [{lo:.3f}, {hi:.3f}]")
 
         # Triage distribution
         if y_proba is not None:
@@ -680,16 +826,13 @@ def stage_evaluate():
     if cond_classifier_path.exists() and "condition_label" in test_meta.columns:
         print(f"\n\n  === Condition Evaluation (10-class) ===")
         try:
-            with open(cond_classifier_path, "rb") as f:
-                cond_clf = pickle.load(f)
-
             cond_labels = test_meta["condition_label"].values.astype(float)
             cond_mask = ~np.isnan(cond_labels)
 
             if cond_mask.sum() > 10:
-                X_cond = X_test[cond_mask]
                 y_cond = cond_labels[cond_mask].astype(int)
-                y_cond_pred = cond_clf.predict(X_cond)
+                y_cond_pred = load_or_predict("condition_logistic", cond_classifier_path, X_test, store)["pred"]
+                y_cond_pred = np.asarray(y_cond_pred)[cond_mask]
 
                 from src.evaluation.metrics import condition_classification_report
                 from src.data.taxonomy import CONDITION_NAMES, Condition
@@ -707,6 +850,25 @@ def stage_evaluate():
             _warn("Evaluate/condition", "Condition evaluation failed", exc)
             traceback.print_exc()
 
+    # Condition head of the joint multi-task model
+    multitask_path = cache_dir / "classifier_multitask.pkl"
+    if multitask_path.exists() and "condition_label" in test_meta.columns:
+        try:
+            from src.evaluation.metrics import condition_classification_report
+
+            cond_labels = test_meta["condition_label"].values.astype(float)
+            cond_mask = ~np.isnan(cond_labels)
+            if cond_mask.sum() > 10:
+                mt_pred = load_or_predict("multitask", multitask_path, X_test, store)
+                y_cond_pred = np.asarray(mt_pred["condition_proba"])[cond_mask].argmax(1)
+                mt_report = condition_classification_report(cond_labels[cond_mask].astype(int), y_cond_pred)
+                all_results["condition_multitask"] = mt_report
+                print(f"\n  Multi-task condition head: acc={mt_report['accuracy']:.3f}  "
+                      f"F1 macro={mt_report['f1_macro']:.3f}")
+        except Exception as exc:
+            _warn("Evaluate/condition_multitask", "Multi-task condition evaluation failed", exc)
+            traceback.print_exc()
+
     # Save
     def _convert(obj):
         import numpy as _np
@@ -744,6 +906,136 @@ def stage_launch_app():
     )
 
 
+# ---------------------------------------------------------------------------
+# Stage cache: declared inputs and outputs of each stage
+# ---------------------------------------------------------------------------
+
+STAGE_ORDER = ("load_data", "extract_embeddings", "train_models", "finetune", "evaluate")
+
+
+def _stage_specs(config, args):
+    """Fingerprint inputs and outputs per stage (see src/utils/stage_cache.py).
+
+    Head/training code is deliberately not an input of extract_embeddings,
+    so iterating on a classifier never re-extracts embeddings. The stage
+    bodies live in this file; each stage fingerprints the source of its own
+    function ("functions") rather than the whole file, for the same reason.
+    """
+    cache = Path("results") / "cache"
+    classifiers = [cache / f"classifier_{m}.pkl" for m in
+                   ("baseline", "logistic", "xgboost", "deep", "multitask", "condition")]
+    return {
+        "load_data": {
+            "functions": [stage_load_data],
+            "config": {"data": config.get("data")},
+            "params": {"sample_n": 500 if args.quick else 0},
+            "code": ["src/data"],
+            "inputs": list(_DATASET_MANIFESTS.values()),
+            "outputs": [cache / "metadata.csv"],
+        },
+        "extract_embeddings": {
+            "functions": [stage_extract_embeddings],
+            # The API byte/pixel caps do not change what extraction decodes
+            "config": {"model": config.get("model"),
+                       "decode": {"reduced": (config.get("decode") or {}).get("reduced", True)}},
+            "code": ["src/model/embeddings.py", "src/model/preprocessing.py"],
+            # metadata.csv is content-hashed, so load_data code edits that do not
+            # change the sample list leave the embeddings alone (no upstream)
+            "inputs": [cache / "metadata.csv"],
+            "outputs": [cache / "embeddings.pt"],
+        },
+        "train_models": {
+            "functions": [stage_train_models],
+            # Pool size changes how fast the heads train, not what they learn
+            "config": {"training": {k: v for k, v in (config.get("training") or {}).items()
+                                    if k != "parallel_workers"}},
+            "code": ["src/model/classifier.py", "src/model/deep_classifier.py", "src/model/baseline.py",
+                     "src/model/incremental.py", "src/model/head_training.py", "src/data/sampler.py",
+                     "src/data/taxonomy.py", "src/evaluation/prediction_store.py"],
+            "inputs": [cache / "metadata.csv", cache / "embeddings.pt"],
+            "upstream": ["extract_embeddings"],
+            "outputs": [cache / "training_results.json", cache / "classifier.pkl",
+                        cache / "predictions" / "manifest.json"],
+        },
+        "finetune": {
+            "functions": [stage_finetune],
+            "config": {"training": config.get("training")},
+            "params": {"epochs": args.finetune_epochs, "unfreeze_layers": args.finetune_layers},
+            "code": ["src/model/deep_classifier.py", "src/data/sampler.py"],
+            "inputs": [cache / "metadata.csv"],
+            "upstream": ["load_data"],
+            "outputs": [cache / "finetuned_model" / "config.json", cache / "finetune_results.json"],
+        },
+        "evaluate": {
+            "functions": [stage_evaluate],
+            "config": {k: config.get(k) for k in ("evaluation", "triage", "training")},
+            "code": ["src/evaluation", "src/model/triage.py"],
+            "inputs": [cache / "metadata.csv", cache / "embeddings.pt",
+                       cache / "predictions" / "manifest.json", *classifiers],
+            "upstream": ["train_models"],
+            "outputs": [cache / "evaluation_results.json"],
+        },
+    }
+
+
+def _stage_fingerprint(stage_cache, specs, key):
+    import hashlib
+    import inspect
+
+    spec = specs[key]
+    params = dict(spec.get("params") or {})
+    params["functions"] = {fn.__name__: hashlib.sha256(inspect.getsource(fn).encode()).hexdigest()
+                           for fn in spec.get("functions", ())}
+    return stage_cache.fingerprint(
+        key, config=spec.get("config"), params=params, code=spec.get("code", ()),
+        inputs=spec.get("inputs", ()), upstream=spec.get("upstream", ()),
+    )
+
+
+def _run_cached(stage_cache, specs, key, title, fn, *args, always=False, **kwargs):
+    """Run a stage unless --resume finds a matching recorded run (or always=True).
+
+    Returns (ran, result); result is None when the stage was skipped or failed.
+    """
+    fp = _stage_fingerprint(stage_cache, specs, key)
+    outputs = specs[key]["outputs"]
+    if not always and stage_cache.is_fresh(key, fp, outputs):
+        _banner(title)
+        print(f"  [cached] fingerprint {fp} matches the last successful run, skipping")
+        _stage_times[title] = 0.0
+        from src.utils.resource_monitor import skipped_record
+        _stage_profiles.append(skipped_record(title))
+        return False, None
+    if stage_cache.resume:
+        print(f"\n  {key}: {stage_cache.explain(key, fp, outputs)}, running")
+
+    n_warnings = len(_warnings)
+    result = _run_stage(title, fn, *args, **kwargs)
+    if title in _stage_failed:
+        stage_cache.invalidate(key)
+    elif len(_warnings) > n_warnings:
+        # A model inside the stage failed (logged via _warn); run the stage again next time
+        print(f"  {key}: {len(_warnings) - n_warnings} failure(s) inside the stage, not recording it as cached")
+        stage_cache.invalidate(key)
+    else:
+        stage_cache.record(key, fp, outputs, _stage_times.get(title))
+    return True, result
+
+
+def _load_cached_data():
+    """(labels, metadata) from results/cache/metadata.csv when load_data was skipped."""
+    import numpy as np
+    import pandas as pd
+
+    metadata = pd.read_csv(PROJECT_ROOT / "results" / "cache" / "metadata.csv")
+    if "label" in metadata.columns:
+        labels = metadata["label"].values
+    else:
+        from src.data.loader import BINARY_MAPPING
+        labels = np.array([BINARY_MAPPING.get(dx, 0) for dx in metadata["dx"]])
+    return labels, metadata
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
@@ -769,8 +1061,18 @@ def main():
                         help="Epochs for end-to-end fine-tuning (default: 10)")
     parser.add_argument("--finetune-layers", type=int, default=4,
                         help="Number of SigLIP layers to unfreeze (default: 4)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip stages whose config, data, code and upstream artifacts are unchanged")
+    parser.add_argument("--force", nargs="+", default=[], choices=STAGE_ORDER, metavar="STAGE",
+                        help=f"Re-run these stages even with --resume ({', '.join(STAGE_ORDER)})")
+    parser.add_argument("--profile", nargs="?", const="all", default=None, metavar="TARGETS",
+                        help="Operator-level profiling of a window of batches: all, or a comma list of "
+                             "extract,finetune,analyze (sets SKINTAG_PROFILE; see src/utils/profiling.py)")
     args = parser.parse_args()
 
+    if args.profile:
+        os.environ["SKINTAG_PROFILE"] = args.profile
+
     _banner("SkinTag Pipeline")
     print("  Run with --quick for a fast smoke test (500 samples)")
     print("  Run with --no-app to skip the web app at the end")
@@ -789,56 +1091,111 @@ def main():
         print("\nEnvironment check failed. Fix issues above and re-run.")
         return
 
+    import yaml
+    from src.utils.stage_cache import StageCache
+
+    with open(PROJECT_ROOT / "configs" / "config.yaml") as f:
+        config = yaml.safe_load(f)
+    cache_dir = PROJECT_ROOT / "results" / "cache"
+    stage_cache = StageCache(cache_dir / "pipeline_state.json", PROJECT_ROOT,
+                             resume=args.resume, force=args.force)
+    specs = _stage_specs(config, args)
+
     image_paths, labels, metadata, embeddings = None, None, None, None
 
     if not args.skip_train:
-        # Stage 2: Load data (metadata + paths only, no image I/O)
-        sample_n = 500 if args.quick else 0
-        result = _run_stage("2. Load Data", stage_load_data, sample_n)
-        if result is not None:
-            image_paths, labels, metadata = result
+        # Stage 2: Load data (metadata + paths only, no image I/O). Skipping it
+        # is only useful when nothing downstream needs the image paths.
+        load_fp = _stage_fingerprint(stage_cache, specs, "load_data")
+        load_fresh = stage_cache.is_fresh("load_data", load_fp, specs["load_data"]["outputs"])
+        needs_paths = False
+        if load_fresh:
+            needs_paths = not all(
+                stage_cache.is_fresh(k, _stage_fingerprint(stage_cache, specs, k), specs[k]["outputs"])
+                for k in ["extract_embeddings"] + (["finetune"] if args.finetune else [])
+            )
+        if load_fresh and not needs_paths:
+            _run_cached(stage_cache, specs, "load_data", "2. Load Data", stage_load_data)
+            labels, metadata = _load_cached_data()
         else:
-            print("\nData loading failed. Check dataset paths in PLAN.md.")
-            _print_summary(t_start)
-            return
-
-        # Stage 3: Extract embeddings (images loaded per-batch from paths)
-        embeddings = _run_stage("3. Extract Embeddings", stage_extract_embeddings, image_paths)
-        if embeddings is None:
+            if needs_paths:
+                print("\n  load_data: unchanged, but re-reading image paths for the stages below")
+            sample_n = 500 if args.quick else 0
+            _, result = _run_cached(stage_cache, specs, "load_data", "2. Load Data", stage_load_data, sample_n,
+                                    always=needs_paths)
+            if result is not None:
+                image_paths, labels, metadata = result
+            else:
+                print("\nData loading failed. Check dataset paths in PLAN.md.")
+                _print_summary(t_start, args)
+                return
+
+        # Stage 3: Extract embeddings (images loaded per-batch from paths).
+        # Under --resume, a recorded run with a different fingerprint means the
+        # cached file is stale; a plain run reuses it as before (row count permitting).
+        refresh = "extract_embeddings" in args.force
+        if args.resume and not refresh:
+            emb_fp = _stage_fingerprint(stage_cache, specs, "extract_embeddings")
+            previous = stage_cache.recorded("extract_embeddings").get("fingerprint")
+            refresh = previous is not None and previous != emb_fp
+        ran, embeddings = _run_cached(
+            stage_cache, specs, "extract_embeddings", "3. Extract Embeddings",
+            stage_extract_embeddings, image_paths, refresh,
+        )
+        if ran and embeddings is None:
             print("\nEmbedding extraction failed. Check SigLIP model / internet connection.")
-            _print_summary(t_start)
+            _print_summary(t_start, args)
             return
 
-        # Stage 4: Train models
-        _run_stage("4. Train Models", stage_train_models, embeddings, labels, metadata)
+        # Stage 4: Train models (cached embeddings are loaded only if training runs)
+        train_fp = _stage_fingerprint(stage_cache, specs, "train_models")
+        if not stage_cache.is_fresh("train_models", train_fp, specs["train_models"]["outputs"]) and embeddings is None:
+            import torch
+            embeddings = torch.load(cache_dir / "embeddings.pt", weights_only=True)
+        _run_cached(stage_cache, specs, "train_models", "4. Train Models",
+                    stage_train_models, embeddings, labels, metadata)
 
         # Stage 4b: Fine-tune SigLIP end-to-end (optional)
         if args.finetune:
-            _run_stage(
-                "4b. Fine-Tune SigLIP (End-to-End)",
+            _run_cached(
+                stage_cache, specs, "finetune", "4b. Fine-Tune SigLIP (End-to-End)",
                 stage_finetune, image_paths, labels, metadata,
                 args.finetune_epochs, args.finetune_layers,
             )
 
     # Stage 5: Evaluate
-    _run_stage("5. Evaluate (Fairness)", stage_evaluate)
+    _run_cached(stage_cache, specs, "evaluate", "5. Evaluate (Fairness)", stage_evaluate)
 
     # Stage 6: Web app
     if not args.no_app:
-        _print_summary(t_start)
+        _print_summary(t_start, args)
         _run_stage("6. Launch Web App", stage_launch_app)
     else:
-        _print_summary(t_start)
+        _print_summary(t_start, args)
+
 
+def _print_summary(t_start, args=None):
+    from src.utils.resource_monitor import find_regressions, format_profile_table, load_history, write_profile
 
-def _print_summary(t_start):
     elapsed = time.time() - t_start
     _banner("Pipeline Summary")
     print(f"  Total elapsed: {elapsed:.1f}s\n")
 
-    print("  Stage Timings:")
-    for name, t in _stage_times.items():
-        print(f"    {name:<35} {t:>8.1f}s")
+    print("  Stage Resources:")
+    print(format_profile_table(_stage_profiles))
+
+    # Machine-readable profile; history only compares runs with the same flags
+    cache_dir = PROJECT_ROOT / "results" / "cache"
+    history_path = cache_dir / "pipeline_profile_history.jsonl"
+    params = {k: getattr(args, k, None) for k in ("quick", "skip_train", "finetune", "finetune_epochs", "finetune_layers")}
+    history = [run for run in load_history(history_path) if run.get("params") == params]
+    write_profile(_stage_profiles, cache_dir / "pipeline_profile.json", history_path,
+                  run_info={"params": params, "total_seconds": round(elapsed, 1)})
+    print(f"\n  Profile: {cache_dir / 'pipeline_profile.json'} (history: {history_path.name}, "
+          f"{len(history)} comparable earlier runs)")
+    for r in find_regressions(_stage_profiles, history):
+        print(f"  [REGRESSION] {r['stage']}: {r['metric']} {r['value']:.1f} vs median {r['baseline']:.1f} "
+              f"over {r['n_runs']} runs (+{r['change']:.0%})")
 
     if _warnings:
         print(f"\n  WARNINGS ({len(_warnings)}):")
@@ -849,22 +1206,23 @@ def _print_summary(t_start):
         print("\n  All stages completed successfully.")
 
     # Check what artifacts exist
-    cache_dir = PROJECT_ROOT / "results" / "cache"
     artifacts = [
         ("embeddings.pt", "SigLIP embeddings"),
         ("classifier_baseline.pkl", "Baseline model (binary)"),
         ("classifier_logistic.pkl", "Logistic regression (binary)"),
         ("classifier_xgboost.pkl", "XGBoost gradient boosting (binary)"),
         ("classifier_deep.pkl", "Deep MLP (binary)"),
+        ("classifier_multitask.pkl", "Multi-task head (binary + condition)"),
         ("classifier.pkl", "Default binary model (for app)"),
         ("finetuned_model/config.json", "Fine-tuned SigLIP config (optional)"),
-        ("finetuned_model/model_state.pt", "Fine-tuned SigLIP weights (optional)"),
+        ("finetuned_model/model.safetensors", "Fine-tuned SigLIP weights (optional)"),
         ("classifier_condition_logistic.pkl", "Logistic regression (condition)"),
         ("classifier_condition_deep.pkl", "Deep MLP (condition)"),
         ("classifier_condition.pkl", "Default condition model"),
         ("training_results.json", "Binary training metrics"),
         ("condition_training_results.json", "Condition training metrics"),
         ("evaluation_results.json", "Full evaluation (both targets)"),
+        ("pipeline_profile.json", "Per-stage resource profile"),
         ("metadata.csv", "Dataset metadata"),
         ("test_metadata.csv", "Test split metadata"),
     ]
@@ -0,0 +1,446 @@
+"""Offline synthetic benchmark suite — no dataset or model download needed.
+
+Builds a tiny randomly initialized SigLIP (src/utils/synthetic.py) and
+synthetic lesion images, then times the hot paths:
+
+    extract           EmbeddingExtractor.extract on one batch (images/s)
+    extract_dataset   extract_dataset from JPEG paths, decode included (images/s)
+    preprocess        HF image processor vs SiglipPreprocessor (src/model/preprocessing.py) per batch (images/s)
+    decode            decode + SigLIP preprocess of phone-sized JPEGs, full vs reduced decoding (ms);
+                      first checks reduced decoding of palette / 1-bit / 16-bit / CMYK inputs
+    head              predict_proba of logistic / XGBoost / deep heads at several batch sizes (rows/s)
+    triage            TriageSystem.assess_batch (assessments/s)
+    robustness        robustness_report with demographic groups (seconds)
+    api               /api/analyze latency through an in-process client (p50 ms)
+
+Results go to results/benchmarks/latest.json and are compared against a
+stored baseline (results/benchmarks/baseline.json); a metric that is worse
+than the baseline by more than --tolerance is a regression and the script
+exits with status 1. Baselines are only meaningful on the same machine.
+
+Usage:
+    python scripts/benchmark.py                      # run all, compare with baseline
+    python scripts/benchmark.py --save-baseline      # record this run as the baseline
+    python scripts/benchmark.py --only extract head --tolerance 0.3
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import io
+import json
+import os
+import platform
+import statistics
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.utils.synthetic import (
+    build_tiny_serving_cache,
+    build_tiny_siglip,
+    synthetic_labels_and_groups,
+    synthetic_lesion_array,
+    synthetic_lesion_images,
+    write_synthetic_images,
+)
+
+BENCH_DIR = PROJECT_ROOT / "results" / "benchmarks"
+EMBEDDING_DIM = 1152  # heads are benchmarked at the production embedding width
+
+
+def _timeit(fn, repeats: int, warmup: int = 1) -> list:
+    """Seconds per call for `repeats` calls after `warmup` untimed ones."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _entry(value, unit, higher_is_better, **extra) -> dict:
+    return {"value": round(float(value), 4), "unit": unit, "higher_is_better": higher_is_better, **extra}
+
+
+def _percentile_ms(times, q) -> float:
+    return float(np.percentile(times, q) * 1000)
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks: each returns {name: entry}
+# ---------------------------------------------------------------------------
+
+def bench_extract(ctx) -> dict:
+    from src.model.embeddings import EmbeddingExtractor
+
+    extractor = EmbeddingExtractor(model_name=str(ctx["tiny_dir"]), device="cpu").load_model()
+    results = {}
+    for batch_size in ctx["extract_batch_sizes"]:
+        batch = ctx["images"][:batch_size]
+        times = _timeit(lambda: extractor.extract(batch), ctx["repeats"])
+        results[f"extract/bs{batch_size}"] = _entry(
+            batch_size / statistics.median(times), "images/s", True,
+            p95_ms=round(_percentile_ms(times, 95), 2),
+        )
+    return results
+
+
+def bench_extract_dataset(ctx) -> dict:
+    from src.model.embeddings import EmbeddingExtractor
+
+    extractor = EmbeddingExtractor(model_name=str(ctx["tiny_dir"]), device="cpu").load_model()
+    paths = ctx["paths"]
+    times = _timeit(lambda: extractor.extract_dataset(paths, batch_size=8, profile=False),
+                    max(1, ctx["repeats"] // 3))
+    return {"extract_dataset": _entry(len(paths) / statistics.median(times), "images/s", True,
+                                      n_images=len(paths), batch_size=8)}
+
+
+def bench_head(ctx) -> dict:
+    from src.model.classifier import SklearnClassifier
+    from src.model.deep_classifier import DeepClassifier
+
+    rng = np.random.default_rng(0)
+    n_train = 2000
+    X = rng.normal(size=(n_train, EMBEDDING_DIM)).astype(np.float32)
+    y = (X[:, 0] + 0.5 * rng.normal(size=n_train) > 0).astype(int)
+    heads = {
+        "logistic": SklearnClassifier("logistic"),
+        "xgboost": SklearnClassifier("xgboost", params={"n_estimators": 100}),
+        "deep": DeepClassifier(embedding_dim=EMBEDDING_DIM, epochs=3, device="cpu"),
+    }
+    results = {}
+    for name, clf in heads.items():
+        clf.fit(X, y)
+        for batch_size in ctx["head_batch_sizes"]:
+            Xb = rng.normal(size=(batch_size, EMBEDDING_DIM)).astype(np.float32)
+            times = _timeit(lambda: clf.predict_proba(Xb), ctx["repeats"])
+            results[f"head/{name}/bs{batch_size}"] = _entry(
+                batch_size / statistics.median(times), "rows/s", True,
+                p50_ms=round(_percentile_ms(times, 50), 3),
+            )
+    return results
+
+
+def bench_triage(ctx) -> dict:
+    import yaml
+    from src.model.triage import TriageSystem
+
+    with open(PROJECT_ROOT / "configs" / "config.yaml") as f:
+        triage = TriageSystem(yaml.safe_load(f).get("triage", {}))
+    n = 10000
+    _, proba, _ = synthetic_labels_and_groups(n)
+    times = _timeit(lambda: triage.assess_batch(proba[:, 1]), ctx["repeats"])
+    return {"triage/assess_batch": _entry(n / statistics.median(times), "assessments/s", True, n=n)}
+
+
+def bench_robustness(ctx) -> dict:
+    from src.evaluation.metrics import robustness_report
+
+    n = 2000
+    labels, proba, groups = synthetic_labels_and_groups(n)
+    y_pred = (proba[:, 1] > 0.5).astype(int)
+    results = {}
+    for n_bootstrap in (0, 200):
+        times = _timeit(
+            lambda: robustness_report(labels, y_pred, groups=groups, class_names=["benign", "malignant"],
+                                      y_proba=proba, n_bootstrap=n_bootstrap),
+            max(1, ctx["repeats"] // 3),
+        )
+        results[f"robustness_report/boot{n_bootstrap}"] = _entry(statistics.median(times), "s", False, n=n)
+    return results
+
+
+def bench_preprocess(ctx) -> dict:
+    """HF image processor vs the batched SiglipPreprocessor at 384x384; fails if outputs diverge."""
+    from transformers import SiglipImageProcessor
+
+    from src.model.preprocessing import VALIDATION_ATOL, SiglipPreprocessor
+
+    hf_processor = SiglipImageProcessor(size={"height": 384, "width": 384})
+    preprocessor = SiglipPreprocessor.from_hf(hf_processor)
+    results = {}
+    for batch_size in ctx["extract_batch_sizes"]:
+        batch = ctx["images"][:batch_size]
+        diff = preprocessor.max_abs_diff(hf_processor, batch)
+        if diff > VALIDATION_ATOL:
+            raise AssertionError(f"SiglipPreprocessor differs from the HF processor by {diff:.2e}")
+        hf = _timeit(lambda: hf_processor(images=batch, return_tensors="pt"), ctx["repeats"])
+        ours = _timeit(lambda: preprocessor(batch), ctx["repeats"])
+        results[f"preprocess/bs{batch_size}/hf"] = _entry(batch_size / statistics.median(hf), "images/s", True)
+        results[f"preprocess/bs{batch_size}/batched"] = _entry(
+            batch_size / statistics.median(ours), "images/s", True,
+            speedup=round(statistics.median(hf) / statistics.median(ours), 2), max_abs_diff=diff,
+        )
+    return results
+
+
+def _check_decode_modes(rng, target):
+    """Reduced decoding must accept every mode a full decode does (palette, 1-bit, 16-bit, ...)."""
+    from src.data.decode import decode_image
+
+    rgb = Image.fromarray(synthetic_lesion_array(rng, (target[1] * 2 + 50, target[0] * 2 + 70)))
+    gray = rgb.convert("L")
+    images = {
+        "P": rgb.quantize(256), "1": rgb.convert("1"), "L": gray, "LA": rgb.convert("LA"),
+        "RGBA": rgb.convert("RGBA"), "CMYK": rgb.convert("CMYK"), "I": gray.convert("I"),
+        "F": gray.convert("F"), "I;16": Image.fromarray(np.asarray(gray, dtype=np.uint16) * 257),
+    }
+    cases = [(mode, "PNG") for mode in ("P", "1", "L", "LA", "I;16", "RGBA")]
+    cases += [("P", "GIF"), ("I", "TIFF"), ("F", "TIFF"), ("CMYK", "TIFF"), ("CMYK", "JPEG")]
+    for mode, fmt in cases:
+        image = images[mode]
+        buf = io.BytesIO()
+        image.save(buf, format=fmt)
+        decoded = decode_image(buf.getvalue(), target_size=target)
+        if decoded.mode != "RGB" or decoded.size[0] < target[0] or decoded.size[1] < target[1]:
+            raise AssertionError(f"{mode} {fmt} decoded to {decoded.mode} {decoded.size}")
+
+
+def bench_decode(ctx) -> dict:
+    """Full vs reduced (src/data/decode.py) decoding at several photo resolutions.
+
+    max_abs_diff compares the two preprocessed model inputs (normalized to [-1, 1]).
+    """
+    from transformers import SiglipImageProcessor
+
+    from src.data.decode import decode_image, processor_input_size
+    from src.model.preprocessing import SiglipPreprocessor
+
+    processor = SiglipPreprocessor.from_hf(SiglipImageProcessor(size={"height": 384, "width": 384}))
+    target = processor_input_size(processor)
+    rng = np.random.default_rng(0)
+    _check_decode_modes(rng, target)
+    results = {}
+    for width, height in ctx["decode_resolutions"]:
+        buf = io.BytesIO()
+        Image.fromarray(synthetic_lesion_array(rng, (height, width))).save(buf, format="JPEG", quality=92)
+        data = buf.getvalue()
+
+        def preprocess(reduce):
+            image = decode_image(data, target_size=target, reduce=reduce)
+            return processor([image])
+
+        full = _timeit(lambda: preprocess(False), ctx["repeats"])
+        reduced = _timeit(lambda: preprocess(True), ctx["repeats"])
+        diff = (preprocess(False) - preprocess(True)).abs().max().item()
+        name = f"decode/{width}x{height}"
+        results[f"{name}/full"] = _entry(_percentile_ms(full, 50), "ms", False, jpeg_kb=len(data) // 1024)
+        results[f"{name}/reduced"] = _entry(
+            _percentile_ms(reduced, 50), "ms", False,
+            speedup=round(statistics.median(full) / statistics.median(reduced), 2),
+            decoded=list(decode_image(data, target_size=target).size), max_abs_diff=round(diff, 4),
+        )
+    return results
+
+
+def bench_api(ctx) -> dict:
+    from fastapi.testclient import TestClient
+
+    import app.main as app_main
+
+    # Serve the synthetic stand-ins through the app's own (background) loading
+    cache_dir, model_dir = build_tiny_serving_cache(num_hidden_layers=ctx["layers"])
+    os.environ.update({"SKINTAG_CACHE_DIR": str(cache_dir), "SKINTAG_EMBEDDING_MODEL": str(model_dir),
+                       "USE_HF_MODELS": "false"})
+
+    payloads = []
+    for image in ctx["images"][:8]:
+        buf = io.BytesIO()
+        image.save(buf, format="JPEG", quality=90)
+        payloads.append(buf.getvalue())
+
+    with TestClient(app_main.app) as client:
+        deadline = time.time() + 120
+        while client.get("/api/ready").status_code != 200:
+            if app_main._state["phase"] == "failed" or time.time() > deadline:
+                raise RuntimeError(f"App did not become ready: {app_main._state['load_error']}")
+            time.sleep(0.05)
+
+        def request(i=[0]):
+            i[0] += 1
+            data = payloads[i[0] % len(payloads)]
+            response = client.post("/api/analyze", files={"file": ("lesion.jpg", data, "image/jpeg")})
+            response.raise_for_status()
+
+        times = _timeit(request, ctx["repeats"] * 3, warmup=3)
+    return {"api/analyze": _entry(_percentile_ms(times, 50), "ms", False,
+                                  p95_ms=round(_percentile_ms(times, 95), 2), n_requests=len(times))}
+
+
+BENCHMARKS = {
+    "extract": bench_extract,
+    "extract_dataset": bench_extract_dataset,
+    "preprocess": bench_preprocess,
+    "decode": bench_decode,
+    "head": bench_head,
+    "triage": bench_triage,
+    "robustness": bench_robustness,
+    "api": bench_api,
+}
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Rows of (name, baseline, current, relative change, status).
+
+    Baseline metrics absent from current are MISSING (their benchmark
+    failed or no longer reports them); callers pass only the baseline
+    metrics of the benchmarks that were run.
+    """
+    rows = []
+    for name, entry in current.items():
+        base = baseline.get(name)
+        if base is None or not base.get("value"):
+            rows.append((name, None, entry["value"], None, "new"))
+            continue
+        change = entry["value"] / base["value"] - 1
+        better = change if entry["higher_is_better"] else -change
+        status = "REGRESSION" if better < -tolerance else ("improved" if better > tolerance else "ok")
+        rows.append((name, base["value"], entry["value"], change, status))
+    for name, base in baseline.items():
+        if name not in current:
+            rows.append((name, base.get("value"), None, None, "MISSING"))
+    return rows
+
+
+def _machine() -> dict:
+    return {
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+    }
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Offline synthetic benchmarks with baseline comparison")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=None, help="Benchmarks to run")
+    parser.add_argument("--repeats", type=int, default=9, help="Timed calls per measurement")
+    parser.add_argument("--n-images", type=int, default=64, help="Synthetic images for extract_dataset")
+    parser.add_argument("--image-size", type=int, default=256, help="Synthetic image side (pixels)")
+    parser.add_argument("--layers", type=int, default=2, help="Vision layers of the tiny SigLIP")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads (default: torch's choice)")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown tolerated before flagging a regression")
+    parser.add_argument("--baseline", type=str, default=str(BENCH_DIR / "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the baseline")
+    parser.add_argument("--output", type=str, default=str(BENCH_DIR / "latest.json"))
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    print("Preparing tiny SigLIP and synthetic lesions...")
+    tiny_dir = build_tiny_siglip(num_hidden_layers=args.layers)
+    size = (args.image_size, args.image_size)
+    ctx = {
+        "tiny_dir": tiny_dir,
+        "layers": args.layers,
+        "images": synthetic_lesion_images(32, size=size),
+        "paths": write_synthetic_images(BENCH_DIR / "images", args.n_images, size=size),
+        "repeats": args.repeats,
+        "extract_batch_sizes": [1, 8, 32],
+        "head_batch_sizes": [1, 32, 1024],
+        "decode_resolutions": [(1024, 768), (2016, 1512), (4032, 3024)],
+    }
+
+    selected = args.only or list(BENCHMARKS)
+    results, groups, failed = {}, {}, []
+    for name in selected:
+        print(f"\n--- {name} ---")
+        start = time.time()
+        try:
+            bench = BENCHMARKS[name](ctx)
+        except Exception as exc:
+            print(f"  FAILED: {type(exc).__name__}: {exc}")
+            failed.append(name)
+            continue
+        for key, entry in bench.items():
+            print(f"  {key:<32} {entry['value']:>12.3f} {entry['unit']}")
+        results.update(bench)
+        groups[name] = sorted(bench)
+        print(f"  ({time.time() - start:.1f}s)")
+
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": _machine(),
+        "tiny_siglip": json.loads((tiny_dir / "tiny_spec.json").read_text()),
+        "settings": {"repeats": args.repeats, "n_images": args.n_images, "image_size": args.image_size},
+        "results": results,
+        "benchmarks": groups,  # benchmark -> its metric names, to spot missing ones later
+        "failed": failed,
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults saved to {output_path}")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        if failed:
+            print(f"\nNot saving a baseline: {len(failed)} benchmark(s) failed ({', '.join(failed)})")
+            sys.exit(1)
+        with open(baseline_path, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        print(f"No baseline at {baseline_path}; record one with --save-baseline")
+        if failed:
+            print(f"\n{len(failed)} benchmark(s) failed: {', '.join(failed)}")
+            sys.exit(1)
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("machine", {}).get("cpu_count") != run["machine"]["cpu_count"]:
+        print("  Note: baseline was recorded on a machine with a different CPU count")
+    if baseline.get("tiny_siglip") != run["tiny_siglip"] or baseline.get("settings") != run["settings"]:
+        print("  Note: baseline used different model / benchmark settings")
+
+    # Only the baseline metrics of the benchmarks this run attempted (older
+    # baselines without the benchmark -> metric map: all of them, unless --only)
+    base_results = baseline.get("results", {})
+    base_groups = baseline.get("benchmarks")
+    if base_groups is not None:
+        wanted = {key for name in selected for key in base_groups.get(name, [])}
+        base_results = {k: v for k, v in base_results.items() if k in wanted}
+    elif args.only:
+        base_results = {k: v for k, v in base_results.items() if k in results}
+
+    rows = compare(results, base_results, args.tolerance)
+    print(f"\n{'Benchmark':<34} {'baseline':>12} {'current':>12} {'change':>8}  status (tolerance {args.tolerance:.0%})")
+    for name, base, cur, change, status in rows:
+        base_s = f"{base:>12.3f}" if base is not None else f"{'-':>12}"
+        cur_s = f"{cur:>12.3f}" if cur is not None else f"{'-':>12}"
+        change_s = f"{change:>+7.0%}" if change is not None else f"{'-':>8}"
+        print(f"{name:<34} {base_s} {cur_s} {change_s}  {status}")
+
+    regressions = [r for r in rows if r[4] in ("REGRESSION", "MISSING")]
+    if regressions or failed:
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%} or missing")
+        if failed:
+            print(f"\n{len(failed)} benchmark(s) failed: {', '.join(failed)}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
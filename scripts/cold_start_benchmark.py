@@ -0,0 +1,167 @@
+"""Cold-start benchmark: app startup with legacy .pt vs safetensors fine-tuned exports.
+
+Exports the same fine-tuned model (built on a stand-in SigLIP, see
+src/utils/synthetic.py) both ways, then starts the FastAPI app's model loading
+in fresh processes and records, per run:
+
+    load_s            app model loading up to ready (load_models incl. warmup), imports excluded
+    first_predict_s   first prediction after ready
+    peak_rss_mb       VmHWM of the process
+    anon_rss_mb       private memory after the first prediction
+    file_rss_mb       file-backed (page cache, shareable) memory
+
+Runs alternate between formats; medians are reported. Both formats read the
+same files from the page cache after the first run, so the comparison is of
+warm-cache starts. Use --model-dir to benchmark a real export instead (both
+formats are written under results/benchmarks/cold_start/).
+
+Usage:
+    python scripts/cold_start_benchmark.py
+    python scripts/cold_start_benchmark.py --hidden 768 --layers 12 --repeats 5
+    python scripts/cold_start_benchmark.py --model-dir results/cache/finetuned_model
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import time
+
+BENCH_DIR = PROJECT_ROOT / "results" / "benchmarks"
+MARKER = "COLD_START_RESULT "
+
+
+def _status_mb(field: str):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def child():
+    """Runs in a fresh process: app startup, then one prediction."""
+    import app.main as app_main
+    from src.utils.synthetic import synthetic_lesion_images
+
+    image = synthetic_lesion_images(1)[0]
+    start = time.perf_counter()
+    app_main.load_models()
+    load_s = time.perf_counter() - start
+    model = app_main.registry.current.e2e_model
+    if model is None:
+        sys.exit("App did not load a fine-tuned model")
+    start = time.perf_counter()
+    model.predict_proba([image])
+    first_predict_s = time.perf_counter() - start
+    print(MARKER + json.dumps({
+        "load_s": round(load_s, 3),
+        "first_predict_s": round(first_predict_s, 3),
+        "peak_rss_mb": _status_mb("VmHWM"),
+        "anon_rss_mb": _status_mb("RssAnon"),
+        "file_rss_mb": _status_mb("RssFile"),
+    }), flush=True)
+
+
+def _prepare_fixtures(args, work_dir: Path) -> dict:
+    """{format: cache dir containing finetuned_model/} for legacy and safetensors."""
+    import torch
+
+    from src.model.deep_classifier import EndToEndClassifier, save_weights
+
+    dirs = {fmt: work_dir / fmt / "finetuned_model" for fmt in ("legacy", "safetensors")}
+    for d in dirs.values():
+        shutil.rmtree(d, ignore_errors=True)
+        d.mkdir(parents=True)
+
+    if args.model_dir:
+        source = Path(args.model_dir)
+        clf = EndToEndClassifier.load_for_inference(str(source), device="cpu")
+        config_path = source / "config.json"
+        shutil.copy(config_path, dirs["safetensors"] / "config.json")
+        save_weights(clf.model, dirs["safetensors"] / "model.safetensors")
+    else:
+        from src.utils.synthetic import build_tiny_siglip
+
+        tiny = build_tiny_siglip(BENCH_DIR / f"tiny_siglip_h{args.hidden}_l{args.layers}",
+                                 hidden_size=args.hidden, intermediate_size=4 * args.hidden,
+                                 num_hidden_layers=args.layers, num_attention_heads=max(1, args.hidden // 64),
+                                 image_size=224)
+        clf = EndToEndClassifier(model_name=str(tiny), n_conditions=10, device="cpu")
+        clf._build_model()
+        clf.export_for_inference(str(dirs["safetensors"]))
+        config_path = dirs["safetensors"] / "config.json"
+
+    shutil.copy(config_path, dirs["legacy"] / "config.json")
+    torch.save(clf.model.state_dict(), dirs["legacy"] / "model_state.pt")
+    return {fmt: d.parent for fmt, d in dirs.items()}
+
+
+def _run_child(cache_dir: Path) -> dict:
+    env = {**os.environ, "SKINTAG_CACHE_DIR": str(cache_dir), "USE_HF_MODELS": "false"}
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, __file__, "--child"], cwd=PROJECT_ROOT, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(MARKER)]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"Child failed ({proc.returncode}):\n{proc.stdout[-2000:]}\n{proc.stderr[-2000:]}")
+    return {**json.loads(lines[-1][len(MARKER):]), "process_wall_s": round(wall, 3)}
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Cold-start benchmark: legacy .pt vs safetensors")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--model-dir", type=str, default=None, help="Real fine-tuned export to benchmark")
+    parser.add_argument("--hidden", type=int, default=512, help="Stand-in SigLIP width")
+    parser.add_argument("--layers", type=int, default=8, help="Stand-in SigLIP vision layers")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=str, default=str(BENCH_DIR / "cold_start.json"))
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    work_dir = BENCH_DIR / "cold_start"
+    print("Exporting fixtures...")
+    cache_dirs = _prepare_fixtures(args, work_dir)
+    sizes = {"legacy": (cache_dirs["legacy"] / "finetuned_model" / "model_state.pt").stat().st_size / 2**20,
+             "safetensors": (cache_dirs["safetensors"] / "finetuned_model" / "model.safetensors").stat().st_size / 2**20}
+
+    runs = {fmt: [] for fmt in cache_dirs}
+    _run_child(cache_dirs["legacy"])  # warm the page cache and imports for both
+    _run_child(cache_dirs["safetensors"])
+    for i in range(args.repeats):
+        for fmt, cache_dir in cache_dirs.items():
+            result = _run_child(cache_dir)
+            runs[fmt].append(result)
+            print(f"  run {i + 1} {fmt:<12} load {result['load_s']:.2f}s, peak {result['peak_rss_mb']:.0f} MB")
+
+    metrics = ["process_wall_s", "load_s", "first_predict_s", "peak_rss_mb", "anon_rss_mb", "file_rss_mb"]
+    medians = {fmt: {m: statistics.median(r[m] for r in rs) for m in metrics} for fmt, rs in runs.items()}
+
+    print(f"\n  {'metric':<18} {'legacy .pt':>12} {'safetensors':>12} {'change':>8}")
+    for m in metrics:
+        before, after = medians["legacy"][m], medians["safetensors"][m]
+        change = f"{after / before - 1:>+7.0%}" if before else f"{'-':>8}"
+        print(f"  {m:<18} {before:>12.2f} {after:>12.2f} {change}")
+    print(f"  {'export size MB':<18} {sizes['legacy']:>12.1f} {sizes['safetensors']:>12.1f}")
+
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump({"settings": vars(args), "export_mb": sizes, "median": medians, "runs": runs}, f, indent=2)
+    print(f"\nResults saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Convert a legacy fine-tuned export (.pt pickles) to safetensors.
+
+EndToEndClassifier.load_for_inference maps safetensors weights straight into a
+meta-initialized model; legacy model_state.pt / siglip_finetuned.pt files
+make it load the base SigLIP checkpoint first and then overwrite it.
+
+Usage:
+    python scripts/convert_to_safetensors.py                                  # results/cache/finetuned_model
+    python scripts/convert_to_safetensors.py --model-dir path/to/export --remove-pt
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import torch
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert fine-tuned .pt exports to safetensors")
+    parser.add_argument("--model-dir", type=str, default=str(PROJECT_ROOT / "results" / "cache" / "finetuned_model"))
+    parser.add_argument("--remove-pt", action="store_true", help="Delete the .pt files after a verified conversion")
+    args = parser.parse_args()
+
+    from safetensors.torch import load_file
+    from src.model.deep_classifier import WEIGHT_FILES, EndToEndClassifier, save_weights
+
+    model_dir = Path(args.model_dir)
+    for subdir in ["v2", "siglip_finetuned"]:
+        if (model_dir / subdir / WEIGHT_FILES["v2"][1]).exists():
+            model_dir = model_dir / subdir
+            break
+    arch = "v2" if (model_dir / WEIGHT_FILES["v2"][1]).exists() else "v1"
+    target_name, legacy_name = WEIGHT_FILES[arch]
+    legacy_path, target_path = model_dir / legacy_name, model_dir / target_name
+    if not legacy_path.exists():
+        print(f"No legacy checkpoint in {model_dir} (looked for {legacy_name})")
+        return
+
+    print(f"Converting {legacy_path} ({arch})...")
+    clf = EndToEndClassifier.load_for_inference(str(model_dir), device="cpu")
+    save_weights(clf.model, target_path)
+
+    # Verify: every parameter and buffer round-trips exactly
+    saved = load_file(str(target_path))
+    expected = {**dict(clf.model.named_buffers()), **clf.model.state_dict()}
+    mismatched = [k for k, v in expected.items() if k not in saved or not torch.equal(saved[k], v.cpu())]
+    if mismatched:
+        target_path.unlink()
+        sys.exit(f"Verification failed for {len(mismatched)} tensors (e.g. {mismatched[0]}); nothing written")
+    print(f"  Wrote {target_path} ({target_path.stat().st_size / 2**20:.0f} MB, {len(saved)} tensors, verified)")
+
+    converted = [legacy_path]
+    head_legacy = model_dir / "head_state.pt"
+    if head_legacy.exists():
+        save_weights(clf.model.head, model_dir / "head.safetensors")
+        converted.append(head_legacy)
+        print(f"  Wrote {model_dir / 'head.safetensors'}")
+
+    if args.remove_pt:
+        for path in converted:
+            path.unlink()
+            print(f"  Removed {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,11 +13,11 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 import yaml
 import json
-import pickle
 import numpy as np
 import pandas as pd
 
 from src.evaluation.metrics import robustness_report, compare_models
+from src.evaluation.prediction_store import PredictionStore, load_or_predict
 from src.data.loader import get_demographic_groups
 from src.model.triage import TriageSystem
 
@@ -61,6 +61,11 @@ def main():
     import torch
     embeddings = torch.load(embeddings_path)
 
+    # Predictions and split saved at training time (models re-run only if retrained)
+    store = PredictionStore.open(cache_dir / "predictions")
+    if store is not None and store.n_samples != len(embeddings):
+        store = None
+
     # Evaluate each model
     all_results = {}
     triage_system = TriageSystem(config.get("triage", {}))
@@ -73,40 +78,41 @@ def main():
             print(f"Model {model_name} not found, skipping")
             continue
 
-        with open(model_path, "rb") as f:
-            clf = pickle.load(f)
-
-        # We need test embeddings — use saved test metadata indices
-        # For now, re-split using same seed
-        from sklearn.model_selection import train_test_split
-        all_meta = pd.read_csv(cache_dir / "metadata.csv")
-        n_total = len(all_meta)
-        indices = np.arange(n_total)
-
-        labels_all = all_meta["label"].values if "label" in all_meta.columns else None
-        if labels_all is None:
-            # Legacy HAM10000 metadata
-            from src.data.loader import BINARY_MAPPING
-            if "dx" in all_meta.columns:
-                labels_all = np.array([BINARY_MAPPING.get(dx, 0) for dx in all_meta["dx"]])
-            else:
-                print("Cannot determine labels from metadata")
-                continue
-
-        _, test_indices = train_test_split(
-            indices, test_size=0.2, random_state=config["training"]["seed"],
-            stratify=labels_all
-        )
-
-        X_test = embeddings[test_indices].numpy()
-        y_test_actual = labels_all[test_indices]
-
-        y_pred = clf.predict(X_test)
-        y_proba = clf.predict_proba(X_test) if hasattr(clf, 'predict_proba') else None
-
-        # Get groups for test set
-        test_meta_subset = all_meta.iloc[test_indices].reset_index(drop=True)
-        test_groups = get_demographic_groups(test_meta_subset)
+        if store is not None:
+            # Test rows and groups exactly as training split them
+            index = store.index("test")
+            test_indices = np.asarray(index["sample_id"])
+            y_test_actual = np.asarray(index["label"])
+            test_groups = store.groups("test")
+        else:
+            # No store: re-split using same seed
+            from sklearn.model_selection import train_test_split
+            all_meta = pd.read_csv(cache_dir / "metadata.csv")
+            n_total = len(all_meta)
+            indices = np.arange(n_total)
+
+            labels_all = all_meta["label"].values if "label" in all_meta.columns else None
+            if labels_all is None:
+                # Legacy HAM10000 metadata
+                from src.data.loader import BINARY_MAPPING
+                if "dx" in all_meta.columns:
+                    labels_all = np.array([BINARY_MAPPING.get(dx, 0) for dx in all_meta["dx"]])
+                else:
+                    print("Cannot determine labels from metadata")
+                    continue
+
+            _, test_indices = train_test_split(
+                indices, test_size=0.2, random_state=config["training"]["seed"],
+                stratify=labels_all
+            )
+            y_test_actual = labels_all[test_indices]
+
+            # Get groups for test set
+            test_meta_subset = all_meta.iloc[test_indices].reset_index(drop=True)
+            test_groups = get_demographic_groups(test_meta_subset)
+
+        predictions = load_or_predict(model_name, model_path, lambda: embeddings[test_indices].numpy(), store)
+        y_pred, y_proba = predictions["pred"], predictions.get("proba")
 
         # Full robustness report
         report = robustness_report(
@@ -117,7 +123,7 @@ def main():
         )
 
         print(f"\n{'='*60}")
-        print(f"Model: {model_name}")
+        print(f"Model: {model_name} (predictions from {predictions['source']})")
         print(f"{'='*60}")
         print(f"Overall accuracy:  {report['overall_accuracy']:.3f}")
         print(f"Balanced accuracy: {report['balanced_accuracy']:.3f}")
@@ -11,12 +11,17 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
+import os
+import shutil
+import tempfile
 import yaml
 import json
 import pickle
 import numpy as np
 import pandas as pd
 import torch
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
 
 from src.model.embeddings import EmbeddingExtractor
 from src.model.classifier import SklearnClassifier
@@ -26,6 +31,120 @@ from src.data.loader import load_multi_dataset, get_demographic_groups
 from src.data.schema import samples_to_arrays
 from src.data.sampler import compute_domain_balanced_weights
 from src.evaluation.metrics import robustness_report, cross_domain_report
+from src.utils.parallel import (
+    attach_array,
+    attach_object,
+    default_workers,
+    limit_worker_threads,
+    release_arrays,
+    share_array,
+    share_object,
+)
+
+
+def _train_and_score(X_train, y_train, X_test, y_test, test_meta, model_type,
+                     sample_weights=None, device="cpu"):
+    """Fit one model on a training fold and score it on the held-out domain."""
+    if model_type == "baseline":
+        clf = MajorityClassBaseline()
+        clf.fit(X_train, y_train)
+    elif model_type == "logistic":
+        clf = SklearnClassifier(classifier_type="logistic")
+        clf.fit(X_train, y_train, sample_weight=sample_weights)
+    elif model_type == "xgboost":
+        clf = SklearnClassifier(classifier_type="xgboost")
+        clf.fit(X_train, y_train, sample_weight=sample_weights)
+    elif model_type == "deep":
+        clf = DeepClassifier(embedding_dim=X_train.shape[1], device=device)
+        clf.fit(X_train, y_train, sample_weight=sample_weights)
+    else:
+        return None
+
+    test_out = clf.predict_all(X_test)
+    y_pred, y_proba = test_out["pred"], test_out.get("proba")
+
+    # Per-group metrics for test domain
+    groups = get_demographic_groups(test_meta)
+
+    report = robustness_report(
+        y_test, y_pred,
+        groups=groups if groups else None,
+        class_names=["benign", "malignant"],
+        y_proba=y_proba,
+    )
+
+    result = {
+        "accuracy": report["overall_accuracy"],
+        "balanced_accuracy": report["balanced_accuracy"],
+        "f1_macro": report["f1_macro"],
+        "f1_binary": report["f1_binary"],
+        "auc": report.get("auc", float("nan")),
+        "n_train": int(len(y_train)),
+        "n_test": int(len(y_test)),
+    }
+
+    # Add Fitzpatrick breakdown if available
+    if "per_fitzpatrick" in report:
+        result["per_fitzpatrick"] = report["per_fitzpatrick"]
+    return result
+
+
+def _fold_masks(domains, held_out):
+    test_mask = domains == held_out
+    return test_mask, ~test_mask
+
+
+def _run_fold(task):
+    """Pool worker: one (model, balancing, held-out domain) fold on shared arrays."""
+    embeddings = attach_array(task["embeddings"])
+    labels = attach_array(task["labels"])
+    metadata = attach_object(task["metadata"])
+    domains = metadata["domain"].values
+    test_mask, train_mask = _fold_masks(domains, task["held_out"])
+
+    # Index once into the memory map; only this fold's rows are copied
+    train_idx, test_idx = np.flatnonzero(train_mask), np.flatnonzero(test_mask)
+    sample_weights = None
+    if task["domain_balance"]:
+        sample_weights = compute_domain_balanced_weights(domains[train_idx], labels[train_idx])
+
+    result = _train_and_score(
+        embeddings[train_idx], labels[train_idx], embeddings[test_idx], labels[test_idx],
+        metadata.iloc[test_idx].reset_index(drop=True),
+        task["model_type"], sample_weights=sample_weights, device=task["device"],
+    )
+    return task["experiment"], task["held_out"], result
+
+
+def _summarize(results):
+    """Add the domain generalization gap summary in place."""
+    if len(results) >= 2:
+        accs = [r["accuracy"] for r in results.values()]
+        f1s = [r["f1_macro"] for r in results.values()]
+        results["_summary"] = {
+            "mean_accuracy": float(np.mean(accs)),
+            "mean_f1_macro": float(np.mean(f1s)),
+            "domain_gap": float(max(accs) - min(accs)),
+            "domain_f1_gap": float(max(f1s) - min(f1s)),
+        }
+    return results
+
+
+def _valid_held_out(domains):
+    """Domains that can be held out (enough samples on both sides)."""
+    valid = []
+    for held_out in np.unique(domains):
+        test_mask, train_mask = _fold_masks(domains, held_out)
+        if test_mask.sum() < 5 or train_mask.sum() < 5:
+            print(f"  Skipping {held_out}: too few samples (train={train_mask.sum()}, test={test_mask.sum()})")
+            continue
+        valid.append(held_out)
+    return valid
+
+
+def _print_fold(held_out, result):
+    print(f"  Held out {held_out}: acc={result['accuracy']:.3f}, "
+          f"f1_macro={result['f1_macro']:.3f}, bal_acc={result['balanced_accuracy']:.3f}")
 
 
 def run_experiment(
@@ -35,89 +154,97 @@ def run_experiment(
     seed=42,
     device="cpu",
 ):
-    """Run leave-one-domain-out evaluation for a single model config."""
+    """Run leave-one-domain-out evaluation for a single model config (serially)."""
     domains = metadata["domain"].values
-    unique_domains = np.unique(domains)
     results = {}
 
-    for held_out in unique_domains:
-        test_mask = domains == held_out
-        train_mask = ~test_mask
+    for held_out in _valid_held_out(domains):
+        test_mask, train_mask = _fold_masks(domains, held_out)
 
-        if test_mask.sum() < 5 or train_mask.sum() < 5:
-            print(f"  Skipping {held_out}: too few samples (train={train_mask.sum()}, test={test_mask.sum()})")
-            continue
-
-        X_train = embeddings[train_mask]
-        y_train = labels[train_mask]
-        X_test = embeddings[test_mask]
-        y_test = labels[test_mask]
-
-        # Domain-balanced weights
         sample_weights = None
         if domain_balance:
-            train_domains = domains[train_mask]
-            sample_weights = compute_domain_balanced_weights(train_domains, y_train)
-
-        # Train model
-        if model_type == "baseline":
-            clf = MajorityClassBaseline()
-            clf.fit(X_train, y_train)
-        elif model_type == "logistic":
-            clf = SklearnClassifier(classifier_type="logistic")
-            clf.fit(X_train, y_train, sample_weight=sample_weights)
-        elif model_type == "xgboost":
-            clf = SklearnClassifier(classifier_type="xgboost")
-            clf.fit(X_train, y_train, sample_weight=sample_weights)
-        elif model_type == "deep":
-            clf = DeepClassifier(embedding_dim=X_train.shape[1], device=device)
-            clf.fit(X_train, y_train, sample_weight=sample_weights)
-        else:
-            continue
-
-        y_pred = clf.predict(X_test)
-        y_proba = clf.predict_proba(X_test) if hasattr(clf, 'predict_proba') else None
-
-        # Per-group metrics for test domain
-        test_meta = metadata[test_mask].reset_index(drop=True)
-        groups = get_demographic_groups(test_meta)
+            sample_weights = compute_domain_balanced_weights(domains[train_mask], labels[train_mask])
 
-        report = robustness_report(
-            y_test, y_pred,
-            groups=groups if groups else None,
-            class_names=["benign", "malignant"],
-            y_proba=y_proba,
+        result = _train_and_score(
+            embeddings[train_mask], labels[train_mask], embeddings[test_mask], labels[test_mask],
+            metadata[test_mask].reset_index(drop=True),
+            model_type, sample_weights=sample_weights, device=device,
         )
+        if result is None:
+            continue
+        results[held_out] = result
+        _print_fold(held_out, result)
 
-        results[held_out] = {
-            "accuracy": report["overall_accuracy"],
-            "balanced_accuracy": report["balanced_accuracy"],
-            "f1_macro": report["f1_macro"],
-            "f1_binary": report["f1_binary"],
-            "auc": report.get("auc", float("nan")),
-            "n_train": int(train_mask.sum()),
-            "n_test": int(test_mask.sum()),
-        }
+    return _summarize(results)
 
-        # Add Fitzpatrick breakdown if available
-        if "per_fitzpatrick" in report:
-            results[held_out]["per_fitzpatrick"] = report["per_fitzpatrick"]
 
-        print(f"  Held out {held_out}: acc={report['overall_accuracy']:.3f}, "
-              f"f1_macro={report['f1_macro']:.3f}, bal_acc={report['balanced_accuracy']:.3f}")
+def run_grid(embeddings, labels, metadata, experiments, workers=None, device="cpu"):
+    """Run every (experiment, held-out domain) fold across a process pool.
 
-    # Domain generalization gap
-    if len(results) >= 2:
-        accs = [r["accuracy"] for r in results.values()]
-        f1s = [r["f1_macro"] for r in results.values()]
-        results["_summary"] = {
-            "mean_accuracy": float(np.mean(accs)),
-            "mean_f1_macro": float(np.mean(f1s)),
-            "domain_gap": float(max(accs) - min(accs)),
-            "domain_f1_gap": float(max(f1s) - min(f1s)),
-        }
+    Args:
+        experiments: dict of name -> {"model_type", "domain_balance"}
+        workers: pool size (default: one per CPU; 1 runs in this process)
 
-    return results
+    Returns:
+        dict of name -> per-domain results + _summary, same layout as run_experiment
+    """
+    domains = metadata["domain"].values
+    held_outs = _valid_held_out(domains)
+    all_experiments = {name: {} for name in experiments}
+    if not held_outs:
+        return all_experiments
+
+    work_dir = Path(tempfile.mkdtemp(prefix="skintag_xdomain_"))
+    base = {
+        "embeddings": share_array(embeddings, work_dir, "embeddings"),
+        "labels": share_array(np.asarray(labels), work_dir, "labels"),
+        "metadata": share_object(metadata.reset_index(drop=True), work_dir, "metadata"),
+        "device": device,
+    }
+    tasks = [
+        {**base, "experiment": name, "held_out": held_out, **spec}
+        for name, spec in experiments.items()
+        for held_out in held_outs
+    ]
+
+    workers = workers or default_workers(len(tasks))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Dispatching {len(tasks)} folds to {workers} worker(s) x {threads} thread(s)")
+
+    executor = None
+    try:
+        if workers == 1:
+            outputs = map(_run_fold, tasks)
+        else:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=get_context("spawn"),
+                initializer=limit_worker_threads,
+                initargs=(threads,),
+            )
+            futures = [executor.submit(_run_fold, t) for t in tasks]
+            outputs = (f.result() for f in as_completed(futures))
+
+        fold_results = {}
+        for name, held_out, result in outputs:
+            if result is not None:
+                fold_results[(name, held_out)] = result
+                print(f"  [{name}] held out {held_out}: acc={result['accuracy']:.3f}, "
+                      f"f1_macro={result['f1_macro']:.3f}")
+    finally:
+        # Workers hold the shared files open; stop them before removing work_dir
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        release_arrays()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Merge in a deterministic order (experiment, then domain)
+    for name in experiments:
+        for held_out in held_outs:
+            if (name, held_out) in fold_results:
+                all_experiments[name][held_out] = fold_results[(name, held_out)]
+        _summarize(all_experiments[name])
+    return all_experiments
 
 
 def main():
@@ -125,6 +252,8 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--sample", type=int, default=0, help="Sample N images per dataset (0=all)")
     parser.add_argument("--datasets", nargs="+", default=None)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Parallel fold workers (default: CPU count, 1 = serial)")
     args = parser.parse_args()
 
     config_path = PROJECT_ROOT / "configs" / "config.yaml"
@@ -160,33 +289,27 @@ def main():
     # Extract embeddings
     cache_path = cache_dir / "embeddings_multi.pt"
     extractor = EmbeddingExtractor(device=device)
-    embeddings = extractor.extract_dataset(images, batch_size=batch_size, cache_path=cache_path)
+    embeddings = extractor.extract_dataset(images, batch_size=batch_size, cache_path=cache_path,
+                                           reduced=config.get("decode", {}).get("reduced", True))
     extractor.unload_model()
     embeddings_np = embeddings.numpy()
 
     print(f"\nTotal samples: {len(labels)}")
     print(f"Domains: {dict(zip(*np.unique(metadata['domain'], return_counts=True)))}")
 
-    # Run experiments
-    all_experiments = {}
+    # Run experiments: every (model, balancing, held-out domain) fold in parallel
     model_types = ["baseline", "logistic", "xgboost", "deep"]
     balance_modes = [False, True]
-
-    for model_type in model_types:
-        for balanced in balance_modes:
-            name = f"{model_type}_{'balanced' if balanced else 'unbalanced'}"
-            print(f"\n{'='*60}")
-            print(f"Experiment: {name}")
-            print(f"{'='*60}")
-
-            results = run_experiment(
-                embeddings_np, labels, metadata,
-                model_type=model_type,
-                domain_balance=balanced,
-                seed=seed,
-                device=device,
-            )
-            all_experiments[name] = results
+    experiments = {
+        f"{model_type}_{'balanced' if balanced else 'unbalanced'}": {
+            "model_type": model_type,
+            "domain_balance": balanced,
+        }
+        for model_type in model_types
+        for balanced in balance_modes
+    }
+    all_experiments = run_grid(embeddings_np, labels, metadata, experiments,
+                               workers=args.workers, device=device)
 
     # Summary table
     print(f"\n{'='*60}")
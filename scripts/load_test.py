@@ -0,0 +1,544 @@
+"""HTTP load test for /api/analyze with latency percentiles and server RSS.
+
+Starts the FastAPI app (as a uvicorn subprocess, in this process, or uses an
+already running server via --url), drives POST /api/analyze with synthetic
+lesion JPEGs of configurable sizes, and reports p50/p95/p99 latency,
+throughput, error and 429 rates, and the server's resident memory over time.
+
+Two load models:
+
+    closed   --concurrency N clients, each sends its next request as soon as
+             the previous one returns. Throughput adapts to the server, so
+             this finds capacity but hides queueing.
+    open     requests arrive at --rate per second (Poisson or constant
+             spacing) whether or not earlier ones finished. Latency is
+             measured from the scheduled arrival time, so time spent waiting
+             behind a saturated server (or a saturated client) is counted
+             instead of silently omitted.
+
+By default the server loads the tiny stand-in SigLIP and a random head
+(src/utils/synthetic.py), so no trained artifacts are needed; --model local
+serves results/cache as `make app` would.
+
+Usage:
+    python scripts/load_test.py --concurrency 4 --duration 30
+    python scripts/load_test.py --mode open --rate 20 --duration 60 --image-sizes 256,1024 --size-weights 0.8,0.2
+    python scripts/load_test.py --url http://127.0.0.1:8000 --server-pid 12345 --mode open --rate 5
+    python scripts/load_test.py --model local --server-workers 2
+
+Output:
+    results/load_tests/load_<mode>_<timestamp>.json (summary, per-size stats, per-second timeline)
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import http.client
+import io
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+import numpy as np
+
+OUTPUT_DIR = PROJECT_ROOT / "results" / "load_tests"
+
+
+# ---------------------------------------------------------------------------
+# Payloads
+# ---------------------------------------------------------------------------
+
+def _multipart(data: bytes, filename: str = "lesion.jpg") -> tuple:
+    """Encode one file field named `file` as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def build_payloads(sizes, variants: int = 4, quality: int = 90, seed: int = 0) -> dict:
+    """{side: [(body, content_type), ...]} of synthetic lesion JPEGs."""
+    from src.utils.synthetic import synthetic_lesion_images
+
+    payloads = {}
+    for side in sizes:
+        payloads[side] = []
+        for image in synthetic_lesion_images(variants, size=(side, side), seed=seed + side):
+            buf = io.BytesIO()
+            image.save(buf, format="JPEG", quality=quality)
+            payloads[side].append(_multipart(buf.getvalue()))
+    return payloads
+
+
+# ---------------------------------------------------------------------------
+# Server under test
+# ---------------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _process_tree(pid: int) -> list:
+    """pid and all its descendants (uvicorn --workers forks children)."""
+    pids, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        pids.append(p)
+        try:
+            for task in Path(f"/proc/{p}/task").iterdir():
+                stack.extend(int(c) for c in (task / "children").read_text().split())
+        except OSError:
+            continue
+    return pids
+
+
+def _rss_mb(pid: int):
+    """Total resident memory of a process tree in MB, or None without /proc."""
+    total, found = 0, False
+    for p in _process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        found = True
+                        break
+        except OSError:
+            continue
+    return round(total / 2**20, 1) if found else None
+
+
+class ServerUnderTest:
+    """Runs (or attaches to) the app and exposes host, port and pid."""
+
+    def __init__(self, how: str, url: str = None, pid: int = None, env: dict = None,
+                 workers: int = 1, log_path: Path = None):
+        self.how = how
+        self.env = env or {}
+        self.workers = workers
+        self.log_path = log_path
+        self.pid = pid
+        self._proc = None
+        self._server = None
+        self._thread = None
+        if url:
+            parsed = urlparse(url)
+            self.host, self.port = parsed.hostname, parsed.port or 80
+        else:
+            self.host, self.port = "127.0.0.1", _free_port()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 600):
+        if self.how == "subprocess":
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._log = open(self.log_path, "w")
+            self._proc = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--host", self.host,
+                 "--port", str(self.port), "--workers", str(self.workers), "--log-level", "warning"],
+                cwd=PROJECT_ROOT, env={**os.environ, **self.env}, stdout=self._log, stderr=subprocess.STDOUT,
+            )
+            self.pid = self._proc.pid
+        elif self.how == "inprocess":
+            import uvicorn
+
+            os.environ.update(self.env)
+            import app.main as app_main
+            config = uvicorn.Config(app_main.app, host=self.host, port=self.port, log_level="warning")
+            self._server = uvicorn.Server(config)
+            self._thread = threading.Thread(target=self._server.run, name="uvicorn", daemon=True)
+            self._thread.start()
+            self.pid = os.getpid()
+        self._wait_ready(timeout)
+        return self
+
+    def _wait_ready(self, timeout: float):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self._proc is not None and self._proc.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self._proc.returncode}; see {self.log_path}")
+            try:
+                with urllib.request.urlopen(self.base_url + "/api/ready", timeout=5) as response:
+                    return json.load(response)
+            except urllib.error.HTTPError as exc:  # 503 while loading
+                status = json.load(exc)
+                if status.get("phase") == "failed":
+                    raise RuntimeError(f"Server failed to load models: {status.get('error')}")
+                time.sleep(0.5)
+            except (OSError, ValueError):
+                time.sleep(0.5)
+        raise TimeoutError(f"Server at {self.base_url} not ready after {timeout:.0f}s")
+
+    def stop(self):
+        if self._proc is not None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+            self._log.close()
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=30)
+
+
+class RssSampler:
+    """Polls the server's RSS in a background thread."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (seconds since start, MB)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, t0: float):
+        if self.pid is None or _rss_mb(self.pid) is None:
+            return self
+        self._t0 = t0
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = _rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append((time.perf_counter() - self._t0, rss))
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+class _Client:
+    """Sends /api/analyze requests over one keep-alive connection per thread."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host, self.port, self.timeout = host, port, timeout
+        self._local = threading.local()
+
+    def post(self, body: bytes, content_type: str) -> int:
+        """HTTP status, or 0 on a connection error / timeout."""
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request("POST", "/api/analyze", body=body, headers={"Content-Type": content_type})
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                self._local.conn = None
+                if attempt:  # stale keep-alive connections get one retry
+                    return 0
+            except OSError:
+                conn.close()
+                self._local.conn = None
+                return 0
+        return 0
+
+
+def _pick(payloads, sizes, weights, rng):
+    side = sizes[rng.choice(len(sizes), p=weights)]
+    variants = payloads[side]
+    return side, variants[rng.integers(len(variants))]
+
+
+def run_closed_loop(client, payloads, sizes, weights, concurrency: int, duration: float, seed: int = 0):
+    """`concurrency` clients sending back-to-back for `duration` seconds."""
+    records, lock = [], threading.Lock()
+    t0 = time.perf_counter()
+    deadline = t0 + duration
+
+    def worker(idx):
+        rng = np.random.default_rng(seed + idx)
+        while time.perf_counter() < deadline:
+            side, (body, ctype) = _pick(payloads, sizes, weights, rng)
+            start = time.perf_counter()
+            status = client.post(body, ctype)
+            end = time.perf_counter()
+            with lock:
+                records.append({"start": start - t0, "end": end - t0, "latency": end - start,
+                                "lag": 0.0, "status": status, "size": side})
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return records, t0
+
+
+def run_open_loop(client, payloads, sizes, weights, rate: float, duration: float, arrival: str = "poisson",
+                  max_inflight: int = 256, drain_timeout: float = 60, seed: int = 0):
+    """Requests arriving at `rate`/s regardless of completions.
+
+    Latency runs from the scheduled arrival, so requests that wait for a free
+    client thread (more than max_inflight outstanding) or for the server count
+    that wait. `lag` records how late each request actually left the client.
+    Requests still outstanding after drain_timeout are recorded as timeouts
+    (status 0, abandoned) with their latency so far, a lower bound.
+    """
+    rng = np.random.default_rng(seed)
+    records, lock = [], threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="load")
+
+    def send(request):
+        request["sent"] = time.perf_counter()
+        status = client.post(request["body"], request["ctype"])
+        end = time.perf_counter()
+        with lock:
+            if request.get("abandoned"):
+                return
+            request["done"] = True
+            records.append({"start": request["scheduled"] - t0, "end": end - t0,
+                            "latency": end - request["scheduled"], "lag": request["sent"] - request["scheduled"],
+                            "status": status, "size": request["size"]})
+
+    futures, requests = [], []
+    t0 = time.perf_counter()
+    next_arrival = t0
+    while True:
+        next_arrival += rng.exponential(1 / rate) if arrival == "poisson" else 1 / rate
+        if next_arrival - t0 >= duration:
+            break
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        side, (body, ctype) = _pick(payloads, sizes, weights, rng)
+        request = {"scheduled": next_arrival, "size": side, "body": body, "ctype": ctype}
+        requests.append(request)
+        futures.append(executor.submit(send, request))
+
+    wait(futures, timeout=drain_timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+    with lock:
+        cutoff = time.perf_counter()
+        abandoned = [r for r in requests if not r.get("done")]
+        for request in abandoned:
+            request["abandoned"] = True
+            records.append({"start": request["scheduled"] - t0, "end": cutoff - t0,
+                            "latency": cutoff - request["scheduled"],
+                            "lag": request.get("sent", cutoff) - request["scheduled"],
+                            "status": 0, "size": request["size"], "abandoned": True})
+        if abandoned:
+            print(f"  Drain timeout: {len(abandoned)} requests still outstanding, recorded as timeouts")
+        return list(records), t0
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def _latency_stats(latencies) -> dict:
+    if not len(latencies):
+        return {}
+    ms = np.asarray(latencies) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 1) for q in (50, 95, 99)} | {
+        "mean_ms": round(float(ms.mean()), 1), "max_ms": round(float(ms.max()), 1)}
+
+
+def summarize(records, elapsed: float, rss_samples) -> dict:
+    statuses = np.array([r["status"] for r in records])
+    ok = statuses == 200
+    latencies = np.array([r["latency"] for r in records])
+    n = len(records)
+    summary = {
+        "requests": n,
+        "ok": int(ok.sum()),
+        "abandoned": sum(r.get("abandoned", False) for r in records),
+        "throughput_rps": round(ok.sum() / elapsed, 2) if elapsed > 0 else None,
+        "error_rate": round(float((~ok).mean()), 4) if n else None,
+        "rate_429": round(float((statuses == 429).mean()), 4) if n else None,
+        "status_counts": {str(s): int((statuses == s).sum()) for s in sorted(set(statuses.tolist()))},
+        "latency_ok": _latency_stats(latencies[ok]),
+        "latency_all": _latency_stats(latencies),
+        "client_lag_p99_ms": round(float(np.percentile([r["lag"] for r in records], 99)) * 1000, 1) if n else None,
+    }
+    if rss_samples:
+        rss = [mb for _, mb in rss_samples]
+        summary["server_rss_mb"] = {"start": rss[0], "end": rss[-1], "peak": max(rss)}
+
+    by_size = {}
+    for side in sorted({r["size"] for r in records}):
+        mask = np.array([r["size"] == side for r in records])
+        by_size[str(side)] = {"requests": int(mask.sum()), "ok": int((mask & ok).sum()),
+                              **_latency_stats(latencies[mask & ok])}
+    summary["by_image_size"] = by_size
+    return summary
+
+
+def timeline(records, rss_samples, elapsed: float) -> list:
+    """Per-second completions, errors, latency and server RSS."""
+    rows = []
+    for second in range(int(np.ceil(elapsed))):
+        done = [r for r in records if second <= r["end"] < second + 1]
+        ok = [r["latency"] for r in done if r["status"] == 200]
+        rss = [mb for t, mb in rss_samples if second <= t < second + 1]
+        rows.append({
+            "second": second,
+            "completed": len(done),
+            "ok": len(ok),
+            "errors": len(done) - len(ok),
+            "429": sum(r["status"] == 429 for r in done),
+            "p50_ms": round(float(np.percentile(ok, 50)) * 1000, 1) if ok else None,
+            "p95_ms": round(float(np.percentile(ok, 95)) * 1000, 1) if ok else None,
+            "rss_mb": max(rss) if rss else None,
+        })
+    return rows
+
+
+def print_report(summary: dict, rows: list):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print(f"\n  {'sec':>4} {'done':>6} {'ok':>6} {'err':>5} {'429':>5} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8}")
+    for r in rows:
+        print(f"  {r['second']:>4} {r['completed']:>6} {r['ok']:>6} {r['errors']:>5} {r['429']:>5} "
+              f"{fmt(r['p50_ms'], '>8.1f')} {fmt(r['p95_ms'], '>8.1f')} {fmt(r['rss_mb'], '>8.0f')}")
+
+    lat = summary["latency_ok"]
+    print(f"\n  Requests:    {summary['requests']} ({summary['ok']} ok), statuses {summary['status_counts']}")
+    print(f"  Throughput:  {summary['throughput_rps']} ok req/s")
+    print(f"  Errors:      {fmt(summary['error_rate'], '.2%')} (429: {fmt(summary['rate_429'], '.2%')})")
+    if summary["abandoned"]:
+        print(f"  Abandoned:   {summary['abandoned']} still outstanding at the drain timeout (counted as status 0)")
+    if lat:
+        print(f"  Latency ok:  p50 {lat['p50_ms']} ms, p95 {lat['p95_ms']} ms, p99 {lat['p99_ms']} ms, "
+              f"max {lat['max_ms']} ms")
+    if "server_rss_mb" in summary:
+        rss = summary["server_rss_mb"]
+        print(f"  Server RSS:  {rss['start']} -> {rss['end']} MB (peak {rss['peak']} MB)")
+    for side, stats in summary["by_image_size"].items():
+        print(f"    {side:>5}px: {stats['ok']}/{stats['requests']} ok, p50 {stats.get('p50_ms', '-')} ms, "
+              f"p99 {stats.get('p99_ms', '-')} ms")
+    if summary["client_lag_p99_ms"] and summary["client_lag_p99_ms"] > 50:
+        print(f"  Note: p99 client send lag {summary['client_lag_p99_ms']} ms; the load generator itself "
+              f"was saturated (raise --max-inflight or lower --rate)")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Load test /api/analyze")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clients in closed-loop mode")
+    parser.add_argument("--rate", type=float, default=5.0, help="Arrivals per second in open-loop mode")
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson",
+                        help="Open-loop inter-arrival distribution")
+    parser.add_argument("--max-inflight", type=int, default=256, help="Open-loop client threads")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests before the run")
+    parser.add_argument("--image-sizes", type=str, default="512", help="Comma-separated square image sides")
+    parser.add_argument("--size-weights", type=str, default=None, help="Comma-separated weights per size")
+    parser.add_argument("--variants", type=int, default=4, help="Distinct images per size")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout (s)")
+    parser.add_argument("--server", choices=["subprocess", "inprocess"], default="subprocess",
+                        help="How to run the app (ignored with --url)")
+    parser.add_argument("--server-workers", type=int, default=1, help="uvicorn workers (subprocess only)")
+    parser.add_argument("--url", type=str, default=None, help="Test an already running server")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID to sample RSS from with --url")
+    parser.add_argument("--model", choices=["tiny", "local"], default="tiny",
+                        help="tiny: synthetic stand-in SigLIP + head; local: results/cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.image_sizes.split(",")]
+    weights = np.array([float(w) for w in args.size_weights.split(",")] if args.size_weights else [1.0] * len(sizes))
+    if len(weights) != len(sizes):
+        parser.error("--size-weights needs one weight per --image-sizes entry")
+    weights = weights / weights.sum()
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    output_path = Path(args.output or OUTPUT_DIR / f"load_{args.mode}_{stamp}.json")
+
+    env = {}
+    if args.url is None and args.model == "tiny":
+        from src.utils.synthetic import build_tiny_serving_cache
+        cache_dir, model_dir = build_tiny_serving_cache()
+        env = {"SKINTAG_CACHE_DIR": str(cache_dir), "SKINTAG_EMBEDDING_MODEL": str(model_dir)}
+        print(f"Serving tiny stand-in model from {cache_dir}")
+
+    print(f"Encoding payloads: sizes {sizes}, weights {weights.round(2).tolist()}")
+    payloads = build_payloads(sizes, variants=args.variants, seed=args.seed)
+
+    server = ServerUnderTest("external" if args.url else args.server, url=args.url, pid=args.server_pid,
+                             env=env, workers=args.server_workers,
+                             log_path=output_path.with_name(output_path.stem + "_server.log"))
+    print(f"Starting server ({server.how}) at {server.base_url}...")
+    server.start()
+    if server.how == "inprocess":
+        print("  Note: in-process RSS includes the load generator")
+
+    try:
+        client = _Client(server.host, server.port, args.timeout)
+        rng = np.random.default_rng(args.seed)
+        for _ in range(args.warmup):
+            client.post(*_pick(payloads, sizes, weights, rng)[1])
+
+        load = f"{args.concurrency} clients" if args.mode == "closed" else f"{args.rate}/s {args.arrival} arrivals"
+        print(f"Running {args.mode}-loop load for {args.duration:.0f}s ({load})...")
+        sampler = RssSampler(server.pid)
+        t_start = time.perf_counter()
+        sampler.start(t_start)
+        if args.mode == "closed":
+            records, t0 = run_closed_loop(client, payloads, sizes, weights, args.concurrency,
+                                          args.duration, seed=args.seed)
+        else:
+            records, t0 = run_open_loop(client, payloads, sizes, weights, args.rate, args.duration,
+                                        arrival=args.arrival, max_inflight=args.max_inflight,
+                                        drain_timeout=args.timeout, seed=args.seed)
+        elapsed = time.perf_counter() - t0
+        sampler.stop()
+    finally:
+        server.stop()
+
+    # RSS sample times are relative to t_start; align them with request times
+    rss_samples = [(t - (t0 - t_start), mb) for t, mb in sampler.samples]
+    summary = summarize(records, elapsed, rss_samples)
+    rows = timeline(records, rss_samples, elapsed)
+    print_report(summary, rows)
+
+    report = {
+        "timestamp": stamp,
+        "settings": {k: v for k, v in vars(args).items() if k != "output"},
+        "server": {"how": server.how, "url": server.base_url, "workers": args.server_workers},
+        "elapsed_seconds": round(elapsed, 2),
+        "summary": summary,
+        "timeline": rows,
+    }
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
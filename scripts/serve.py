@@ -0,0 +1,143 @@
+"""Multi-worker API server that loads the models once and forks workers sharing them.
+
+`uvicorn --workers N` starts N independent processes and each runs
+load_models(), so every worker holds its own copy of whatever the loaders copy
+into private memory (pickled heads, legacy .pt checkpoints, ...). Here the
+master process loads everything first (including the SigLIP extractor and the
+warmup pass), freezes the garbage collector's view of those objects, and then
+forks the workers: weight pages stay shared copy-on-write and are never
+written, so N workers cost roughly one model plus N small private heaps.
+Safetensors exports are additionally file-backed (see
+EndToEndClassifier.load_for_inference), so even separately started servers
+share them through the page cache.
+
+All workers accept on one listening socket. The master restarts workers that
+die and forwards SIGINT / SIGTERM. GET /api/memory on any worker reports the
+unique and shared memory of every process.
+
+CUDA cannot be initialized before fork(); on a GPU machine run one worker per
+GPU with plain uvicorn instead.
+
+Usage:
+    python scripts/serve.py --workers 4
+    python scripts/serve.py --workers 2 --port 8080 --threads-per-worker 2
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import gc
+import os
+import signal
+import socket
+import time
+
+
+def _listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(index: int, sock: socket.socket, args):
+    """Child process: serve on the shared socket until told to stop."""
+    import torch
+    import uvicorn
+
+    import app.main as app_main
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.environ["SKINTAG_WORKER_INDEX"] = str(index)
+    torch.set_num_threads(args.threads_per_worker)
+    config = uvicorn.Config(app_main.app, log_level=args.log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _fork_worker(index: int, sock, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(index, sock, args)
+        except BaseException as exc:
+            print(f"Worker {index} failed: {exc}", file=sys.stderr)
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Preforking multi-worker SkinTag API server")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="torch threads per worker (default: CPUs / workers)")
+    parser.add_argument("--log-level", type=str, default="info")
+    args = parser.parse_args()
+    args.threads_per_worker = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+
+    os.environ["SKINTAG_SERVE_MASTER_PID"] = str(os.getpid())
+    import torch
+
+    import app.main as app_main
+
+    if torch.cuda.is_available():
+        sys.exit("serve.py forks after loading, which CUDA does not support; use uvicorn on GPU machines")
+
+    start = time.time()
+    print(f"Loading models once in the master (pid {os.getpid()})...")
+    app_main.load_models()  # blocking here; includes the SigLIP extractor and warmup
+    if app_main._state["phase"] != "ready":
+        sys.exit(f"Model loading failed: {app_main._state['load_error']}")
+    # Move everything loaded so far out of the collector's reach: collections in
+    # the workers would otherwise write to these objects' headers and un-share pages
+    gc.collect()
+    gc.freeze()
+    print(f"Models loaded in {time.time() - start:.1f}s; starting {args.workers} workers "
+          f"({args.threads_per_worker} threads each) on {args.host}:{args.port}")
+
+    sock = _listen(args.host, args.port)
+    workers = {_fork_worker(i, sock, args): i for i in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = workers.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+        time.sleep(1)
+        workers[_fork_worker(index, sock, args)] = index
+    sock.close()
+    print("All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Summarise a shadow-evaluation log: how often the candidate model agrees with production.
+
+Reads the JSON-lines log written by app/shadow.py (one line per sampled
+request with [primary, shadow] outputs) and reports, per primary / shadow
+version pair:
+
+    decision agreement   both on the same side of --threshold
+    tier flip rate       urgency tier differs; split into escalations (shadow
+                         more urgent) and de-escalations, plus the flip matrix
+    mean / max |dp|      absolute malignancy probability difference
+    condition agreement  same top condition (requests where both have one)
+    shadow latency       p50 / p95 of the shadow model's own processing time
+
+De-escalations from "high" are the flips to look at before promoting.
+
+Usage:
+    python scripts/shadow_report.py
+    python scripts/shadow_report.py --log results/shadow/shadow_log.jsonl --since-hours 24 --output report.json
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import json
+import time
+
+import numpy as np
+
+TIERS = ("low", "moderate", "high")
+
+
+def read_log(path: Path, since: float = 0.0):
+    """Records from the log; unparseable lines (e.g. a torn last line) are counted and skipped."""
+    records, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if record["t"] >= since:
+                records.append(record)
+    return records, skipped
+
+
+def summarize(records: list, threshold: float = 0.5) -> dict:
+    """Agreement statistics for records of one primary / shadow version pair."""
+    p = np.array([r["p"] for r in records], dtype=float)
+    rank = {tier: i for i, tier in enumerate(TIERS)}
+    tiers = [(r["tier"][0], r["tier"][1]) for r in records]
+    flips = [(a, b) for a, b in tiers if a != b]
+    escalations = sum(rank.get(b, 0) > rank.get(a, 0) for a, b in flips)
+    conds = [(r["cond"][0], r["cond"][1]) for r in records if r["cond"][0] and r["cond"][1]]
+    latency = np.array([r["ms"] for r in records], dtype=float)
+
+    matrix = {}
+    for a, b in flips:
+        matrix[f"{a}->{b}"] = matrix.get(f"{a}->{b}", 0) + 1
+
+    n = len(records)
+    delta = np.abs(p[:, 0] - p[:, 1])
+    return {
+        "n": n,
+        "first": min(r["t"] for r in records),
+        "last": max(r["t"] for r in records),
+        "decision_agreement": float(np.mean((p[:, 0] >= threshold) == (p[:, 1] >= threshold))),
+        "tier_agreement": 1 - len(flips) / n,
+        "tier_flip_rate": len(flips) / n,
+        "escalation_rate": escalations / n,
+        "deescalation_rate": (len(flips) - escalations) / n,
+        "flips": dict(sorted(matrix.items(), key=lambda kv: -kv[1])),
+        "mean_abs_dp": float(delta.mean()),
+        "max_abs_dp": float(delta.max()),
+        "condition_agreement": (sum(a == b for a, b in conds) / len(conds)) if conds else None,
+        "shadow_ms_p50": float(np.percentile(latency, 50)),
+        "shadow_ms_p95": float(np.percentile(latency, 95)),
+    }
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Agreement and tier flips between primary and shadow models")
+    parser.add_argument("--log", type=str, default=str(PROJECT_ROOT / "results" / "shadow" / "shadow_log.jsonl"))
+    parser.add_argument("--since-hours", type=float, default=None, help="Only the most recent N hours")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Malignancy decision threshold")
+    parser.add_argument("--output", type=str, default=None, help="Also write the report as JSON")
+    args = parser.parse_args()
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else 0.0
+    records, skipped = read_log(Path(args.log), since)
+    if not records:
+        sys.exit(f"No shadow records in {args.log}")
+
+    pairs = {}
+    for record in records:
+        pairs.setdefault((record["pv"], record["sv"]), []).append(record)
+
+    report = {}
+    for (primary, shadow), group in sorted(pairs.items(), key=lambda kv: kv[1][0]["t"]):
+        summary = summarize(group, args.threshold)
+        report[f"{primary} vs {shadow}"] = summary
+        print(f"\n{primary} (primary) vs {shadow} (shadow): {summary['n']} requests, "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(summary['first']))} to "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(summary['last']))}")
+        print(f"  Decision agreement:  {summary['decision_agreement']:.1%} (threshold {args.threshold})")
+        print(f"  Tier flip rate:      {summary['tier_flip_rate']:.1%} "
+              f"(escalations {summary['escalation_rate']:.1%}, de-escalations {summary['deescalation_rate']:.1%})")
+        for flip, count in summary["flips"].items():
+            print(f"    {flip:<18} {count}")
+        print(f"  |dp| mean / max:     {summary['mean_abs_dp']:.4f} / {summary['max_abs_dp']:.4f}")
+        if summary["condition_agreement"] is not None:
+            print(f"  Condition agreement: {summary['condition_agreement']:.1%}")
+        print(f"  Shadow latency:      p50 {summary['shadow_ms_p50']:.1f} ms, p95 {summary['shadow_ms_p95']:.1f} ms")
+    if skipped:
+        print(f"\nSkipped {skipped} unreadable lines")
+
+    if args.output:
+        output_path = Path(args.output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump({"log": args.log, "threshold": args.threshold, "skipped_lines": skipped,
+                       "pairs": report}, f, indent=2)
+        print(f"\nReport saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Hyperparameter sweep over cached SigLIP embeddings (successive halving).
+
+Reads results/cache/embeddings.pt (written by run_pipeline.py), reproduces the
+pipeline's train/test split, and sweeps logistic / MLP / XGBoost / deep heads
+on the training portion only (a stratified 15% of it is the validation set).
+The test set is never touched. Runs offline on CPU.
+
+Usage:
+    python scripts/sweep.py                              # all model families
+    python scripts/sweep.py --models logistic xgboost --workers 4
+    python scripts/sweep.py --eta 2 --min-budget 0.25 --save-best
+
+Output:
+    results/cache/sweep_leaderboard.json  (model_results / comparison in the
+    compare_models format, plus the ranked leaderboard with rung history)
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import yaml
+import pickle
+import numpy as np
+import torch
+from sklearn.model_selection import train_test_split
+
+from src.data.loader import load_multi_dataset
+from src.data.schema import samples_to_arrays
+from src.data.sampler import compute_domain_balanced_weights, compute_stratified_split_key
+from src.model.sweep import DEFAULT_SEARCH_SPACE, build_model, run_sweep
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Successive-halving hyperparameter sweep")
+    parser.add_argument("--models", nargs="+", default=None,
+                        help=f"Model families to sweep (default: {' '.join(DEFAULT_SEARCH_SPACE)})")
+    parser.add_argument("--eta", type=int, default=None, help="Halving rate (keep top 1/eta per rung)")
+    parser.add_argument("--min-budget", type=float, default=None, help="First-rung budget fraction")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=None, help="Threads per worker")
+    parser.add_argument("--domain-balance", action="store_true", help="Use domain-balanced sample weights")
+    parser.add_argument("--save-best", action="store_true",
+                        help="Refit the winner on the full training split and save classifier_sweep_best.pkl")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    config_path = PROJECT_ROOT / "configs" / "config.yaml"
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    sweep_cfg = config.get("sweep", {})
+    seed = config["training"]["seed"]
+
+    data_dir = PROJECT_ROOT / "data"
+    cache_dir = PROJECT_ROOT / "results" / "cache"
+    emb_path = cache_dir / "embeddings.pt"
+    if not emb_path.exists():
+        print(f"No cached embeddings at {emb_path}. Run: python run_pipeline.py --no-app")
+        return
+
+    datasets = config.get("data", {}).get("datasets", None)
+    dataset_options = config.get("data", {}).get("dataset_options", {})
+    samples = load_multi_dataset(data_dir, datasets=datasets, dataset_options=dataset_options)
+    _, labels, metadata = samples_to_arrays(samples)
+
+    embeddings = torch.load(emb_path)
+    emb_np = embeddings.numpy() if hasattr(embeddings, "numpy") else np.asarray(embeddings)
+    if len(emb_np) != len(labels):
+        print(f"Cached embeddings ({len(emb_np)}) do not match the dataset ({len(labels)} samples). "
+              f"Re-run the pipeline without --quick to refresh the cache.")
+        return
+
+    # Same split as run_pipeline.stage_train_models; the sweep only sees the train side
+    stratify_key = labels
+    if "domain" in metadata.columns:
+        key = compute_stratified_split_key(labels, metadata["domain"].values)
+        if np.unique(key, return_counts=True)[1].min() >= 2:
+            stratify_key = key
+    X_train, _, y_train, _, meta_train, _ = train_test_split(
+        emb_np, labels, metadata, test_size=0.2, random_state=seed, stratify=stratify_key,
+    )
+
+    sample_weights = None
+    if args.domain_balance and "domain" in meta_train.columns:
+        sample_weights = compute_domain_balanced_weights(meta_train["domain"].values, y_train)
+
+    search_space = {**DEFAULT_SEARCH_SPACE, **sweep_cfg.get("search_space", {})}
+    output_path = Path(args.output) if args.output else cache_dir / "sweep_leaderboard.json"
+
+    result = run_sweep(
+        X_train, y_train,
+        sample_weight=sample_weights,
+        models=args.models or sweep_cfg.get("models"),
+        search_space=search_space,
+        eta=args.eta or sweep_cfg.get("eta", 3),
+        min_budget=args.min_budget or sweep_cfg.get("min_budget", 1 / 9),
+        n_workers=args.workers or sweep_cfg.get("workers"),
+        threads_per_worker=args.threads or sweep_cfg.get("threads_per_worker", 1),
+        seed=seed,
+        output_path=output_path,
+    )
+
+    # Leaderboard table
+    print(f"\n{'='*60}")
+    print("SWEEP LEADERBOARD")
+    print(f"{'='*60}")
+    print(f"{'#':>3} {'Config':<55} {'Budget':>7} {'F1 Mac':>7} {'Bal Acc':>8} {'AUC':>7}")
+    print("-" * 92)
+    for row in result["leaderboard"][:20]:
+        if "error" in row:
+            print(f"{row['rank']:>3} {row['name']:<55} FAILED: {row['error']}")
+            continue
+        print(f"{row['rank']:>3} {row['name']:<55} {row['budget']:>7.3f} {row['f1_macro']:>7.3f} "
+              f"{row['balanced_accuracy']:>8.3f} {row['auc']:>7.3f}")
+    sweep = result["sweep"]
+    print(f"\n{sweep['n_trials']} trials over {sweep['n_configs']} configs in {sweep['elapsed_seconds']:.1f}s")
+    print(f"Results saved to {output_path}")
+
+    if args.save_best and result["leaderboard"]:
+        best = result["leaderboard"][0]
+        print(f"\nRefitting best config on the full training split: {best['name']}")
+        clf = build_model({"model": best["model"], "params": best["params"]},
+                          embedding_dim=X_train.shape[1], n_jobs=-1)
+        clf.fit(X_train, y_train, sample_weight=sample_weights)
+        best_path = cache_dir / "classifier_sweep_best.pkl"
+        with open(best_path, "wb") as f:
+            pickle.dump(clf, f)
+        print(f"Saved: {best_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Sweep triage thresholds (low_max, moderate_max) on the held-out test set.
+
+Reads the chosen model's test-set probabilities from the prediction store
+written at training time (falling back to reproducing the run_pipeline.py
+evaluation split and running the classifier once), then scores every
+threshold pair on the grid: tier
+distribution, high-tier sensitivity/specificity, malignant cases left in the
+low tier, and the Fitzpatrick / domain sensitivity gaps. Prints the Pareto
+front and marks the current configs/config.yaml thresholds.
+
+Usage:
+    python scripts/threshold_sweep.py                       # logistic model
+    python scripts/threshold_sweep.py --model xgboost --step 0.01
+    python scripts/threshold_sweep.py --max-missed 0.02 --min-sensitivity 0.9
+
+Output:
+    results/cache/threshold_sweep_<model>.json  (current, pareto and all rows)
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import json
+import yaml
+import numpy as np
+import pandas as pd
+import torch
+from sklearn.model_selection import train_test_split
+
+from src.data.loader import get_demographic_groups
+from src.evaluation.prediction_store import PredictionStore, load_or_predict
+from src.evaluation.threshold_sweep import (
+    DEFAULT_OBJECTIVES, format_pareto_table, pareto_front, sweep_triage_thresholds, threshold_grid,
+)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Triage threshold sweep with Pareto table")
+    parser.add_argument("--model", type=str, default="logistic", help="classifier_<model>.pkl to evaluate")
+    parser.add_argument("--step", type=float, default=None, help="Grid step (default: config or 0.025)")
+    parser.add_argument("--max-missed", type=float, default=None,
+                        help="Max share of malignant cases in the low tier (default: config or 0.05)")
+    parser.add_argument("--min-sensitivity", type=float, default=None,
+                        help="Min high-tier sensitivity for Pareto rows")
+    parser.add_argument("--top", type=int, default=30, help="Pareto rows to print")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    config_path = PROJECT_ROOT / "configs" / "config.yaml"
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    sweep_cfg = config.get("evaluation", {}).get("threshold_sweep", {})
+    thresholds = config.get("triage", {}).get("thresholds", {})
+    current_pair = (thresholds.get("low_max", 0.3), thresholds.get("moderate_max", 0.6))
+    seed = config["training"]["seed"]
+
+    cache_dir = PROJECT_ROOT / "results" / "cache"
+    model_path = cache_dir / f"classifier_{args.model}.pkl"
+    if not model_path.exists():
+        print(f"Missing {model_path}. Run: python run_pipeline.py --no-app")
+        return
+
+    store = PredictionStore.open(cache_dir / "predictions")
+    if store is not None and store.has(args.model, model_path):
+        index = store.index("test")
+        y_test = np.asarray(index["label"])
+        groups = store.groups("test")
+        y_proba = np.asarray(store.read(args.model, "test")["proba"])
+    else:
+        # No current stored predictions: same test split as run_pipeline.stage_evaluate
+        meta_path = cache_dir / "metadata.csv"
+        emb_path = cache_dir / "embeddings.pt"
+        for path in (meta_path, emb_path):
+            if not path.exists():
+                print(f"Missing {path}. Run: python run_pipeline.py --no-app")
+                return
+        all_meta = pd.read_csv(meta_path)
+        embeddings = torch.load(emb_path, weights_only=True)
+        if len(embeddings) != len(all_meta):
+            print(f"Embedding/metadata mismatch: {len(embeddings)} vs {len(all_meta)}. Re-run training.")
+            return
+
+        labels_all = all_meta["label"].values if "label" in all_meta.columns else None
+        if labels_all is None:
+            from src.data.loader import BINARY_MAPPING
+            labels_all = np.array([BINARY_MAPPING.get(dx, 0) for dx in all_meta["dx"]])
+        indices = np.arange(len(all_meta))
+        _, test_idx = train_test_split(indices, test_size=0.2, random_state=seed, stratify=labels_all)
+
+        y_test = labels_all[test_idx]
+        groups = get_demographic_groups(all_meta.iloc[test_idx].reset_index(drop=True))
+        y_proba = load_or_predict(args.model, model_path, embeddings[test_idx].numpy())["proba"]
+
+    step = args.step or sweep_cfg.get("step", 0.025)
+    grid = threshold_grid(step, sweep_cfg.get("min_threshold", 0.05), sweep_cfg.get("max_threshold", 0.95))
+    gap_axes = sweep_cfg.get("gap_axes", ["fitzpatrick", "domain"])
+    rows = sweep_triage_thresholds(
+        y_test, y_proba, groups,
+        low_grid=grid, high_grid=grid,
+        gap_axes=gap_axes,
+        min_group_size=sweep_cfg.get("min_group_size", 5),
+        extra_pairs=[current_pair],
+    )
+    current = next(r for r in rows if (r["low_max"], r["moderate_max"]) == tuple(map(float, current_pair)))
+    max_missed = args.max_missed if args.max_missed is not None else sweep_cfg.get("max_missed_in_low", 0.05)
+    front = pareto_front(rows, DEFAULT_OBJECTIVES, max_missed_in_low=max_missed,
+                         min_sensitivity_high=args.min_sensitivity)
+
+    print(f"\n{'='*60}")
+    print(f"TRIAGE THRESHOLD SWEEP — {args.model} ({len(y_test)} test samples)")
+    print(f"{'='*60}")
+    print(f"{len(rows)} threshold pairs, {len(front)} on the Pareto front "
+          f"(objectives: {', '.join(f'{s} {c}' for c, s in DEFAULT_OBJECTIVES.items())}; "
+          f"missed_in_low <= {max_missed})\n")
+    print(format_pareto_table(front[:args.top], current, axes=gap_axes))
+
+    output_path = Path(args.output) if args.output else cache_dir / f"threshold_sweep_{args.model}.json"
+    with open(output_path, "w") as f:
+        json.dump({
+            "model": args.model,
+            "n_test": int(len(y_test)),
+            "objectives": DEFAULT_OBJECTIVES,
+            "max_missed_in_low": max_missed,
+            "min_sensitivity_high": args.min_sensitivity,
+            "current": current,
+            "pareto": front,
+            "all": rows,
+        }, f, indent=2)
+    print(f"\nResults saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,7 @@ from sklearn.metrics import f1_score
 
 from src.model.embeddings import EmbeddingExtractor
 from src.model.classifier import SklearnClassifier
+from src.model.incremental import EmbeddingChunks, predict_chunks
 from src.model.baseline import MajorityClassBaseline, RandomWeightedBaseline
 from src.model.deep_classifier import DeepClassifier
 from src.data.loader import load_ham10000, load_multi_dataset, CLASS_NAMES
@@ -38,7 +39,12 @@ def main():
     parser.add_argument("--domain-balance", action="store_true", help="Use domain-balanced sample weights")
     parser.add_argument("--model", choices=["all", "logistic", "deep", "baseline"], default="logistic",
                         help="Which model(s) to train")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Train sklearn heads out-of-core, streaming rows of the embedding cache file (SGD/partial_fit)")
     args = parser.parse_args()
+    if args.incremental and args.model in ("all", "deep"):
+        parser.error("--incremental streams embeddings for the sklearn heads; "
+                     "the deep head needs them in memory (use --model logistic or baseline)")
 
     config_path = Path(__file__).parent.parent / "configs" / "config.yaml"
     with open(config_path) as f:
@@ -97,9 +103,16 @@ def main():
 
     # Extract embeddings
     embedding_cache = cache_dir / "embeddings.pt"
-    extractor = EmbeddingExtractor(device=device)
-    embeddings = extractor.extract_dataset(images, batch_size=batch_size, cache_path=embedding_cache)
-    extractor.unload_model()
+    inc_cfg = config["training"].get("incremental", {})
+    if not (args.incremental and embedding_cache.exists()):
+        extractor = EmbeddingExtractor(device=device)
+        embeddings = extractor.extract_dataset(images, batch_size=batch_size, cache_path=embedding_cache,
+                                               reduced=config.get("decode", {}).get("reduced", True))
+        extractor.unload_model()
+    if args.incremental:
+        # Stream rows from the memory-mapped cache file instead of holding the matrix
+        embeddings = EmbeddingChunks(embedding_cache, chunk_size=inc_cfg.get("chunk_size", 8192))
+        print(f"Streaming {len(embeddings)} embeddings from {embedding_cache}")
 
     # Stratified split — use (label, domain) composite key if multi-dataset
     if args.multi_dataset and "domain" in metadata.columns:
@@ -114,10 +127,18 @@ def main():
         stratify_key = labels
         domains = None
 
-    X_train, X_test, y_train, y_test, meta_train, meta_test = train_test_split(
-        embeddings.numpy(), labels, metadata,
+    idx_train, idx_test, y_train, y_test, meta_train, meta_test = train_test_split(
+        np.arange(len(labels)), labels, metadata,
         test_size=0.2, random_state=config["training"]["seed"], stratify=stratify_key
     )
+    if args.incremental:
+        # Each split is a row view over the cache file; nothing is copied out
+        X_train = EmbeddingChunks(embedding_cache, chunk_size=embeddings.chunk_size, rows=idx_train)
+        X_test = EmbeddingChunks(embedding_cache, chunk_size=embeddings.chunk_size, rows=idx_test)
+        embedding_dim = embeddings.n_features
+    else:
+        X_train, X_test = embeddings[idx_train].numpy(), embeddings[idx_test].numpy()
+        embedding_dim = embeddings.shape[1]
 
     # Save test metadata for evaluation
     meta_test.to_csv(cache_dir / "test_metadata.csv", index=False)
@@ -147,22 +168,28 @@ def main():
             clf = MajorityClassBaseline()
             clf.fit(X_train, y_train)
         elif model_type == "logistic":
-            clf = SklearnClassifier(classifier_type="logistic")
+            clf = SklearnClassifier(
+                classifier_type="logistic",
+                incremental=args.incremental,
+                chunk_size=inc_cfg.get("chunk_size", 8192),
+                epochs=inc_cfg.get("epochs", 5),
+            )
             clf.fit(X_train, y_train, sample_weight=sample_weights)
         elif model_type == "deep":
             clf = DeepClassifier(
-                embedding_dim=embeddings.shape[1],
+                embedding_dim=embedding_dim,
                 device=device,
             )
             clf.fit(X_train, y_train, sample_weight=sample_weights)
         else:
             continue
 
-        train_acc = clf.score(X_train, y_train)
-        test_acc = clf.score(X_test, y_test)
-
-        y_pred_test = clf.predict(X_test)
-        y_pred_train = clf.predict(X_train)
+        # One forward per split; accuracy and F1 both come from these labels
+        predict = (lambda X: predict_chunks(clf, X)) if args.incremental else clf.predict_all
+        y_pred_train = predict(X_train)["pred"]
+        y_pred_test = predict(X_test)["pred"]
+        train_acc = float(np.mean(y_pred_train == np.asarray(y_train)))
+        test_acc = float(np.mean(y_pred_test == np.asarray(y_test)))
         test_f1 = float(f1_score(y_test, y_pred_test, average='macro', zero_division=0))
         train_f1 = float(f1_score(y_train, y_pred_train, average='macro', zero_division=0))
         test_f1_bin = float(f1_score(y_test, y_pred_test, pos_label=1, zero_division=0))
@@ -202,7 +229,7 @@ def main():
         print(f"| {model_type} | {res['train_accuracy']:.3f} | {res['test_accuracy']:.3f} "
               f"| {res['test_f1_macro']:.3f} | {res['test_f1_malignant']:.3f} |")
     print(f"| Samples | {len(X_train)} train | {len(X_test)} test |")
-    print(f"| Embedding Dim | {embeddings.shape[1]} |")
+    print(f"| Embedding Dim | {embedding_dim} |")
 
 
 if __name__ == "__main__":
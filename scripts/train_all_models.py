@@ -26,6 +26,7 @@ from src.data.loader import load_ham10000, load_multi_dataset, CLASS_NAMES
 from src.data.schema import samples_to_arrays
 from src.data.sampler import compute_domain_balanced_weights
 from src.evaluation.metrics import robustness_report, compare_models
+from src.evaluation.prediction_store import PredictionStore, model_version, predict_columns
 from src.data.loader import get_demographic_groups
 
 
@@ -72,12 +73,14 @@ def main():
     # Extract embeddings
     cache_path = cache_dir / "embeddings_all_models.pt"
     extractor = EmbeddingExtractor(device=device)
-    embeddings = extractor.extract_dataset(images, batch_size=batch_size, cache_path=cache_path)
+    embeddings = extractor.extract_dataset(images, batch_size=batch_size, cache_path=cache_path,
+                                           reduced=config.get("decode", {}).get("reduced", True))
     extractor.unload_model()
 
     # Split
-    X_train, X_test, y_train, y_test, meta_train, meta_test = train_test_split(
-        embeddings.numpy(), labels, metadata,
+    emb_np = embeddings.numpy()
+    X_train, X_test, y_train, y_test, meta_train, meta_test, idx_train, idx_test = train_test_split(
+        emb_np, labels, metadata, np.arange(len(labels)),
         test_size=0.2, random_state=seed, stratify=labels
     )
 
@@ -100,6 +103,14 @@ def main():
     all_results = {}
     test_groups = get_demographic_groups(meta_test)
 
+    # Per-sample predictions (rows of embeddings_all_models.pt), read back by analysis scripts
+    split = np.full(len(labels), "train", dtype=object)
+    split[idx_test] = "test"
+    store = PredictionStore.create(
+        cache_dir / "predictions_all_models", sample_ids=np.arange(len(labels)), split=split,
+        labels=labels, groups=get_demographic_groups(metadata),
+    )
+
     for name, clf in models.items():
         print(f"\n--- Training: {name} ---")
 
@@ -108,8 +119,9 @@ def main():
         else:
             clf.fit(X_train, y_train, sample_weight=sample_weights)
 
-        y_pred = clf.predict(X_test)
-        y_proba = clf.predict_proba(X_test) if hasattr(clf, 'predict_proba') else None
+        columns = predict_columns(clf, emb_np)
+        y_pred = columns["pred"][idx_test]
+        y_proba = columns["proba"][idx_test] if "proba" in columns else None
 
         report = robustness_report(
             y_test, y_pred,
@@ -119,7 +131,7 @@ def main():
         )
 
         all_results[name] = {
-            "train_accuracy": float(clf.score(X_train, y_train)),
+            "train_accuracy": float(np.mean(columns["pred"][idx_train] == y_train)),
             "test_accuracy": float(report["overall_accuracy"]),
             "balanced_accuracy": float(report["balanced_accuracy"]),
             "f1_binary": float(report["f1_binary"]),
@@ -129,8 +141,10 @@ def main():
         }
 
         # Save model
-        with open(cache_dir / f"classifier_{name}.pkl", "wb") as f:
+        model_path = cache_dir / f"classifier_{name}.pkl"
+        with open(model_path, "wb") as f:
             pickle.dump(clf, f)
+        store.write_model(name, columns, version=model_version(model_path))
 
         print(f"  Train acc: {all_results[name]['train_accuracy']:.3f}")
         print(f"  Test acc: {all_results[name]['test_accuracy']:.3f}")
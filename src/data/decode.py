@@ -0,0 +1,112 @@
+"""Image decoding for inference: reduced JPEG decoding, EXIF orientation and size caps.
+
+SigLIP only ever sees 384x384 (or the checkpoint's input size), but a 12 MP
+phone photo decoded in full is 4032x3024 pixels that the image processor then
+throws away. decode_image() asks the JPEG decoder for a DCT-domain reduced
+decode (scale 1/2, 1/4 or 1/8) at the smallest scale that still covers the
+model input, box-reduces other formats by the largest integer factor that
+does, and applies the EXIF orientation so portrait phone photos are upright.
+Oversized inputs are rejected from the byte count and the image header,
+before any pixel is decoded.
+
+Used by the API (app/main.py) and EmbeddingExtractor, so training-time
+extraction and serving decode images the same way.
+
+    image = decode_image(upload_bytes, target_size=processor_input_size(processor))
+"""
+
+import io
+from pathlib import Path
+
+from PIL import Image
+
+DEFAULT_MAX_BYTES = 20 * 2**20
+DEFAULT_MAX_PIXELS = 100_000_000
+EXIF_ORIENTATION = 0x0112
+# EXIF orientation -> transpose that makes the image upright (as in ImageOps.exif_transpose)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+# Modes Image.reduce() supports; others (P, 1, I;16, ...) are converted to RGB first
+REDUCIBLE_MODES = {"RGB", "RGBA", "RGBX", "L", "LA", "CMYK", "YCbCr", "I", "F"}
+
+
+class ImageTooLarge(ValueError):
+    """The input exceeds the configured byte or pixel cap."""
+
+
+def processor_input_size(processor, default=(384, 384)):
+    """(width, height) the image processor resizes to."""
+    size = getattr(processor, "size", None)
+    if size is None:
+        return default
+    height, width = size.get("height"), size.get("width")
+    if height and width:
+        return width, height
+    edge = size.get("shortest_edge")
+    return (edge, edge) if edge else default
+
+
+def decode_image(source, target_size=None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_pixels: int = DEFAULT_MAX_PIXELS, reduce: bool = True) -> Image.Image:
+    """Decode an image to RGB, no smaller than target_size in either dimension.
+
+    Args:
+        source: Encoded bytes, a path, a binary file object, or a PIL image
+            (returned as RGB, unchanged otherwise)
+        target_size: (width, height) the model resizes to; None decodes at full size
+        max_bytes: Reject encoded inputs larger than this (None: no cap)
+        max_pixels: Reject images whose header declares more pixels (None: no cap)
+        reduce: Use reduced decoding / integer downscaling (False: full decode)
+
+    Raises:
+        ImageTooLarge: input over a cap
+        PIL.UnidentifiedImageError / OSError: not a readable image
+    """
+    if isinstance(source, Image.Image):
+        return source if source.mode == "RGB" else source.convert("RGB")
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        n_bytes = len(source)
+        source = io.BytesIO(source)
+    elif isinstance(source, (str, Path)):
+        n_bytes = Path(source).stat().st_size
+    else:
+        n_bytes = None
+    if max_bytes is not None and n_bytes is not None and n_bytes > max_bytes:
+        raise ImageTooLarge(f"Image is {n_bytes / 2**20:.1f} MB (limit {max_bytes / 2**20:.0f} MB)")
+
+    image = Image.open(source)  # reads the header only
+    width, height = image.size
+    if max_pixels is not None and width * height > max_pixels:
+        raise ImageTooLarge(f"Image is {width}x{height} ({width * height / 1e6:.0f} MP, "
+                            f"limit {max_pixels / 1e6:.0f} MP)")
+
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    if reduce and target_size is not None:
+        target_w, target_h = target_size
+        if orientation in (5, 6, 7, 8):  # rotated 90 degrees: the stored image is transposed
+            target_w, target_h = target_h, target_w
+        if image.format == "JPEG":
+            # Largest DCT scale-down that keeps both sides >= target
+            image.draft("RGB", (target_w, target_h))
+        factor = min(image.size[0] // target_w, image.size[1] // target_h)
+        if factor >= 2:
+            if image.mode not in REDUCIBLE_MODES:
+                image = image.convert("RGB")
+            image = image.reduce(factor)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    else:
+        image.load()  # decode now (and release the file), like convert() would
+    # From the orientation read above: reduce() drops the EXIF data
+    if orientation in ORIENTATION_TRANSPOSE:
+        image = image.transpose(ORIENTATION_TRANSPOSE[orientation])
+    return image
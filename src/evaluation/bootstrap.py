@@ -0,0 +1,244 @@
+"""Bootstrap confidence intervals for the robustness report.
+
+Instead of calling the metric functions B times, all B resamples are drawn
+as one (B, N) index matrix. Confusion counts per replicate (overall and for
+every group of every axis) come from a single bincount over
+replicate * n_keys + key[index]. Per-replicate AUC uses the same bincount
+over (group, score) tie blocks precomputed from one sort per axis. Every
+metric is then computed for all replicates at once from those counts.
+
+Percentile intervals are reported for every metric robustness_report
+produces on binary labels: overall accuracy / balanced accuracy / F1 /
+AUC, each per-group metric, and the fairness and equalized-odds gaps.
+"""
+
+import numpy as np
+
+from src.evaluation.metrics import _binary_group_stats, _encode_groups
+
+# Cap on B x N index draws held in memory at once (int64 -> ~160 MB)
+_MAX_DRAWS_PER_CHUNK = 20_000_000
+
+_GROUP_METRICS = (
+    "accuracy", "balanced_accuracy", "sensitivity", "specificity",
+    "precision", "f1", "f1_macro",
+)
+
+
+def bootstrap_confidence_intervals(
+    y_true,
+    y_pred,
+    y_proba=None,
+    groups: dict = None,
+    n_bootstrap: int = 1000,
+    seed: int = 42,
+    ci_level: float = 0.95,
+):
+    """Percentile bootstrap CIs for overall, per-group and gap metrics.
+
+    Args:
+        y_true, y_pred: binary 0/1 labels and predictions
+        y_proba: optional scores (N,) or probabilities (N, 2) for AUC
+        groups: dict of axis name -> group assignment (as in robustness_report)
+        n_bootstrap: number of resamples B
+        seed: RNG seed for the resampling matrix
+        ci_level: interval coverage (0.95 -> 2.5th / 97.5th percentiles)
+
+    Returns:
+        dict mirroring the robustness_report keys with [lower, upper] per
+        metric, or None when labels are not binary
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    if not (np.isin(y_true, (0, 1)).all() and np.isin(y_pred, (0, 1)).all()) or len(y_true) == 0:
+        return None
+
+    n = len(y_true)
+    cell = 2 * y_true.astype(np.int64) + y_pred.astype(np.int64)
+    score = _positive_scores(y_proba)
+    rng = np.random.default_rng(seed)
+
+    # Per-axis integer keys: group * 4 + cell, only groups with n >= 2 (as reported)
+    axes = {}
+    for axis, values in (groups or {}).items():
+        names, codes = _encode_groups(values)
+        keep = np.bincount(codes, minlength=len(names)) >= 2
+        axes[axis] = {"names": names, "codes": codes, "keep": keep, "key": codes * 4 + cell}
+        if score is not None:
+            axes[axis]["auc_blocks"] = _auc_blocks(y_true, score, codes)
+
+    overall_counts = []
+    axis_counts = {axis: [] for axis in axes}
+    overall_auc, axis_auc = [], {axis: [] for axis in axes}
+    overall_blocks = _auc_blocks(y_true, score) if score is not None else None
+
+    chunk = max(1, _MAX_DRAWS_PER_CHUNK // n)
+    for start in range(0, n_bootstrap, chunk):
+        nb = min(chunk, n_bootstrap - start)
+        idx = rng.integers(0, n, size=(nb, n))
+        rows = np.arange(nb)[:, None]
+
+        overall_counts.append(_bincount_rows(rows * 4 + cell[idx], nb, 4))
+        for axis, spec in axes.items():
+            n_keys = 4 * len(spec["names"])
+            counts = _bincount_rows(rows * n_keys + spec["key"][idx], nb, n_keys)
+            axis_counts[axis].append(counts.reshape(nb, len(spec["names"]), 4))
+
+        if score is not None:
+            overall_auc.append(_weighted_auc(idx, overall_blocks))
+            for axis, spec in axes.items():
+                axis_auc[axis].append(_weighted_auc(idx, spec["auc_blocks"], len(spec["names"])))
+
+    lo_q, hi_q = 50 * (1 - ci_level), 50 * (1 + ci_level)
+
+    def interval(values):
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim == 1:
+            values = values[:, None]
+        finite = ~np.isnan(values)
+        out = np.full((2, values.shape[1]), np.nan)
+        for j in np.flatnonzero(finite.any(axis=0)):
+            out[:, j] = np.percentile(values[finite[:, j], j], [lo_q, hi_q])
+        return out
+
+    def pair(bounds, j=0):
+        return [float(bounds[0, j]), float(bounds[1, j])]
+
+    # Overall metrics, same definitions as robustness_report
+    counts = np.concatenate(overall_counts)
+    tn, fp, fn, tp = counts[:, 0], counts[:, 1], counts[:, 2], counts[:, 3]
+    stats = _binary_group_stats(tn, fp, fn, tp)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f1_pos = np.nan_to_num(2.0 * tp / (2 * tp + fp + fn), nan=0.0)
+        f1_neg = np.nan_to_num(2.0 * tn / (2 * tn + fn + fp), nan=0.0)
+        f1_weighted = (f1_neg * (tn + fp) + f1_pos * (tp + fn)) / n
+        # sklearn macro F1 averages over the labels present in y_true or y_pred
+        has_neg = (tn + fp + fn) > 0
+        has_pos = (tp + fn + fp) > 0
+        f1_macro = (f1_neg * has_neg + f1_pos * has_pos) / (has_neg.astype(int) + has_pos)
+    overall = {
+        "overall_accuracy": pair(interval(stats["accuracy"])),
+        "balanced_accuracy": pair(interval(stats["balanced_accuracy"])),
+        "f1_binary": pair(interval(f1_pos)),
+        "f1_macro": pair(interval(f1_macro)),
+        "f1_weighted": pair(interval(f1_weighted)),
+    }
+    if score is not None:
+        overall["auc"] = pair(interval(np.concatenate(overall_auc)))
+
+    result = {
+        "n_bootstrap": int(n_bootstrap),
+        "seed": int(seed),
+        "ci_level": float(ci_level),
+        "overall": overall,
+    }
+
+    for axis, spec in axes.items():
+        counts = np.concatenate(axis_counts[axis])  # (B, G, 4)
+        g_stats = _binary_group_stats(counts[..., 0], counts[..., 1], counts[..., 2], counts[..., 3])
+        present = g_stats["n"] >= 2  # group still reportable in this replicate
+        keep = np.flatnonzero(spec["keep"])
+
+        metric_values = {m: np.where(present, g_stats[m], np.nan) for m in _GROUP_METRICS}
+        if score is not None:
+            metric_values["auc"] = np.where(present, np.concatenate(axis_auc[axis]), np.nan)
+        bounds = {m: interval(v[:, keep]) for m, v in metric_values.items()}
+
+        result[f"per_{axis}"] = {
+            str(spec["names"][g]): {m: pair(bounds[m], j) for m in bounds}
+            for j, g in enumerate(keep)
+        }
+        result[f"{axis}_fairness_gap"] = pair(interval(_gap(metric_values["accuracy"][:, keep], min_groups=1)))
+        gaps = {
+            "sensitivity_gap": _gap(metric_values["sensitivity"][:, keep]),
+            "specificity_gap": _gap(metric_values["specificity"][:, keep]),
+            "f1_gap": _gap(metric_values["f1"][:, keep]),
+        }
+        gaps["max_gap"] = np.maximum.reduce([gaps["sensitivity_gap"], gaps["specificity_gap"], gaps["f1_gap"]])
+        result[f"{axis}_equalized_odds"] = {k: pair(interval(v)) for k, v in gaps.items()}
+
+    return result
+
+
+def _positive_scores(y_proba):
+    """Positive-class scores, or None when AUC cannot be computed."""
+    if y_proba is None:
+        return None
+    proba = np.asarray(y_proba, dtype=np.float64)
+    if proba.ndim == 2:
+        if proba.shape[1] < 2:
+            return None
+        proba = proba[:, 1]
+    if not np.isfinite(proba).all():
+        return None
+    return proba
+
+
+def _bincount_rows(keys, n_rows, n_keys):
+    """Row-wise bincount of a (n_rows, N) key matrix already offset by row * n_keys."""
+    return np.bincount(keys.ravel(), minlength=n_rows * n_keys).reshape(n_rows, n_keys)
+
+
+def _auc_blocks(y_true, score, codes=None):
+    """Precompute tie blocks for _weighted_auc.
+
+    Samples are sorted by (group, score); each run of equal (group, score) is
+    one block. Returns the per-sample bincount key (2 * block + label), the
+    number of blocks, the start block of every group and the group ids.
+    """
+    g = codes if codes is not None else np.zeros(len(score), dtype=np.int64)
+    order = np.lexsort((score, g))
+    s, gs = score[order], g[order]
+    new_block = np.r_[True, (np.diff(s) != 0) | (np.diff(gs) != 0)]
+    block_of_sorted = np.cumsum(new_block) - 1
+    block = np.empty(len(score), dtype=np.int64)
+    block[order] = block_of_sorted
+
+    block_group = gs[new_block]
+    group_starts = np.flatnonzero(np.r_[True, np.diff(block_group) != 0])
+    return {
+        "key": 2 * block + (y_true == 1),
+        "n_blocks": len(block_group),
+        "group_starts": group_starts,
+        "groups": block_group[group_starts],
+    }
+
+
+def _weighted_auc(idx, blocks, n_groups=None):
+    """AUC for every replicate (and group) of a (B, N) resample index matrix.
+
+    AUC = P(score+ > score-) + 0.5 P(tie), with each sample counted as many
+    times as it was drawn. Positive/negative counts per tie block come from
+    one bincount; a cumulative sum gives the negatives ranked below each block.
+    """
+    nb, k = idx.shape[0], blocks["n_blocks"]
+    rows = np.arange(nb)[:, None]
+    counts = _bincount_rows(rows * (2 * k) + blocks["key"][idx], nb, 2 * k).reshape(nb, k, 2)
+    neg_w, pos_w = counts[..., 0], counts[..., 1]
+
+    starts = blocks["group_starts"]
+    sizes = np.diff(np.r_[starts, k])
+    cum_neg = np.cumsum(neg_w, axis=1)
+    neg_before = cum_neg - neg_w
+    # Negatives strictly below each block, within its own group
+    neg_below = neg_before - np.repeat(neg_before[:, starts], sizes, axis=1)
+
+    num = np.add.reduceat(pos_w * (neg_below + 0.5 * neg_w), starts, axis=1)
+    tot_pos = np.add.reduceat(pos_w, starts, axis=1)
+    tot_neg = np.add.reduceat(neg_w, starts, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        auc = np.where((tot_pos > 0) & (tot_neg > 0), num / (tot_pos * tot_neg), np.nan)
+
+    if n_groups is None:
+        return auc[:, 0]
+    out = np.full((nb, n_groups), np.nan)
+    out[:, blocks["groups"]] = auc
+    return out
+
+
+def _gap(values, min_groups: int = 2):
+    """max - min over non-NaN groups per replicate; 0 when fewer than min_groups."""
+    valid = ~np.isnan(values)
+    hi = np.where(valid, values, -np.inf).max(axis=1, initial=-np.inf)
+    lo = np.where(valid, values, np.inf).min(axis=1, initial=np.inf)
+    return np.where(valid.sum(axis=1) >= min_groups, hi - lo, 0.0)
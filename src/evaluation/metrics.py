@@ -54,6 +54,176 @@ def compute_per_group_metrics(y_true, y_pred, y_proba, groups):
 
     Returns dict of group -> {accuracy, balanced_accuracy, sensitivity, specificity, auc, n}
     """
+    return compute_group_metrics_by_axis(y_true, y_pred, y_proba, {"group": groups})["group"]
+
+
+def compute_group_metrics_by_axis(y_true, y_pred, y_proba, groups: dict):
+    """Per-group metrics for several grouping axes at once.
+
+    Binary 0/1 labels take a vectorized path: groups are integer-encoded once
+    per axis, confusion counts for every group of every axis come from a single
+    bincount, and per-group AUC is computed from one sort per axis. Results
+    are identical to the per-group sklearn loop, which is still used for
+    non-binary labels.
+
+    Args:
+        groups: dict of axis name -> group assignment for each sample
+
+    Returns:
+        dict of axis name -> {group: metrics} (same layout as compute_per_group_metrics)
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    if not (np.isin(y_true, (0, 1)).all() and np.isin(y_pred, (0, 1)).all()):
+        return {
+            axis: _per_group_metrics_loop(y_true, y_pred, y_proba, values)
+            for axis, values in groups.items()
+        }
+
+    # Integer-encode each axis and stack the axes with code offsets
+    names, codes, offset = {}, [], 0
+    for axis, values in groups.items():
+        axis_names, axis_codes = _encode_groups(values)
+        names[axis] = (axis_names, offset)
+        codes.append(axis_codes + offset)
+        offset += len(axis_names)
+    if offset == 0:
+        return {axis: {} for axis in groups}
+
+    # cell: 0 = TN, 1 = FP, 2 = FN, 3 = TP
+    cell = 2 * y_true.astype(np.int64) + y_pred.astype(np.int64)
+    flat = np.concatenate(codes) * 4 + np.tile(cell, len(codes))
+    counts = np.bincount(flat, minlength=4 * offset).reshape(offset, 4)
+    tn, fp, fn, tp = counts[:, 0], counts[:, 1], counts[:, 2], counts[:, 3]
+    stats = _binary_group_stats(tn, fp, fn, tp)
+
+    proba = None
+    if y_proba is not None:
+        proba = np.asarray(y_proba)
+        if proba.ndim == 2:
+            proba = proba[:, 1] if proba.shape[1] > 1 else None
+
+    results = {}
+    for (axis, (axis_names, start)), axis_codes in zip(names.items(), codes):
+        auc = np.full(len(axis_names), np.nan)
+        if proba is not None:
+            auc = _grouped_auc(y_true, proba, axis_codes - start, len(axis_names),
+                               stats["both_classes"][start:start + len(axis_names)])
+        per_group = {}
+        for k, group in enumerate(axis_names):
+            g = start + k
+            if stats["n"][g] < 2:
+                continue
+            per_group[str(group)] = {
+                "accuracy": float(stats["accuracy"][g]),
+                "balanced_accuracy": float(stats["balanced_accuracy"][g]),
+                "sensitivity": float(stats["sensitivity"][g]),
+                "specificity": float(stats["specificity"][g]),
+                "precision": float(stats["precision"][g]),
+                "f1": float(stats["f1"][g]),
+                "f1_macro": float(stats["f1_macro"][g]),
+                "auc": float(auc[k]),
+                "n": int(stats["n"][g]),
+            }
+        results[axis] = per_group
+    return results
+
+
+def _encode_groups(groups):
+    """(sorted group names as strings, integer code per sample).
+
+    Names are str(g) for each value, sorted as strings, exactly like the
+    per-group loop. Numeric arrays are encoded first and only the unique
+    values are stringified.
+    """
+    groups = np.asarray(groups)
+    if groups.dtype == object:
+        return np.unique(np.asarray([str(g) for g in groups]), return_inverse=True)
+    values, codes = np.unique(groups, return_inverse=True)
+    names = values.astype(str)
+    if len(np.unique(names)) != len(names):
+        return np.unique(groups.astype(str), return_inverse=True)
+    order = np.argsort(names, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return names[order], rank[codes.reshape(-1)]
+
+
+def _binary_group_stats(tn, fp, fn, tp):
+    """Vectorized per-group metrics from confusion counts.
+
+    Every expression mirrors the scalar formulas (and sklearn's for balanced
+    accuracy / macro F1) in the same operation order, so values match exactly.
+    """
+    n = tn + fp + fn + tp
+    pos, neg = tp + fn, tn + fp
+    both = (pos > 0) & (neg > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accuracy = (tp + tn) / n
+        sensitivity = np.where(pos > 0, tp / pos, np.nan)
+        specificity = np.where(neg > 0, tn / neg, np.nan)
+        precision = np.where(tp + fp > 0, tp / (tp + fp), np.nan)
+
+        valid = ~(np.isnan(precision) | np.isnan(sensitivity)) & (precision + sensitivity > 0)
+        f1 = np.where(valid, 2 * precision * sensitivity / (precision + sensitivity), np.nan)
+
+        # sklearn: F1_c = 2 tp_c / (true_c + pred_c), macro = mean over {0, 1}
+        f1_neg = 2.0 * tn / (1.0 * neg + (tn + fn))
+        f1_pos = 2.0 * tp / (1.0 * pos + (tp + fp))
+        f1_macro = np.where(both, (f1_neg + f1_pos) / 2, f1)
+        balanced = np.where(both, (specificity + sensitivity) / 2, accuracy)
+
+    return {
+        "n": n,
+        "both_classes": both,
+        "accuracy": accuracy,
+        "balanced_accuracy": balanced,
+        "sensitivity": sensitivity,
+        "specificity": specificity,
+        "precision": precision,
+        "f1": f1,
+        "f1_macro": f1_macro,
+    }
+
+
+def _grouped_auc(y_true, scores, codes, n_groups, both_classes):
+    """ROC AUC per group from one sort by (group, -score).
+
+    Each group's slice goes through the same steps as sklearn's roc_curve
+    (distinct thresholds, cumulative TP/FP, dropping collinear points) and
+    trapezoid, so the result equals roc_auc_score on that group.
+    """
+    auc = np.full(n_groups, np.nan)
+    order = np.lexsort((-scores, codes))
+    sorted_codes = codes[order]
+    sorted_scores = scores[order]
+    sorted_true = (y_true[order] == 1).astype(np.float64)
+    bounds = np.searchsorted(sorted_codes, np.arange(n_groups + 1))
+
+    for g in np.flatnonzero(both_classes):
+        lo, hi = bounds[g], bounds[g + 1]
+        score = sorted_scores[lo:hi]
+        if not np.isfinite(score).all():
+            continue  # roc_auc_score rejects NaN/inf scores
+        distinct = np.flatnonzero(np.diff(score))
+        threshold_idxs = np.r_[distinct, hi - lo - 1]
+        tps = np.cumsum(sorted_true[lo:hi], dtype=np.float64)[threshold_idxs]
+        fps = 1 + threshold_idxs.astype(np.float64) - tps
+        if fps.shape[0] > 2:
+            keep = np.flatnonzero(np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True])
+            fps, tps = fps[keep], tps[keep]
+        tps = np.r_[0.0, tps]
+        fps = np.r_[0.0, fps]
+        auc[g] = float(_trapezoid(tps / tps[-1], fps / fps[-1]))
+    return auc
+
+
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def _per_group_metrics_loop(y_true, y_pred, y_proba, groups):
+    """Reference per-group loop (used for non-binary labels)."""
     y_true = np.asarray(y_true)
     y_pred = np.asarray(y_pred)
     groups = np.asarray([str(g) for g in groups])  # normalize mixed types
@@ -227,10 +397,13 @@ def condition_classification_report(y_true, y_pred):
     }
 
 
-def robustness_report(y_true, y_pred, groups=None, class_names=None, y_proba=None):
+def robustness_report(y_true, y_pred, groups=None, class_names=None, y_proba=None,
+                      n_bootstrap: int = 0, bootstrap_seed: int = 42, ci_level: float = 0.95):
     """Generate full robustness evaluation report.
 
     Extended with Fitzpatrick fairness, equalized odds, and domain breakdowns.
+    With n_bootstrap > 0, report["confidence_intervals"] holds percentile
+    bootstrap [lower, upper] bounds for every metric (see bootstrap.py).
     """
     y_true = np.asarray(y_true)
     y_pred = np.asarray(y_pred)
@@ -258,9 +431,9 @@ def robustness_report(y_true, y_pred, groups=None, class_names=None, y_proba=Non
             pass
 
     if groups is not None:
-        for group_name, group_values in groups.items():
-            group_values = np.asarray(group_values)
-            per_group = compute_per_group_metrics(y_true, y_pred, y_proba, group_values)
+        # All axes in one vectorized pass
+        per_axis = compute_group_metrics_by_axis(y_true, y_pred, y_proba, groups)
+        for group_name, per_group in per_axis.items():
             report[f"per_{group_name}"] = per_group
 
             # Fairness gap
@@ -271,4 +444,13 @@ def robustness_report(y_true, y_pred, groups=None, class_names=None, y_proba=Non
             eq_odds = compute_equalized_odds_gap(per_group)
             report[f"{group_name}_equalized_odds"] = eq_odds
 
+    if n_bootstrap > 0:
+        from src.evaluation.bootstrap import bootstrap_confidence_intervals
+        cis = bootstrap_confidence_intervals(
+            y_true, y_pred, y_proba=y_proba, groups=groups,
+            n_bootstrap=n_bootstrap, seed=bootstrap_seed, ci_level=ci_level,
+        )
+        if cis is not None:
+            report["confidence_intervals"] = cis
+
     return report
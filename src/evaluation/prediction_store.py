@@ -0,0 +1,207 @@
+"""Per-sample prediction store shared by training, evaluation and analysis.
+
+Training writes every model's predictions for every sample once; evaluation,
+fairness slicing and threshold analysis read them back instead of reloading
+pickles and re-running predict / predict_proba on the same embeddings.
+
+Columns are plain .npy files, memory-mapped on read:
+
+    results/cache/predictions/
+        manifest.json               sample count, group names, per-model version
+        index/sample_id.npy         row in metadata.csv / embeddings.pt
+        index/split.npy             0 = train, 1 = test
+        index/label.npy             binary label
+        index/condition_label.npy   condition label (NaN when missing)
+        index/group_<axis>.npy      codes into manifest["groups"][axis]
+        <model>/pred.npy            predicted label
+        <model>/proba.npy           class probabilities (float32)
+        <model>/condition_proba.npy condition probabilities (multi-task heads)
+
+Each model entry records a version, the hash of the pickle it was computed
+from. Readers compare it with the pickle currently on disk and fall back to
+predicting when the model has been retrained since.
+"""
+
+import hashlib
+import json
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+SPLITS = ("train", "test")
+
+
+def model_version(path) -> str:
+    """Short content hash of a saved model file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def predict_columns(clf, X) -> dict:
+    """Run a classifier once (predict_all) and return its store columns."""
+    if hasattr(clf, "predict_all"):
+        return {k: v for k, v in clf.predict_all(X).items() if v is not None}
+    columns = {"pred": clf.predict(X)}
+    if hasattr(clf, "predict_proba"):
+        columns["proba"] = clf.predict_proba(X)
+    return columns
+
+
+class PredictionStore:
+    """Columnar per-sample predictions for every trained model."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        with open(self.root / "manifest.json") as f:
+            self.manifest = json.load(f)
+        self._columns = {}
+
+    @classmethod
+    def open(cls, root):
+        """Open an existing store, or None when there is none."""
+        return cls(root) if (Path(root) / "manifest.json").exists() else None
+
+    @classmethod
+    def create(cls, root, sample_ids, split, labels, groups: dict = None, condition_labels=None):
+        """Start a new store for one train/test split (drops any previous one).
+
+        Args:
+            root: store directory
+            sample_ids: row of each sample in metadata.csv / embeddings.pt
+            split: "train" / "test" per sample
+            labels: binary labels
+            groups: optional dict of axis -> group per sample (get_demographic_groups)
+            condition_labels: optional condition labels (NaN when missing)
+        """
+        root = Path(root)
+        if root.exists():
+            shutil.rmtree(root)
+        (root / "index").mkdir(parents=True)
+
+        split_codes = np.array([SPLITS.index(s) for s in split], dtype=np.uint8)
+        np.save(root / "index" / "sample_id.npy", np.asarray(sample_ids, dtype=np.int64))
+        np.save(root / "index" / "split.npy", split_codes)
+        np.save(root / "index" / "label.npy", np.asarray(labels, dtype=np.int64))
+        if condition_labels is not None:
+            np.save(root / "index" / "condition_label.npy", np.asarray(condition_labels, dtype=np.float64))
+
+        group_names = {}
+        for axis, values in (groups or {}).items():
+            names, codes = np.unique(np.asarray([str(v) for v in values]), return_inverse=True)
+            np.save(root / "index" / f"group_{axis}.npy", codes.astype(np.int32))
+            group_names[axis] = names.tolist()
+
+        manifest = {
+            "n_samples": int(len(split_codes)),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "groups": group_names,
+            "models": {},
+        }
+        _write_json(root / "manifest.json", manifest)
+        return cls(root)
+
+    @property
+    def n_samples(self) -> int:
+        return self.manifest["n_samples"]
+
+    def models(self):
+        return list(self.manifest["models"])
+
+    def write_model(self, name: str, columns: dict, version: str = None, task: str = "binary"):
+        """Store one model's predictions for all samples (replaces an older entry)."""
+        model_dir = self.root / name
+        if model_dir.exists():
+            shutil.rmtree(model_dir)
+        model_dir.mkdir(parents=True)
+
+        written = []
+        for column, values in columns.items():
+            if values is None:
+                continue
+            values = np.asarray(values)
+            if len(values) != self.n_samples:
+                raise ValueError(f"{name}/{column}: {len(values)} rows, store has {self.n_samples}")
+            if values.dtype.kind == "f":
+                values = values.astype(np.float32)
+            np.save(model_dir / f"{column}.npy", values)
+            written.append(column)
+
+        self.manifest["models"][name] = {
+            "version": version,
+            "task": task,
+            "columns": written,
+            "written": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        self._columns = {k: v for k, v in self._columns.items() if not k.startswith(f"{name}/")}
+        _write_json(self.root / "manifest.json", self.manifest)
+
+    def has(self, name: str, model_path=None) -> bool:
+        """True if the model is stored (and, given its pickle, still current)."""
+        entry = self.manifest["models"].get(name)
+        if entry is None:
+            return False
+        if model_path is None:
+            return True
+        return Path(model_path).exists() and entry["version"] == model_version(model_path)
+
+    def _column(self, relpath: str):
+        if relpath not in self._columns:
+            self._columns[relpath] = np.load(self.root / f"{relpath}.npy", mmap_mode="r")
+        return self._columns[relpath]
+
+    def mask(self, split: str = None):
+        """Boolean row mask for a split (all rows when split is None)."""
+        codes = self._column("index/split")
+        if split is None:
+            return np.ones(len(codes), dtype=bool)
+        return codes == SPLITS.index(split)
+
+    def index(self, split: str = None) -> dict:
+        """sample_id / label / condition_label for the rows of a split."""
+        mask = self.mask(split)
+        out = {"sample_id": self._column("index/sample_id")[mask], "label": self._column("index/label")[mask]}
+        if (self.root / "index" / "condition_label.npy").exists():
+            out["condition_label"] = self._column("index/condition_label")[mask]
+        return out
+
+    def groups(self, split: str = None) -> dict:
+        """Axis -> group name per sample, as get_demographic_groups returns it."""
+        mask = self.mask(split)
+        return {
+            axis: np.asarray(names, dtype=object)[self._column(f"index/group_{axis}")[mask]]
+            for axis, names in self.manifest["groups"].items()
+        }
+
+    def read(self, name: str, split: str = None) -> dict:
+        """Stored columns of one model for the rows of a split."""
+        if name not in self.manifest["models"]:
+            raise KeyError(f"No stored predictions for {name!r} (have: {self.models()})")
+        mask = self.mask(split)
+        return {c: self._column(f"{name}/{c}")[mask] for c in self.manifest["models"][name]["columns"]}
+
+
+def load_or_predict(name: str, model_path, X, store: PredictionStore = None, split: str = "test") -> dict:
+    """Stored predictions when current, else unpickle the model and predict on X.
+
+    X may be an array or a zero-argument callable returning one, so callers
+    only materialize embeddings when the store cannot answer.
+    """
+    import pickle
+
+    if store is not None and store.has(name, model_path):
+        return {**store.read(name, split), "source": "store"}
+    with open(model_path, "rb") as f:
+        clf = pickle.load(f)
+    return {**predict_columns(clf, X() if callable(X) else X), "source": "model"}
+
+
+def _write_json(path: Path, payload: dict):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2)
+    tmp.replace(path)
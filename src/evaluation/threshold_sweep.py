@@ -0,0 +1,206 @@
+"""Threshold sweep for the triage tiers (low_max, moderate_max).
+
+TriageSystem maps a malignancy probability p to
+  low       p < low_max
+  moderate  low_max <= p < moderate_max
+  high      p >= moderate_max
+
+For a candidate threshold t, the number of samples (and of malignant
+samples) below t in a group is a binary search into that group's sorted
+probabilities plus a cumulative sum of labels. Probabilities are sorted
+once per grouping axis. Every (low_max, moderate_max) pair is then scored
+from those counts without re-running the model or the evaluation:
+
+  - tier distribution (pct_low / pct_moderate / pct_high)
+  - sensitivity and specificity of the high tier, PPV of the high tier
+  - missed_in_low: share of malignant cases reassured as "low"
+  - per-axis gaps (e.g. Fitzpatrick, domain) in high-tier sensitivity
+    and specificity
+
+pareto_front keeps the pairs that no other pair beats on every objective.
+By default moderate_max trades high-tier sensitivity against the referral
+load (pct_high) and the subgroup gap. low_max is bounded by a budget on
+missed_in_low and otherwise maximizes reassurance (pct_low), so the front
+holds roughly one low_max per moderate_max.
+"""
+
+import numpy as np
+
+DEFAULT_OBJECTIVES = {
+    "sensitivity_high": "max",
+    "pct_high": "min",
+    "pct_low": "max",
+    "max_sensitivity_gap": "min",
+}
+
+
+def threshold_grid(step: float = 0.025, lo: float = 0.05, hi: float = 0.95):
+    """Evenly spaced candidate thresholds in [lo, hi]."""
+    return np.round(np.arange(lo, hi + step / 2, step), 6)
+
+
+def _counts_below(proba, y_true, codes, n_groups, thresholds):
+    """Per group and threshold: samples and positives with p < t.
+
+    Returns (n_below, pos_below) of shape (G, T), and n, pos of shape (G,).
+    """
+    order = np.lexsort((proba, codes))
+    p_sorted, y_sorted = proba[order], y_true[order]
+    bounds = np.searchsorted(codes[order], np.arange(n_groups + 1))
+    cum_pos = np.r_[0, np.cumsum(y_sorted)]
+
+    n_below = np.empty((n_groups, len(thresholds)), dtype=np.int64)
+    for g in range(n_groups):
+        lo, hi = bounds[g], bounds[g + 1]
+        n_below[g] = np.searchsorted(p_sorted[lo:hi], thresholds, side="left")
+    ends = bounds[:-1, None] + n_below
+    pos_below = cum_pos[ends] - cum_pos[bounds[:-1, None]]
+    n = np.diff(bounds)
+    pos = cum_pos[bounds[1:]] - cum_pos[bounds[:-1]]
+    return n_below, pos_below, n, pos
+
+
+def sweep_triage_thresholds(
+    y_true,
+    y_proba,
+    groups: dict = None,
+    low_grid=None,
+    high_grid=None,
+    gap_axes=("fitzpatrick", "domain"),
+    min_group_size: int = 5,
+    extra_pairs=(),
+):
+    """Score every (low_max, moderate_max) pair with low_max < moderate_max.
+
+    Args:
+        y_true: binary labels (1 = malignant)
+        y_proba: malignancy probabilities (N,) or (N, 2)
+        groups: dict of axis -> group per sample (get_demographic_groups output)
+        low_grid, high_grid: candidate thresholds (default: threshold_grid())
+        gap_axes: axes to compute per-group gaps for (skipped if missing)
+        min_group_size: groups need this many malignant (for sensitivity) or
+            benign (for specificity) cases to enter a gap
+        extra_pairs: (low_max, moderate_max) pairs to include, e.g. the config's
+
+    Returns:
+        list of row dicts, one per threshold pair
+    """
+    y_true = np.asarray(y_true).astype(np.int64)
+    proba = np.asarray(y_proba, dtype=np.float64)
+    if proba.ndim == 2:
+        proba = proba[:, 1]
+    low_grid = threshold_grid() if low_grid is None else np.asarray(low_grid, dtype=np.float64)
+    high_grid = threshold_grid() if high_grid is None else np.asarray(high_grid, dtype=np.float64)
+
+    extra_pairs = [(float(lo), float(hi)) for lo, hi in extra_pairs]
+    thresholds = np.unique(np.r_[low_grid, high_grid, [v for pair in extra_pairs for v in pair]])
+    pairs = {(float(lo), float(hi)) for lo in low_grid for hi in high_grid if lo < hi}
+    pairs.update(p for p in extra_pairs if p[0] < p[1])
+    pairs = sorted(pairs)
+    li = np.searchsorted(thresholds, [p[0] for p in pairs])
+    mi = np.searchsorted(thresholds, [p[1] for p in pairs])
+
+    # Overall counts (single group)
+    n_below, pos_below, n, pos = _counts_below(proba, y_true, np.zeros(len(proba), dtype=np.int64), 1, thresholds)
+    n, pos = int(n[0]), int(pos[0])
+    neg = n - pos
+    nb_l, nb_m = n_below[0, li], n_below[0, mi]
+    pb_l, pb_m = pos_below[0, li], pos_below[0, mi]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        high_pos = pos - pb_m
+        high_n = n - nb_m
+        columns = {
+            "pct_low": nb_l / n,
+            "pct_moderate": (nb_m - nb_l) / n,
+            "pct_high": high_n / n,
+            "sensitivity_high": high_pos / pos if pos else np.full(len(pairs), np.nan),
+            "specificity_high": (nb_m - pb_m) / neg if neg else np.full(len(pairs), np.nan),
+            "ppv_high": np.where(high_n > 0, high_pos / np.maximum(high_n, 1), np.nan),
+            "missed_in_low": pb_l / pos if pos else np.full(len(pairs), np.nan),
+        }
+
+    # Per-axis gaps from one sort per axis
+    sens_gaps = []
+    for axis in gap_axes:
+        if not groups or axis not in groups:
+            continue
+        names, codes = np.unique(np.asarray([str(g) for g in groups[axis]]), return_inverse=True)
+        g_nb, g_pb, g_n, g_pos = _counts_below(proba, y_true, codes, len(names), thresholds)
+        g_neg = g_n - g_pos
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sens = (g_pos[:, None] - g_pb[:, mi]) / g_pos[:, None]
+            spec = (g_nb[:, mi] - g_pb[:, mi]) / g_neg[:, None]
+        columns[f"{axis}_sensitivity_gap"] = _gap(sens[g_pos >= min_group_size])
+        columns[f"{axis}_specificity_gap"] = _gap(spec[g_neg >= min_group_size])
+        sens_gaps.append(columns[f"{axis}_sensitivity_gap"])
+    columns["max_sensitivity_gap"] = np.max(sens_gaps, axis=0) if sens_gaps else np.zeros(len(pairs))
+
+    rows = []
+    for k, (lo, hi) in enumerate(pairs):
+        row = {"low_max": lo, "moderate_max": hi}
+        row.update({name: float(values[k]) for name, values in columns.items()})
+        rows.append(row)
+    return rows
+
+
+def _gap(values):
+    """max - min across groups (rows) per pair (column); 0 with fewer than 2 groups."""
+    if values.shape[0] < 2:
+        return np.zeros(values.shape[1])
+    return np.nanmax(values, axis=0) - np.nanmin(values, axis=0)
+
+
+def pareto_front(rows, objectives: dict = None, max_missed_in_low: float = None,
+                 min_sensitivity_high: float = None):
+    """Rows not dominated on the objectives ({column: "max" | "min"}).
+
+    Rows outside the optional limits are dropped first. NaN counts as the
+    worst value. Returned in order of the first objective.
+    """
+    objectives = objectives or DEFAULT_OBJECTIVES
+    if max_missed_in_low is not None:
+        rows = [r for r in rows if r["missed_in_low"] <= max_missed_in_low]
+    if min_sensitivity_high is not None:
+        rows = [r for r in rows if r["sensitivity_high"] >= min_sensitivity_high]
+    if not rows:
+        return []
+    # Orient every objective so that larger is better
+    values = np.array([
+        [(r[col] if col in r else np.nan) * (1 if sense == "max" else -1) for col, sense in objectives.items()]
+        for r in rows
+    ], dtype=np.float64)
+    values = np.where(np.isnan(values), -np.inf, values)
+
+    geq = (values[:, None, :] >= values[None, :, :]).all(axis=2)
+    gt = (values[:, None, :] > values[None, :, :]).any(axis=2)
+    dominated = (geq & gt).any(axis=0)  # some row i dominates row j
+
+    front = [rows[j] for j in np.flatnonzero(~dominated)]
+    first, sense = next(iter(objectives.items()))
+    front.sort(key=lambda r: r[first], reverse=(sense == "max"))
+    return front
+
+
+def format_pareto_table(front, current: dict = None, axes=("fitzpatrick", "domain")):
+    """Plain-text table of a Pareto front (and the current config row)."""
+    gap_cols = [f"{a}_sensitivity_gap" for a in axes if front and f"{a}_sensitivity_gap" in front[0]]
+    header = (f"{'low_max':>8} {'mod_max':>8} {'%low':>6} {'%mod':>6} {'%high':>6} "
+              f"{'sens_hi':>8} {'spec_hi':>8} {'ppv_hi':>7} {'miss_low':>8}")
+    header += "".join(f" {c.replace('_sensitivity_gap', ' gap'):>14}" for c in gap_cols)
+    lines = [header, "-" * len(header)]
+
+    def fmt(row, mark=""):
+        line = (f"{row['low_max']:>8.3f} {row['moderate_max']:>8.3f} {100 * row['pct_low']:>6.1f} "
+                f"{100 * row['pct_moderate']:>6.1f} {100 * row['pct_high']:>6.1f} "
+                f"{row['sensitivity_high']:>8.3f} {row['specificity_high']:>8.3f} "
+                f"{row['ppv_high']:>7.3f} {row['missed_in_low']:>8.3f}")
+        line += "".join(f" {row[c]:>14.3f}" for c in gap_cols)
+        return line + mark
+
+    for row in front:
+        lines.append(fmt(row, "  <- current" if row is current or row == current else ""))
+    if current is not None and current not in front:
+        lines.append("")
+        lines.append(fmt(current, "  <- current (not on the Pareto front)"))
+    return "\n".join(lines)
@@ -1,7 +1,7 @@
 """Naive baseline models for comparison.
 
 Required for three-model comparison: naive baseline, classical ML, deep learning.
-Both implement the same fit/predict/predict_proba/score interface as SklearnClassifier.
+Both implement the same fit/predict/predict_proba/predict_all/score interface as SklearnClassifier.
 """
 
 # Development notes:
@@ -38,6 +38,9 @@ class MajorityClassBaseline:
         proba[:, self.majority_class] = 1.0
         return proba
 
+    def predict_all(self, embeddings):
+        return {"pred": self.predict(embeddings), "proba": self.predict_proba(embeddings)}
+
     def score(self, embeddings, labels):
         labels = np.asarray(labels)
         preds = self.predict(embeddings)
@@ -70,6 +73,9 @@ class RandomWeightedBaseline:
         proba = np.tile(self.class_priors, (n, 1))
         return proba
 
+    def predict_all(self, embeddings):
+        return {"pred": self.predict(embeddings), "proba": self.predict_proba(embeddings)}
+
     def score(self, embeddings, labels):
         labels = np.asarray(labels)
         preds = self.predict(embeddings)
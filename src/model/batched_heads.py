@@ -0,0 +1,372 @@
+"""Vectorized training of many DeepClassificationHead configurations at once.
+
+Seed ensembles and hyperparameter grids over cached embeddings used to call
+DeepClassifier.fit once per configuration. BatchedHeadTrainer stacks M heads
+(different seeds, hidden sizes, dropout and learning rates) into batched
+parameter tensors and trains them together over the same mini-batches:
+
+  - both layers are one batched matmul each: (B, D) @ (M, D, H) and
+    (M, B, H) @ (M, H, C)
+  - BatchNorm, ReLU and dropout run on a (M, B, H) tensor with per-head stats
+  - AdamW (the fused kernel) runs per head on its contiguous parameter slices,
+    with that head's learning rate; heads that stopped early are skipped
+  - early stopping is tracked per head; finished heads stop updating
+
+The matmuls are M times the FLOPs of one head, so a step costs about M times
+a single-head step on a saturated CPU; the saving over fitting the configs
+one by one is the shared batching, validation and Python overhead (and, on a
+GPU, filling the device). The optimizer is applied per head because one
+elementwise AdamW over the stacked (M, D, H) tensors sweeps them ~10 times
+out of cache and cost more than the matmuls themselves.
+
+Heads with a smaller hidden size are zero-padded to the largest one (and cost
+as much as it) and their padded units masked out, so each trained head can be exported as a regular
+DeepClassifier (see to_classifiers) with identical predictions.
+
+Usage:
+    configs = [{"seed": s, "hidden_dim": h, "dropout": 0.3, "lr": 1e-3}
+               for s in range(5) for h in (128, 256)]
+    classifiers = fit_head_grid(X_train, y_train, configs, sample_weight=w)
+"""
+
+import math
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from src.model.deep_classifier import DeepClassifier, _class_weights
+
+# DeepClassifier defaults, used for any key a config leaves out
+DEFAULT_HEAD_CONFIG = {
+    "seed": 0,
+    "hidden_dim": 256,
+    "dropout": 0.3,
+    "lr": 1e-3,
+}
+
+_BN_EPS = 1e-5
+_BN_MOMENTUM = 0.1
+_ADAM_BETAS = (0.9, 0.999)
+_ADAM_EPS = 1e-8
+_WEIGHT_DECAY = 1e-4
+
+
+class BatchedHeads(nn.Module):
+    """M independent 2-layer MLP heads stored as stacked parameter tensors.
+
+    Matches DeepClassificationHead per head:
+    Linear -> BatchNorm1d -> ReLU -> Dropout -> Linear. Every parameter and
+    buffer is indexed by head along dim 0.
+    """
+
+    def __init__(self, embedding_dim, hidden_dims, dropouts, seeds, n_classes=2):
+        super().__init__()
+        self.embedding_dim = embedding_dim
+        self.hidden_dims = list(hidden_dims)
+        self.n_heads = len(self.hidden_dims)
+        self.n_classes = n_classes
+        M, D, H, C = self.n_heads, embedding_dim, max(self.hidden_dims), n_classes
+
+        self.w1 = nn.Parameter(torch.zeros(M, D, H))
+        self.b1 = nn.Parameter(torch.zeros(M, H))
+        self.gamma = nn.Parameter(torch.ones(M, H))
+        self.beta = nn.Parameter(torch.zeros(M, H))
+        self.w2 = nn.Parameter(torch.zeros(M, H, C))
+        self.b2 = nn.Parameter(torch.zeros(M, C))
+        self.register_buffer("running_mean", torch.zeros(M, H))
+        self.register_buffer("running_var", torch.ones(M, H))
+        self.register_buffer("num_batches_tracked", torch.zeros(M, dtype=torch.long))
+        self.register_buffer("dropout", torch.tensor(list(dropouts), dtype=torch.float32))
+
+        mask = torch.zeros(M, H)
+        for m, h in enumerate(self.hidden_dims):
+            mask[m, :h] = 1.0
+        self.register_buffer("hidden_mask", mask)
+
+        # Initialize each head exactly as nn.Linear would under its own seed
+        with torch.no_grad():
+            for m, (h, seed) in enumerate(zip(self.hidden_dims, seeds)):
+                with torch.random.fork_rng(devices=[]):
+                    torch.manual_seed(seed)
+                    fc1 = nn.Linear(D, h)
+                    fc2 = nn.Linear(h, C)
+                self.w1[m, :, :h] = fc1.weight.T
+                self.b1[m, :h] = fc1.bias
+                self.w2[m, :h, :] = fc2.weight.T
+                self.b2[m] = fc2.bias
+
+    def forward(self, x):
+        """x: (B, D) shared input -> logits (M, B, C)."""
+        B = x.shape[0]
+        h = torch.matmul(x, self.w1) + self.b1[:, None, :]
+
+        if self.training:
+            mean = h.mean(dim=1)
+            var = h.var(dim=1, unbiased=False)
+            with torch.no_grad():
+                unbiased = var * (B / max(B - 1, 1))
+                self.running_mean.mul_(1 - _BN_MOMENTUM).add_(_BN_MOMENTUM * mean)
+                self.running_var.mul_(1 - _BN_MOMENTUM).add_(_BN_MOMENTUM * unbiased)
+                self.num_batches_tracked.add_(1)
+        else:
+            mean, var = self.running_mean, self.running_var
+
+        h = (h - mean[:, None, :]) / torch.sqrt(var[:, None, :] + _BN_EPS)
+        h = h * self.gamma[:, None, :] + self.beta[:, None, :]
+        h = F.relu(h)
+
+        if self.training:
+            p = self.dropout[:, None, None]
+            keep = (torch.rand_like(h) >= p).to(h.dtype)
+            h = h * keep / (1 - p)
+
+        h = h * self.hidden_mask[:, None, :]
+        return torch.bmm(h, self.w2) + self.b2[:, None, :]
+
+
+class _BatchedAdamW:
+    """AdamW over stacked parameters with a per-head learning rate.
+
+    Each step runs the fused AdamW kernel once per active head, over that
+    head's slices of every parameter (contiguous, since dim 0 is the head),
+    so a head's update stays in cache like a standalone DeepClassifier's.
+    Heads that stopped early are skipped and their weights stay frozen.
+    """
+
+    def __init__(self, params, lr):
+        self.params = list(params)
+        self.base_lr = lr.tolist()
+        self.lr = list(self.base_lr)
+        self.active = torch.ones(len(self.base_lr), dtype=torch.bool, device=self.params[0].device)
+        self.exp_avg = [torch.zeros_like(p) for p in self.params]
+        self.exp_avg_sq = [torch.zeros_like(p) for p in self.params]
+        # Step counters per head and parameter (adamw() increments each one)
+        self.steps = [[torch.zeros((), device=p.device) for p in self.params] for _ in self.base_lr]
+
+    def zero_grad(self):
+        for p in self.params:
+            p.grad = None
+
+    def set_epoch(self, epoch, total_epochs):
+        """Cosine annealing to 0 over total_epochs (CosineAnnealingLR, eta_min=0)."""
+        factor = (1 + math.cos(math.pi * epoch / total_epochs)) / 2
+        self.lr = [lr * factor for lr in self.base_lr]
+
+    @torch.no_grad()
+    def step(self):
+        from torch.optim.adamw import adamw
+
+        for head in torch.nonzero(self.active).flatten().tolist():
+            adamw(
+                [p[head] for p in self.params], [p.grad[head] for p in self.params],
+                [m[head] for m in self.exp_avg], [v[head] for v in self.exp_avg_sq], [],
+                self.steps[head], fused=True, amsgrad=False,
+                beta1=_ADAM_BETAS[0], beta2=_ADAM_BETAS[1], lr=self.lr[head],
+                weight_decay=_WEIGHT_DECAY, eps=_ADAM_EPS, maximize=False,
+            )
+
+
+class BatchedHeadTrainer:
+    """Train M DeepClassificationHead configurations simultaneously.
+
+    Mirrors DeepClassifier.fit (class-weighted CE, optional sample weights,
+    AdamW + cosine schedule, 15% validation split when none is given, early
+    stopping with best-state restore), but each of those steps runs once for
+    all heads instead of once per configuration.
+    """
+
+    def __init__(
+        self,
+        configs,
+        embedding_dim: int = 1152,
+        n_classes: int = 2,
+        epochs: int = 50,
+        batch_size: int = 64,
+        patience: int = 8,
+        split_seed: int = 0,
+        device: str = None,
+    ):
+        self.configs = [{**DEFAULT_HEAD_CONFIG, **c} for c in configs]
+        if not self.configs:
+            raise ValueError("BatchedHeadTrainer needs at least one configuration")
+        self.embedding_dim = embedding_dim
+        self.n_classes = n_classes
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.patience = patience
+        self.split_seed = split_seed
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = None
+        self.training_history = [[] for _ in self.configs]
+        self.best_val_loss = None
+
+    def _build_model(self):
+        self.model = BatchedHeads(
+            self.embedding_dim,
+            hidden_dims=[c["hidden_dim"] for c in self.configs],
+            dropouts=[c["dropout"] for c in self.configs],
+            seeds=[c["seed"] for c in self.configs],
+            n_classes=self.n_classes,
+        ).to(self.device)
+
+    def fit(self, embeddings, labels, sample_weight=None, val_embeddings=None, val_labels=None):
+        """Train all heads on pre-extracted embeddings (same arguments as DeepClassifier.fit)."""
+        X = torch.as_tensor(np.asarray(embeddings), dtype=torch.float32)
+        y = torch.as_tensor(np.asarray(labels), dtype=torch.long)
+        sw = None if sample_weight is None else torch.as_tensor(np.asarray(sample_weight), dtype=torch.float32)
+
+        self._build_model()
+        M = self.model.n_heads
+
+        ce_weight = torch.tensor(_class_weights(labels, self.n_classes), dtype=torch.float32).to(self.device)
+
+        gen = torch.Generator().manual_seed(self.split_seed)
+        if val_embeddings is not None and val_labels is not None:
+            X_val = torch.as_tensor(np.asarray(val_embeddings), dtype=torch.float32).to(self.device)
+            y_val = torch.as_tensor(np.asarray(val_labels), dtype=torch.long).to(self.device)
+            X_train, y_train, sw_train = X, y, sw
+        else:
+            perm = torch.randperm(len(X), generator=gen)
+            val_size = max(1, int(0.15 * len(X)))
+            val_idx, train_idx = perm[:val_size], perm[val_size:]
+            X_val, y_val = X[val_idx].to(self.device), y[val_idx].to(self.device)
+            X_train, y_train = X[train_idx], y[train_idx]
+            sw_train = sw[train_idx] if sw is not None else None
+
+        X_train, y_train = X_train.to(self.device), y_train.to(self.device)
+        if sw_train is not None:
+            sw_train = sw_train.to(self.device)
+        n_train = len(X_train)
+
+        lr = torch.tensor([c["lr"] for c in self.configs], dtype=torch.float32, device=self.device)
+        optimizer = _BatchedAdamW(self.model.parameters(), lr)
+
+        best_val_loss = torch.full((M,), float("inf"), device=self.device)
+        patience_counter = torch.zeros(M, dtype=torch.long, device=self.device)
+        best_state = {k: v.detach().clone() for k, v in self.model.state_dict().items()}
+        self.training_history = [[] for _ in range(M)]
+
+        for epoch in range(self.epochs):
+            optimizer.set_epoch(epoch, self.epochs)
+            self.model.train()
+            epoch_loss = torch.zeros(M, device=self.device)
+
+            order = torch.randperm(n_train, generator=gen).to(self.device)
+            for start in range(0, n_train, self.batch_size):
+                idx = order[start:start + self.batch_size]
+                bx, by = X_train[idx], y_train[idx]
+                B = len(idx)
+
+                optimizer.zero_grad()
+                logits = self.model(bx)  # (M, B, C)
+                loss = F.cross_entropy(
+                    logits.reshape(M * B, -1), by.repeat(M), weight=ce_weight, reduction="none"
+                ).reshape(M, B)
+                if sw_train is not None:
+                    loss = loss * sw_train[idx][None, :]
+                per_head = loss.mean(dim=1)
+                (per_head * optimizer.active).sum().backward()
+                optimizer.step()
+                epoch_loss += per_head.detach() * B
+
+            # Validation for every head in one forward
+            self.model.eval()
+            with torch.no_grad():
+                val_logits = self.model(X_val)
+                Mv, Bv, C = val_logits.shape
+                val_loss = F.cross_entropy(
+                    val_logits.reshape(Mv * Bv, C), y_val.repeat(Mv), reduction="none"
+                ).reshape(Mv, Bv).mean(dim=1)
+                val_acc = (val_logits.argmax(2) == y_val[None, :]).float().mean(dim=1)
+
+            active = optimizer.active.clone()
+            for m in torch.nonzero(active).flatten().tolist():
+                self.training_history[m].append({
+                    "epoch": epoch,
+                    "train_loss": float(epoch_loss[m]) / n_train,
+                    "val_loss": float(val_loss[m]),
+                    "val_acc": float(val_acc[m]),
+                })
+
+            # Per-head early stopping: snapshot improved heads, retire stale ones
+            improved = active & (val_loss < best_val_loss)
+            best_val_loss = torch.where(improved, val_loss, best_val_loss)
+            patience_counter = torch.where(improved, torch.zeros_like(patience_counter), patience_counter + 1)
+            with torch.no_grad():
+                for k, v in self.model.state_dict().items():
+                    if k not in ("dropout", "hidden_mask"):
+                        best_state[k][improved] = v[improved]
+            optimizer.active = active & (patience_counter < self.patience)
+            if not optimizer.active.any():
+                break
+
+        self.model.load_state_dict(best_state)
+        self.model.eval()
+        self.best_val_loss = best_val_loss.cpu().numpy()
+        return self
+
+    def predict_proba(self, embeddings):
+        """Class probabilities for every head: (M, N, n_classes)."""
+        X = torch.as_tensor(np.asarray(embeddings), dtype=torch.float32).to(self.device)
+        self.model.eval()
+        with torch.no_grad():
+            return torch.softmax(self.model(X), dim=2).cpu().numpy()
+
+    def to_classifiers(self):
+        """Export each trained head as a standalone DeepClassifier."""
+        classifiers = []
+        state = {k: v.detach().cpu() for k, v in self.model.state_dict().items()}
+        for m, cfg in enumerate(self.configs):
+            h = cfg["hidden_dim"]
+            clf = DeepClassifier(
+                embedding_dim=self.embedding_dim,
+                hidden_dim=h,
+                n_classes=self.n_classes,
+                dropout=cfg["dropout"],
+                lr=cfg["lr"],
+                epochs=self.epochs,
+                batch_size=self.batch_size,
+                patience=self.patience,
+                device=self.device,
+            )
+            clf._build_model()
+            clf.model.load_state_dict({
+                "net.0.weight": state["w1"][m, :, :h].T.contiguous(),
+                "net.0.bias": state["b1"][m, :h],
+                "net.1.weight": state["gamma"][m, :h],
+                "net.1.bias": state["beta"][m, :h],
+                "net.1.running_mean": state["running_mean"][m, :h],
+                "net.1.running_var": state["running_var"][m, :h],
+                "net.1.num_batches_tracked": state["num_batches_tracked"][m],
+                "net.4.weight": state["w2"][m, :h, :].T.contiguous(),
+                "net.4.bias": state["b2"][m],
+            })
+            clf.model.to(clf.device)
+            clf.model.eval()
+            clf.training_history = self.training_history[m]
+            classifiers.append(clf)
+        return classifiers
+
+
+def fit_head_grid(embeddings, labels, configs, sample_weight=None, val_embeddings=None,
+                  val_labels=None, **trainer_kwargs):
+    """Train every configuration in one batched run and return a DeepClassifier per config.
+
+    Args:
+        embeddings: (N, D) array or tensor
+        labels: (N,) labels
+        configs: list of dicts with any of seed, hidden_dim, dropout, lr
+        sample_weight: optional per-sample weights (N,)
+        val_embeddings, val_labels: optional explicit validation set
+        **trainer_kwargs: n_classes, epochs, batch_size, patience, split_seed, device
+
+    Returns:
+        List of fitted DeepClassifier, in the order of configs
+    """
+    embedding_dim = np.asarray(embeddings).shape[1]
+    trainer = BatchedHeadTrainer(configs, embedding_dim=embedding_dim, **trainer_kwargs)
+    trainer.fit(embeddings, labels, sample_weight=sample_weight,
+                val_embeddings=val_embeddings, val_labels=val_labels)
+    return trainer.to_classifiers()
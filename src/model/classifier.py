@@ -7,16 +7,19 @@
 
 import torch
 import numpy as np
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.neural_network import MLPClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 
 
-def _make_xgboost_clf(n_classes: int = 2):
-    """Create an XGBoost classifier with tuned hyperparameters for SigLIP embeddings."""
+def _make_xgboost_clf(n_classes: int = 2, **overrides):
+    """Create an XGBoost classifier with tuned hyperparameters for SigLIP embeddings.
+
+    Keyword overrides replace the defaults (used by the hyperparameter sweep).
+    """
     from xgboost import XGBClassifier
-    return XGBClassifier(
+    params = dict(
         n_estimators=500,
         max_depth=6,
         learning_rate=0.05,
@@ -32,18 +35,63 @@ def _make_xgboost_clf(n_classes: int = 2):
         random_state=42,
         n_jobs=-1,
     )
+    params.update(overrides)
+    return XGBClassifier(**params)
 
 
 class SklearnClassifier:
-    """Fast, lightweight classifier using sklearn (or XGBoost). Recommended for hackathons."""
-
-    def __init__(self, classifier_type: str = "logistic", n_classes: int = 2):
-        if classifier_type == "logistic":
-            clf = LogisticRegression(max_iter=1000)
+    """Fast, lightweight classifier using sklearn (or XGBoost). Recommended for hackathons.
+
+    With incremental=True, fit streams embeddings in chunks (from arrays, .npy/.pt
+    files or a list of shards) instead of needing the full matrix in RAM; see
+    src/model/incremental.py. Logistic regression becomes an SGD log-loss model
+    and the MLP trains with partial_fit. The fitted object predicts the same way.
+    """
+
+    def __init__(
+        self,
+        classifier_type: str = "logistic",
+        n_classes: int = 2,
+        params: dict = None,
+        incremental: bool = False,
+        chunk_size: int = 8192,
+        epochs: int = 5,
+        cache_dir: str = None,
+    ):
+        """
+        Args:
+            classifier_type: "logistic", "mlp", or "xgboost"
+            n_classes: number of target classes
+            params: optional hyperparameter overrides for the underlying estimator
+            incremental: train out-of-core from embedding chunks
+            chunk_size: rows per chunk in incremental mode
+            epochs: passes over the data for SGD/MLP in incremental mode
+            cache_dir: XGBoost external-memory cache (incremental mode only)
+        """
+        params = params or {}
+        self.classifier_type = classifier_type
+        self.n_classes = n_classes
+        self.incremental = incremental
+        self.chunk_size = chunk_size
+        self.epochs = epochs
+        self.cache_dir = cache_dir
+
+        if classifier_type == "logistic" and incremental:
+            # Averaged SGD with a small constant step is close to LogisticRegression in a few epochs
+            # ("adaptive" would never decay under partial_fit: each call is a single epoch)
+            clf = SGDClassifier(**{
+                "loss": "log_loss", "alpha": 1e-4, "learning_rate": "constant", "eta0": 0.01,
+                "average": True, "random_state": 42, **params,
+            })
+        elif classifier_type == "logistic":
+            clf = LogisticRegression(**{"max_iter": 1000, **params})
+        elif classifier_type == "mlp" and incremental:
+            # partial_fit has no internal validation split, so no early stopping
+            clf = MLPClassifier(**{"hidden_layer_sizes": (256,), "random_state": 42, **params, "early_stopping": False})
         elif classifier_type == "mlp":
-            clf = MLPClassifier(hidden_layer_sizes=(256,), max_iter=500, early_stopping=True)
+            clf = MLPClassifier(**{"hidden_layer_sizes": (256,), "max_iter": 500, "early_stopping": True, **params})
         elif classifier_type == "xgboost":
-            clf = _make_xgboost_clf(n_classes=n_classes)
+            clf = _make_xgboost_clf(n_classes=n_classes, **params)
         else:
             raise ValueError(f"Unknown classifier type: {classifier_type}")
 
@@ -56,10 +104,15 @@ class SklearnClassifier:
         """Train on pre-extracted embeddings.
 
         Args:
-            embeddings: (N, D) array or tensor
+            embeddings: (N, D) array or tensor; in incremental mode also a
+                .npy/.pt path, a list of arrays/paths (shards) or an
+                EmbeddingChunks view (e.g. a split's rows of a cache file)
             labels: (N,) array
             sample_weight: optional (N,) per-sample weights for domain balancing
         """
+        if getattr(self, "incremental", False):
+            return self._fit_incremental(embeddings, labels, sample_weight)
+
         X = embeddings.numpy() if isinstance(embeddings, torch.Tensor) else embeddings
         fit_params = {}
         if sample_weight is not None:
@@ -67,6 +120,34 @@ class SklearnClassifier:
         self.pipeline.fit(X, labels, **fit_params)
         return self
 
+    def _fit_incremental(self, embeddings, labels, sample_weight=None):
+        """Out-of-core fit: streamed scaler pass, then partial_fit or XGBoost iterator."""
+        from src.model.incremental import EmbeddingChunks, fit_partial, fit_scaler, fit_xgboost
+
+        if isinstance(embeddings, EmbeddingChunks):
+            chunks = embeddings
+        else:
+            chunks = EmbeddingChunks(embeddings, chunk_size=self.chunk_size)
+        labels = np.asarray(labels)
+        if len(labels) != len(chunks):
+            raise ValueError(f"Got {len(labels)} labels for {len(chunks)} embeddings")
+        weights = np.asarray(sample_weight, dtype=np.float32) if sample_weight is not None else None
+
+        print(f"    Incremental fit: {len(chunks)} samples in {len(chunks.chunk_bounds())} chunks")
+        scaler = fit_scaler(chunks)
+        clf = self.pipeline.named_steps["classifier"]
+        if self.classifier_type == "xgboost":
+            clf = fit_xgboost(clf, chunks, scaler, labels, weights,
+                              n_classes=self.n_classes, cache_dir=self.cache_dir)
+        else:
+            clf = fit_partial(clf, chunks, scaler, labels, weights, epochs=self.epochs)
+
+        self.pipeline = Pipeline([
+            ("scaler", scaler),
+            ("classifier", clf),
+        ])
+        return self
+
     def predict(self, embeddings):
         """Predict class labels."""
         X = embeddings.numpy() if isinstance(embeddings, torch.Tensor) else embeddings
@@ -77,6 +158,16 @@ class SklearnClassifier:
         X = embeddings.numpy() if isinstance(embeddings, torch.Tensor) else embeddings
         return self.pipeline.predict_proba(X)
 
+    def predict_all(self, embeddings):
+        """Labels and probabilities from one scaler + classifier pass.
+
+        Returns:
+            dict with "pred" (N,) and "proba" (N, C)
+        """
+        X = embeddings.numpy() if isinstance(embeddings, torch.Tensor) else embeddings
+        proba = self.pipeline.predict_proba(X)
+        return {"pred": self.pipeline.classes_[proba.argmax(1)], "proba": proba}
+
     def predict_triage(self, embeddings, triage_system):
         """Predict with triage assessment.
 
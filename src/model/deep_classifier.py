@@ -6,7 +6,13 @@ Two modes:
   2. End-to-end: Unfreezes last N layers of SigLIP backbone and fine-tunes
      jointly with the classification head. Requires raw images, GPU recommended.
 
-Both modes implement the same fit/predict/predict_proba/score interface.
+Both modes implement the same fit/predict/predict_proba/predict_all/score
+interface; predict_all returns labels, probabilities (and for end-to-end
+models the backbone embeddings) from a single forward pass.
+
+Either mode can also train a multi-task head that predicts malignancy and the
+10-class Condition (src/data/taxonomy.py) from the same embedding, so serving
+needs one forward instead of a separate condition model.
 """
 
 # Development notes:
@@ -20,6 +26,8 @@ import torch.nn as nn
 from pathlib import Path
 from torch.utils.data import DataLoader, TensorDataset
 
+from src.utils.telemetry import stage
+
 
 class DeepClassificationHead(nn.Module):
     """2-layer MLP classification head: embedding_dim -> hidden -> n_classes."""
@@ -38,18 +46,133 @@ class DeepClassificationHead(nn.Module):
         return self.net(x)
 
 
+class MultiTaskHead(nn.Module):
+    """Shared MLP trunk with two outputs: binary malignancy and condition logits.
+
+    The trunk mirrors DeepClassificationHead (Linear -> BatchNorm -> ReLU -> Dropout),
+    so a multi-task head costs one extra Linear layer over the binary head.
+    """
+
+    def __init__(self, embedding_dim=1152, hidden_dim=256, n_classes=2, n_conditions=10, dropout=0.3):
+        super().__init__()
+        self.trunk = nn.Sequential(
+            nn.Linear(embedding_dim, hidden_dim),
+            nn.BatchNorm1d(hidden_dim),
+            nn.ReLU(),
+            nn.Dropout(dropout),
+        )
+        self.binary = nn.Linear(hidden_dim, n_classes)
+        self.condition = nn.Linear(hidden_dim, n_conditions)
+
+    def forward(self, x):
+        h = self.trunk(x)
+        return self.binary(h), self.condition(h)
+
+
+def _split_outputs(outputs):
+    """Return (binary_logits, condition_logits or None) from a head's output."""
+    if isinstance(outputs, tuple):
+        return outputs
+    return outputs, None
+
+
+def _class_weights(labels, n_classes):
+    """Inverse-frequency class weights normalized to sum to n_classes."""
+    class_counts = np.bincount(np.asarray(labels), minlength=n_classes)
+    class_weights = 1.0 / (class_counts + 1e-6)
+    return class_weights / class_weights.sum() * n_classes
+
+
+def _condition_targets(condition_labels, n):
+    """Condition labels as a long tensor with missing entries (NaN/negative) set to -100.
+
+    -100 is CrossEntropyLoss's default ignore_index, so samples without a
+    condition label contribute only to the binary loss.
+    """
+    if condition_labels is None:
+        return torch.full((n,), -100, dtype=torch.long)
+    cond = np.asarray(condition_labels, dtype=float)
+    cond = np.where(np.isnan(cond) | (cond < 0), -100, cond)
+    return torch.tensor(cond.astype(np.int64), dtype=torch.long)
+
+
+def _load_backbone(model_name, pretrained=True):
+    """SigLIP backbone with pretrained weights, or just its architecture.
+
+    pretrained=False reads only config.json; exported fine-tuned models bring
+    all weights themselves, so loading the base checkpoint first is wasted work.
+    """
+    from transformers import AutoConfig, AutoModel
+    if pretrained:
+        return AutoModel.from_pretrained(model_name)
+    return AutoModel.from_config(AutoConfig.from_pretrained(model_name))
+
+
+# Exported weight files per architecture, preferred first (legacy pickles last)
+WEIGHT_FILES = {
+    "v1": ("model.safetensors", "model_state.pt"),
+    "v2": ("siglip_finetuned.safetensors", "siglip_finetuned.pt"),
+}
+
+
+def save_weights(module: nn.Module, path):
+    """Write a module's weights as safetensors, including non-persistent buffers.
+
+    Non-persistent buffers (SigLIP's position_ids) are not in state_dict() but
+    must be in the file for load_weights() to fill a meta-initialized module.
+    """
+    from safetensors.torch import save_file
+
+    tensors = {}
+    storages = set()
+    for name, tensor in list(module.state_dict().items()) + list(module.named_buffers()):
+        if name in tensors:
+            continue
+        tensor = tensor.detach().cpu().contiguous()
+        storage = tensor.untyped_storage().data_ptr()
+        # safetensors refuses tensors sharing memory (tied weights); copy the later ones
+        tensors[name] = tensor.clone() if storage in storages else tensor
+        storages.add(storage)
+    save_file(tensors, str(path))
+
+
+def load_weights(module: nn.Module, path):
+    """Fill a meta-initialized module from a .safetensors file without copying.
+
+    The file is memory-mapped and its tensors become the module's parameters
+    (load_state_dict(assign=True)), so on CPU the weights live in the page
+    cache, are read on first use and are shared by every process mapping the
+    same file.
+    """
+    from safetensors.torch import load_file
+
+    state = load_file(str(path))
+    expected = module.state_dict().keys()
+    module.load_state_dict({k: state[k] for k in expected if k in state}, strict=True, assign=True)
+    for name, buffer in list(module.named_buffers()):
+        if buffer.is_meta:
+            owner, _, attr = name.rpartition(".")
+            if name not in state:
+                raise KeyError(f"{path} has no tensor for buffer {name}")
+            module.get_submodule(owner)._buffers[attr] = state[name]
+    return module
+
+
 class EndToEndSigLIP(nn.Module):
     """SigLIP backbone with trainable classification head.
 
     Optionally unfreezes the last N transformer layers for fine-tuning.
     """
 
-    def __init__(self, model_name, hidden_dim=256, n_classes=2, dropout=0.3, unfreeze_layers=0):
+    def __init__(self, model_name, hidden_dim=256, n_classes=2, dropout=0.3, unfreeze_layers=0,
+                 n_conditions=0, pretrained=True):
         super().__init__()
-        from transformers import AutoModel
-        self.backbone = AutoModel.from_pretrained(model_name)
+        self.backbone = _load_backbone(model_name, pretrained)
         embedding_dim = self.backbone.config.vision_config.hidden_size
-        self.head = DeepClassificationHead(embedding_dim, hidden_dim, n_classes, dropout)
+        if n_conditions > 0:
+            self.head = MultiTaskHead(embedding_dim, hidden_dim, n_classes, n_conditions, dropout)
+        else:
+            self.head = DeepClassificationHead(embedding_dim, hidden_dim, n_classes, dropout)
 
         # Freeze everything first
         for param in self.backbone.parameters():
@@ -62,11 +185,15 @@ class EndToEndSigLIP(nn.Module):
                 for param in layer.parameters():
                     param.requires_grad = True
 
-    def forward(self, pixel_values):
+    def features(self, pixel_values):
+        """Backbone image embeddings (the head's input)."""
         features = self.backbone.get_image_features(pixel_values=pixel_values)
         if not isinstance(features, torch.Tensor):
             features = features.pooler_output
-        return self.head(features)
+        return features
+
+    def forward(self, pixel_values):
+        return self.head(self.features(pixel_values))
 
 
 class FineTunableSigLIP(nn.Module):
@@ -83,10 +210,10 @@ class FineTunableSigLIP(nn.Module):
         n_classes=2,
         dropout=0.3,
         unfreeze_layers=4,
+        pretrained=True,
     ):
         super().__init__()
-        from transformers import AutoModel
-        self.backbone = AutoModel.from_pretrained(model_name)
+        self.backbone = _load_backbone(model_name, pretrained)
         self.embedding_dim = self.backbone.config.vision_config.hidden_size
 
         for param in self.backbone.parameters():
@@ -110,16 +237,17 @@ class FineTunableSigLIP(nn.Module):
             nn.Linear(hidden_dim // 2, n_classes),
         )
 
+    def features(self, pixel_values):
+        """Pooled vision embeddings (the head's input)."""
+        return self.backbone.vision_model(pixel_values=pixel_values).pooler_output
+
     def forward(self, pixel_values):
-        outputs = self.backbone.vision_model(pixel_values=pixel_values)
-        features = outputs.pooler_output
-        return self.head(features)
+        return self.head(self.features(pixel_values))
 
     def extract_embeddings(self, pixel_values):
         """Extract embeddings without classification head."""
         with torch.no_grad():
-            outputs = self.backbone.vision_model(pixel_values=pixel_values)
-            return outputs.pooler_output
+            return self.features(pixel_values)
 
 
 class DeepClassifier:
@@ -294,6 +422,15 @@ class DeepClassifier:
             proba = torch.softmax(logits, dim=1)
         return proba.cpu().numpy()
 
+    def predict_all(self, embeddings):
+        """Labels and probabilities from one forward pass."""
+        X = self._to_tensor(embeddings).float().to(self.device)
+        self.model.eval()
+        with torch.no_grad():
+            logits = self.model(X)
+            proba = torch.softmax(logits, dim=1)
+        return {"pred": logits.argmax(1).cpu().numpy(), "proba": proba.cpu().numpy()}
+
     def score(self, embeddings, labels):
         preds = self.predict(embeddings)
         labels = np.asarray(labels)
@@ -319,6 +456,205 @@ class DeepClassifier:
         return torch.tensor(np.asarray(x))
 
 
+class MultiTaskClassifier:
+    """Joint binary + condition classifier on pre-extracted embeddings.
+
+    One MultiTaskHead predicts malignancy and the 10-class Condition together.
+    predict/predict_proba return the binary output, so it is a drop-in
+    replacement for DeepClassifier; predict_joint returns both outputs from a
+    single forward pass.
+    """
+
+    def __init__(
+        self,
+        embedding_dim: int = 1152,
+        hidden_dim: int = 256,
+        n_classes: int = 2,
+        n_conditions: int = 10,
+        condition_weight: float = 0.5,
+        dropout: float = 0.3,
+        lr: float = 1e-3,
+        epochs: int = 50,
+        batch_size: int = 64,
+        patience: int = 8,
+        device: str = None,
+    ):
+        self.embedding_dim = embedding_dim
+        self.hidden_dim = hidden_dim
+        self.n_classes = n_classes
+        self.n_conditions = n_conditions
+        self.condition_weight = condition_weight
+        self.dropout = dropout
+        self.lr = lr
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.patience = patience
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = None
+        self.training_history = []
+
+    def _build_model(self):
+        self.model = MultiTaskHead(
+            self.embedding_dim, self.hidden_dim, self.n_classes, self.n_conditions, self.dropout
+        ).to(self.device)
+
+    def _joint_loss(self, logits, cond_logits, by, bc, bin_criterion, cond_criterion, bw=None):
+        """Per-sample binary loss plus weighted condition loss (0 where condition is missing)."""
+        loss = bin_criterion(logits, by) + self.condition_weight * cond_criterion(cond_logits, bc)
+        if bw is not None:
+            return (loss * bw).mean()
+        return loss.mean()
+
+    def fit(self, embeddings, labels, condition_labels=None, sample_weight=None,
+            val_embeddings=None, val_labels=None, val_condition_labels=None):
+        """Train the multi-task head on pre-extracted embeddings.
+
+        Args:
+            embeddings: numpy array or torch tensor (N, D)
+            labels: binary labels (N,)
+            condition_labels: Condition ids (N,); NaN or negative entries are
+                ignored by the condition loss
+            sample_weight: optional per-sample weights (N,)
+            val_embeddings, val_labels, val_condition_labels: optional validation set
+        """
+        X = self._to_tensor(embeddings).float()
+        y = torch.tensor(np.asarray(labels), dtype=torch.long)
+        c = _condition_targets(condition_labels, len(y))
+
+        self._build_model()
+
+        bin_weight = torch.tensor(_class_weights(labels, self.n_classes), dtype=torch.float32).to(self.device)
+        valid_cond = c[c >= 0].numpy()
+        cond_weight = torch.tensor(
+            _class_weights(valid_cond, self.n_conditions) if len(valid_cond) else np.ones(self.n_conditions),
+            dtype=torch.float32,
+        ).to(self.device)
+        bin_criterion = nn.CrossEntropyLoss(weight=bin_weight, reduction='none')
+        cond_criterion = nn.CrossEntropyLoss(weight=cond_weight, reduction='none')
+
+        optimizer = torch.optim.AdamW(self.model.parameters(), lr=self.lr, weight_decay=1e-4)
+        scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=self.epochs)
+
+        sw = None
+        if sample_weight is not None:
+            sw = torch.tensor(np.asarray(sample_weight), dtype=torch.float32)
+
+        has_val = val_embeddings is not None and val_labels is not None
+        if has_val:
+            X_val = self._to_tensor(val_embeddings).float().to(self.device)
+            y_val = torch.tensor(np.asarray(val_labels), dtype=torch.long).to(self.device)
+            c_val = _condition_targets(val_condition_labels, len(y_val)).to(self.device)
+            X_train, y_train, c_train, sw_train = X, y, c, sw
+        else:
+            n = len(X)
+            perm = torch.randperm(n)
+            val_size = max(1, int(0.15 * n))
+            val_idx = perm[:val_size]
+            train_idx = perm[val_size:]
+            X_val = X[val_idx].to(self.device)
+            y_val = y[val_idx].to(self.device)
+            c_val = c[val_idx].to(self.device)
+            X_train = X[train_idx]
+            y_train = y[train_idx]
+            c_train = c[train_idx]
+            sw_train = sw[train_idx] if sw is not None else None
+
+        tensors = [X_train, y_train, c_train] + ([sw_train] if sw_train is not None else [])
+        loader = DataLoader(TensorDataset(*tensors), batch_size=self.batch_size, shuffle=True, drop_last=False)
+
+        best_val_loss = float('inf')
+        patience_counter = 0
+        best_state = None
+
+        self.training_history = []
+        for epoch in range(self.epochs):
+            self.model.train()
+            epoch_loss = 0.0
+
+            for batch in loader:
+                bx, by, bc = (t.to(self.device) for t in batch[:3])
+                bw = batch[3].to(self.device) if sw_train is not None else None
+
+                optimizer.zero_grad()
+                logits, cond_logits = self.model(bx)
+                loss = self._joint_loss(logits, cond_logits, by, bc, bin_criterion, cond_criterion, bw)
+                loss.backward()
+                optimizer.step()
+                epoch_loss += loss.item() * len(bx)
+
+            scheduler.step()
+
+            self.model.eval()
+            with torch.no_grad():
+                val_logits, val_cond_logits = self.model(X_val)
+                val_bin_loss = nn.CrossEntropyLoss()(val_logits, y_val).item()
+                val_loss = val_bin_loss
+                if (c_val >= 0).any():
+                    val_loss += self.condition_weight * nn.CrossEntropyLoss()(val_cond_logits, c_val).item()
+                val_acc = (val_logits.argmax(1) == y_val).float().mean().item()
+
+            self.training_history.append({
+                'epoch': epoch,
+                'train_loss': epoch_loss / len(X_train),
+                'val_loss': val_loss,
+                'val_binary_loss': val_bin_loss,
+                'val_acc': val_acc,
+            })
+
+            if val_loss < best_val_loss:
+                best_val_loss = val_loss
+                patience_counter = 0
+                best_state = {k: v.cpu().clone() for k, v in self.model.state_dict().items()}
+            else:
+                patience_counter += 1
+                if patience_counter >= self.patience:
+                    break
+
+        if best_state is not None:
+            self.model.load_state_dict(best_state)
+            self.model.to(self.device)
+
+        self.model.eval()
+        return self
+
+    def predict_joint(self, embeddings):
+        """Return (binary_proba, condition_proba) from one forward pass."""
+        X = self._to_tensor(embeddings).float().to(self.device)
+        self.model.eval()
+        with torch.no_grad():
+            logits, cond_logits = self.model(X)
+            proba = torch.softmax(logits, dim=1)
+            cond_proba = torch.softmax(cond_logits, dim=1)
+        return proba.cpu().numpy(), cond_proba.cpu().numpy()
+
+    def predict(self, embeddings):
+        return self.predict_proba(embeddings).argmax(1)
+
+    def predict_proba(self, embeddings):
+        return self.predict_joint(embeddings)[0]
+
+    def predict_all(self, embeddings):
+        """Labels, probabilities and condition probabilities from one forward pass."""
+        proba, cond_proba = self.predict_joint(embeddings)
+        return {"pred": proba.argmax(1), "proba": proba, "condition_proba": cond_proba}
+
+    def predict_condition(self, embeddings):
+        return self.predict_condition_proba(embeddings).argmax(1)
+
+    def predict_condition_proba(self, embeddings):
+        return self.predict_joint(embeddings)[1]
+
+    def score(self, embeddings, labels):
+        preds = self.predict(embeddings)
+        labels = np.asarray(labels)
+        return (preds == labels).mean()
+
+    def _to_tensor(self, x):
+        if isinstance(x, torch.Tensor):
+            return x
+        return torch.tensor(np.asarray(x))
+
+
 class EndToEndClassifier:
     """Fine-tunes SigLIP backbone (last N layers) + classification head jointly.
 
@@ -328,6 +664,10 @@ class EndToEndClassifier:
 
     After training, call export_for_inference() to save the full model
     for deployment in the web app.
+
+    With n_conditions > 0 the head is a MultiTaskHead that also predicts the
+    10-class Condition; fit() then takes condition_labels and predict_joint()
+    returns both outputs from one backbone pass.
     """
 
     def __init__(
@@ -337,6 +677,8 @@ class EndToEndClassifier:
         n_classes: int = 2,
         dropout: float = 0.3,
         unfreeze_layers: int = 4,
+        n_conditions: int = 0,
+        condition_weight: float = 0.5,
         lr_head: float = 1e-3,
         lr_backbone: float = 1e-5,
         epochs: int = 20,
@@ -349,6 +691,8 @@ class EndToEndClassifier:
         self.n_classes = n_classes
         self.dropout = dropout
         self.unfreeze_layers = unfreeze_layers
+        self.n_conditions = n_conditions
+        self.condition_weight = condition_weight
         self.lr_head = lr_head
         self.lr_backbone = lr_backbone
         self.epochs = epochs
@@ -360,19 +704,23 @@ class EndToEndClassifier:
         self.training_history = []
 
     def _build_model(self):
-        from transformers import AutoImageProcessor
-        self.processor = AutoImageProcessor.from_pretrained(self.model_name)
+        from src.model.preprocessing import SiglipPreprocessor
+        self.processor = SiglipPreprocessor.from_pretrained(self.model_name)
         self.model = EndToEndSigLIP(
             self.model_name, self.hidden_dim, self.n_classes,
-            self.dropout, self.unfreeze_layers
+            self.dropout, self.unfreeze_layers, self.n_conditions,
         ).to(self.device)
 
     def _prepare_images(self, images):
-        """Convert PIL images to pixel_values tensor."""
-        inputs = self.processor(images=images, return_tensors="pt")
-        return inputs["pixel_values"]
+        """Convert PIL images to a pixel_values tensor on the model's device."""
+        return self.processor(images, device=self.device)
+
+    @property
+    def has_condition_head(self):
+        return isinstance(getattr(self.model, "head", None), MultiTaskHead)
 
-    def fit(self, images, labels, sample_weight=None, val_images=None, val_labels=None):
+    def fit(self, images, labels, sample_weight=None, val_images=None, val_labels=None,
+            condition_labels=None, val_condition_labels=None, profile=None):
         """Fine-tune on raw PIL images.
 
         Args:
@@ -381,18 +729,31 @@ class EndToEndClassifier:
             sample_weight: optional per-sample weights
             val_images: optional validation images
             val_labels: optional validation labels
+            condition_labels: optional Condition ids (used when n_conditions > 0;
+                NaN or negative entries are ignored by the condition loss)
+            val_condition_labels: optional Condition ids for the validation images
+            profile: profile a window of training steps (default: SKINTAG_PROFILE,
+                see src/utils/profiling.py)
         """
+        from src.utils.profiling import BatchProfiler
+
         self._build_model()
 
         labels = np.asarray(labels)
         n = len(images)
+        conditions = _condition_targets(condition_labels, n).numpy()
 
         # Class-weighted loss
-        class_counts = np.bincount(labels, minlength=self.n_classes)
-        class_weights = 1.0 / (class_counts + 1e-6)
-        class_weights = class_weights / class_weights.sum() * self.n_classes
-        ce_weight = torch.tensor(class_weights, dtype=torch.float32).to(self.device)
+        ce_weight = torch.tensor(_class_weights(labels, self.n_classes), dtype=torch.float32).to(self.device)
         criterion = nn.CrossEntropyLoss(weight=ce_weight, reduction='none')
+        cond_criterion = None
+        if self.n_conditions > 0:
+            valid_cond = conditions[conditions >= 0]
+            cond_ce_weight = torch.tensor(
+                _class_weights(valid_cond, self.n_conditions) if len(valid_cond) else np.ones(self.n_conditions),
+                dtype=torch.float32,
+            ).to(self.device)
+            cond_criterion = nn.CrossEntropyLoss(weight=cond_ce_weight, reduction='none')
 
         # Separate learning rates for head vs backbone
         head_params = list(self.model.head.parameters())
@@ -413,15 +774,19 @@ class EndToEndClassifier:
             train_idx = perm[val_size:]
             val_images_split = [images[i] for i in val_idx]
             val_labels_split = labels[val_idx]
+            val_conditions = conditions[val_idx]
             train_images = [images[i] for i in train_idx]
             train_labels = labels[train_idx]
+            train_conditions = conditions[train_idx]
             train_weights = sample_weight[train_idx] if sample_weight is not None else None
         else:
             train_images = images
             train_labels = labels
+            train_conditions = conditions
             train_weights = sample_weight
             val_images_split = val_images
             val_labels_split = np.asarray(val_labels)
+            val_conditions = _condition_targets(val_condition_labels, len(val_labels_split)).numpy()
 
         best_val_loss = float('inf')
         patience_counter = 0
@@ -429,6 +794,7 @@ class EndToEndClassifier:
         n_train = len(train_images)
 
         self.training_history = []
+        profiler = BatchProfiler("finetune", enabled=profile, model=self.model).start()
         for epoch in range(self.epochs):
             self.model.train()
             epoch_loss = 0.0
@@ -439,11 +805,16 @@ class EndToEndClassifier:
                 batch_imgs = [train_images[i] for i in idx]
                 batch_labels = torch.tensor(train_labels[idx], dtype=torch.long).to(self.device)
 
-                pixel_values = self._prepare_images(batch_imgs).to(self.device)
+                with profiler.region("preprocess"):
+                    pixel_values = self._prepare_images(batch_imgs)
 
                 optimizer.zero_grad()
-                logits = self.model(pixel_values)
+                with profiler.region("forward"):
+                    logits, cond_logits = _split_outputs(self.model(pixel_values))
                 loss = criterion(logits, batch_labels)
+                if cond_logits is not None:
+                    batch_conditions = torch.tensor(train_conditions[idx], dtype=torch.long).to(self.device)
+                    loss = loss + self.condition_weight * cond_criterion(cond_logits, batch_conditions)
 
                 if train_weights is not None:
                     bw = torch.tensor(train_weights[idx], dtype=torch.float32).to(self.device)
@@ -451,9 +822,12 @@ class EndToEndClassifier:
                 else:
                     loss = loss.mean()
 
-                loss.backward()
-                optimizer.step()
+                with profiler.region("backward"):
+                    loss.backward()
+                with profiler.region("optimizer"):
+                    optimizer.step()
                 epoch_loss += loss.item() * len(idx)
+                profiler.step()
 
             scheduler.step()
 
@@ -467,9 +841,17 @@ class EndToEndClassifier:
                     batch_labels = torch.tensor(
                         val_labels_split[start:start + self.batch_size], dtype=torch.long
                     ).to(self.device)
-                    pixel_values = self._prepare_images(batch_imgs).to(self.device)
-                    logits = self.model(pixel_values)
-                    val_loss += nn.CrossEntropyLoss()(logits, batch_labels).item() * len(batch_labels)
+                    pixel_values = self._prepare_images(batch_imgs)
+                    logits, cond_logits = _split_outputs(self.model(pixel_values))
+                    batch_loss = nn.CrossEntropyLoss()(logits, batch_labels).item()
+                    batch_conditions = torch.tensor(
+                        val_conditions[start:start + self.batch_size], dtype=torch.long
+                    ).to(self.device)
+                    if cond_logits is not None and (batch_conditions >= 0).any():
+                        batch_loss += self.condition_weight * nn.CrossEntropyLoss()(
+                            cond_logits, batch_conditions
+                        ).item()
+                    val_loss += batch_loss * len(batch_labels)
                     val_correct += (logits.argmax(1) == batch_labels).sum().item()
 
             val_loss /= len(val_images_split)
@@ -493,35 +875,65 @@ class EndToEndClassifier:
                     print(f"  Early stopping at epoch {epoch}")
                     break
 
+        profiler.stop()
         if best_state is not None:
             self.model.load_state_dict(best_state)
             self.model.to(self.device)
         self.model.eval()
         return self
 
-    def predict(self, images):
-        """Predict from raw PIL images."""
+    def predict_all(self, images, return_embeddings: bool = False):
+        """Everything the model outputs, from one backbone pass over the images.
+
+        Args:
+            images: list of PIL images
+            return_embeddings: also return the backbone embeddings (head input)
+
+        Returns:
+            dict with "pred" (N,), "proba" (N, C), "condition_proba" (N, K) or
+            None without a condition head, and "embeddings" (N, D) if requested
+        """
         self.model.eval()
-        all_preds = []
+        preds, probas, conds, embeds = [], [], [], []
         with torch.no_grad():
             for start in range(0, len(images), self.batch_size):
                 batch = images[start:start + self.batch_size]
-                pixel_values = self._prepare_images(batch).to(self.device)
-                logits = self.model(pixel_values)
-                all_preds.append(logits.argmax(1).cpu())
-        return torch.cat(all_preds).numpy()
+                with stage("preprocess"):
+                    pixel_values = self._prepare_images(batch)
+                with stage("backbone_forward"):
+                    features = self.model.features(pixel_values)
+                with stage("head_predict"):
+                    logits, cond_logits = _split_outputs(self.model.head(features))
+                preds.append(logits.argmax(1).cpu())
+                probas.append(torch.softmax(logits, dim=1).cpu())
+                if cond_logits is not None:
+                    conds.append(torch.softmax(cond_logits, dim=1).cpu())
+                if return_embeddings:
+                    embeds.append(features.float().cpu())
+        out = {
+            "pred": torch.cat(preds).numpy(),
+            "proba": torch.cat(probas).numpy(),
+            "condition_proba": torch.cat(conds).numpy() if conds else None,
+        }
+        if return_embeddings:
+            out["embeddings"] = torch.cat(embeds).numpy()
+        return out
+
+    def predict(self, images):
+        """Predict from raw PIL images."""
+        return self.predict_all(images)["pred"]
 
     def predict_proba(self, images):
         """Predict probabilities from raw PIL images."""
-        self.model.eval()
-        all_proba = []
-        with torch.no_grad():
-            for start in range(0, len(images), self.batch_size):
-                batch = images[start:start + self.batch_size]
-                pixel_values = self._prepare_images(batch).to(self.device)
-                logits = self.model(pixel_values)
-                all_proba.append(torch.softmax(logits, dim=1).cpu())
-        return torch.cat(all_proba).numpy()
+        return self.predict_all(images)["proba"]
+
+    def predict_joint(self, images):
+        """Return (binary_proba, condition_proba) from one backbone pass.
+
+        condition_proba is None when the model has no condition head.
+        """
+        out = self.predict_all(images)
+        return out["proba"], out["condition_proba"]
 
     def score(self, images, labels):
         preds = self.predict(images)
@@ -532,8 +944,8 @@ class EndToEndClassifier:
         """Export the fine-tuned model for deployment.
 
         Saves:
-          - model_state.pt: Full model state dict
-          - head_state.pt: Just the classification head (for use with EmbeddingExtractor)
+          - model.safetensors: Full model weights (memory-mapped on load)
+          - head.safetensors: Just the classification head (for use with EmbeddingExtractor)
           - config.json: Model configuration
 
         The app can then load the fine-tuned backbone for better accuracy,
@@ -544,10 +956,10 @@ class EndToEndClassifier:
         save_dir.mkdir(parents=True, exist_ok=True)
 
         # Full model
-        torch.save(self.model.state_dict(), save_dir / "model_state.pt")
+        save_weights(self.model, save_dir / "model.safetensors")
 
         # Head only (lightweight)
-        torch.save(self.model.head.state_dict(), save_dir / "head_state.pt")
+        save_weights(self.model.head, save_dir / "head.safetensors")
 
         # Config
         config = {
@@ -556,21 +968,27 @@ class EndToEndClassifier:
             "n_classes": self.n_classes,
             "dropout": self.dropout,
             "unfreeze_layers": self.unfreeze_layers,
+            "n_conditions": self.n_conditions,
         }
         with open(save_dir / "config.json", "w") as f:
             json.dump(config, f, indent=2)
 
         print(f"Exported to {save_dir}/")
-        print(f"  model_state.pt: Full fine-tuned model")
-        print(f"  head_state.pt: Classification head only (~1MB)")
+        print(f"  model.safetensors: Full fine-tuned model")
+        print(f"  head.safetensors: Classification head only (~1MB)")
         print(f"  config.json: Model configuration")
 
     @classmethod
     def load_for_inference(cls, save_dir: str, device: str = None):
         """Load a previously exported fine-tuned model.
 
-        Detects v2 models (siglip_finetuned.pt + FineTunableSigLIP architecture)
-        vs v1 models (model_state.pt + EndToEndSigLIP architecture).
+        Detects v2 models (siglip_finetuned.* + FineTunableSigLIP architecture)
+        vs v1 models (model.safetensors / model_state.pt + EndToEndSigLIP architecture).
+
+        Safetensors exports are built on the meta device from config.json alone
+        and the memory-mapped weights are assigned in, so weights are read once
+        and never duplicated. Legacy .pt checkpoints still load the base SigLIP
+        first; scripts/convert_to_safetensors.py converts them.
         """
         import json
         save_dir = Path(save_dir)
@@ -579,11 +997,13 @@ class EndToEndClassifier:
         # Check for v2 model in subdirectories (HF downloads to v2/)
         for subdir in ["v2", "siglip_finetuned"]:
             candidate = save_dir / subdir
-            if (candidate / "siglip_finetuned.pt").exists():
+            if any((candidate / name).exists() for name in WEIGHT_FILES["v2"]):
                 save_dir = candidate
                 break
 
-        is_v2 = (save_dir / "siglip_finetuned.pt").exists()
+        is_v2 = any((save_dir / name).exists() for name in WEIGHT_FILES["v2"])
+        candidates = [save_dir / name for name in WEIGHT_FILES["v2" if is_v2 else "v1"]]
+        weights_path = next((p for p in candidates if p.exists()), candidates[-1])
 
         with open(save_dir / "config.json") as f:
             config = json.load(f)
@@ -594,27 +1014,41 @@ class EndToEndClassifier:
             n_classes=config.get("n_classes", 2),
             dropout=config.get("dropout", 0.3),
             unfreeze_layers=config.get("unfreeze_layers", 4),
+            n_conditions=config.get("n_conditions", 0),
             device=device,
         )
 
-        if is_v2:
-            from transformers import AutoImageProcessor
-            obj.processor = AutoImageProcessor.from_pretrained(obj.model_name)
-            obj.model = FineTunableSigLIP(
-                model_name=obj.model_name,
-                hidden_dim=obj.hidden_dim,
-                n_classes=obj.n_classes,
-                dropout=obj.dropout,
-                unfreeze_layers=obj.unfreeze_layers,
-            ).to(device)
-            state = torch.load(save_dir / "siglip_finetuned.pt", map_location=device)
-            obj.model.load_state_dict(state)
-            print(f"Loaded v2 FineTunableSigLIP model from {save_dir}")
+        from src.model.preprocessing import SiglipPreprocessor
+        obj.processor = SiglipPreprocessor.from_pretrained(obj.model_name)
+
+        def build(pretrained):
+            if is_v2:
+                return FineTunableSigLIP(
+                    model_name=obj.model_name,
+                    hidden_dim=obj.hidden_dim,
+                    n_classes=obj.n_classes,
+                    dropout=obj.dropout,
+                    unfreeze_layers=obj.unfreeze_layers,
+                    pretrained=pretrained,
+                )
+            return EndToEndSigLIP(
+                obj.model_name, obj.hidden_dim, obj.n_classes,
+                obj.dropout, obj.unfreeze_layers, obj.n_conditions, pretrained=pretrained,
+            )
+
+        if weights_path.suffix == ".safetensors":
+            with torch.device("meta"):
+                obj.model = build(pretrained=False)
+            load_weights(obj.model, weights_path)
         else:
-            obj._build_model()
-            state = torch.load(save_dir / "model_state.pt", map_location=device)
+            print(f"  {weights_path.name} is a legacy checkpoint (base weights load first); "
+                  f"convert it with scripts/convert_to_safetensors.py")
+            obj.model = build(pretrained=True)
+            state = torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
             obj.model.load_state_dict(state)
-            print(f"Loaded v1 EndToEndSigLIP model from {save_dir}")
+
+        arch = "v2 FineTunableSigLIP" if is_v2 else "v1 EndToEndSigLIP"
+        print(f"Loaded {arch} model from {weights_path}")
 
         obj.model.to(device)
         obj.model.eval()
@@ -627,5 +1061,5 @@ class EndToEndClassifier:
         """
         if not isinstance(self.model, FineTunableSigLIP):
             return None
-        pixel_values = self._prepare_images(images).to(self.device)
+        pixel_values = self._prepare_images(images)
         return self.model.extract_embeddings(pixel_values)
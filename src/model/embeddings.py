@@ -11,7 +11,10 @@ import torch
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
-from transformers import AutoModel, AutoImageProcessor
+from transformers import AutoModel
+
+from src.model.preprocessing import SiglipPreprocessor
+from src.utils.telemetry import stage
 
 
 class EmbeddingExtractor:
@@ -20,18 +23,17 @@ class EmbeddingExtractor:
     def __init__(self, model_name: str = "google/siglip-so400m-patch14-384", device: str = None):
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.model_name = model_name
+        self.dtype = torch.float16 if self.device == "cuda" else torch.float32
         self.model = None
         self.processor = None
+        self.tokenizer = None
 
     def load_model(self):
         """Lazy load model to save memory until needed."""
         if self.model is None:
             print(f"Loading model on {self.device}...")
-            self.processor = AutoImageProcessor.from_pretrained(self.model_name)
-            self.model = AutoModel.from_pretrained(
-                self.model_name,
-                dtype=torch.float16 if self.device == "cuda" else torch.float32,
-            ).to(self.device)
+            self.processor = SiglipPreprocessor.from_pretrained(self.model_name)
+            self.model = AutoModel.from_pretrained(self.model_name, dtype=self.dtype).to(self.device)
             self.model.eval()
         return self
 
@@ -41,6 +43,7 @@ class EmbeddingExtractor:
         del self.processor
         self.model = None
         self.processor = None
+        self.tokenizer = None
         if self.device == "cuda":
             torch.cuda.empty_cache()
 
@@ -55,22 +58,27 @@ class EmbeddingExtractor:
             Tensor of shape (batch_size, embedding_dim)
         """
         self.load_model()
-        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with torch.profiler.record_function("preprocess"), stage("preprocess"):
+            # Batched straight into the model's device and dtype (src/model/preprocessing.py)
+            pixel_values = self.processor(images, device=self.device, dtype=self.dtype)
         vision_model = getattr(self.model, "vision_model", self.model)
-        outputs = vision_model(**inputs)
+        with torch.profiler.record_function("vision_forward"), stage("backbone_forward"):
+            outputs = vision_model(pixel_values=pixel_values)
         # Use pooler_output if available, else mean-pool last_hidden_state
         if hasattr(outputs, "pooler_output") and outputs.pooler_output is not None:
             return outputs.pooler_output.cpu()
         return outputs.last_hidden_state.mean(dim=1).cpu()
 
-    @staticmethod
-    def _load_image(item):
-        """Load a single image from a path string or return a PIL Image as-is."""
-        from PIL import Image as _Image
-        if isinstance(item, str):
-            return _Image.open(item).convert("RGB")
-        if isinstance(item, Path):
-            return _Image.open(str(item)).convert("RGB")
+    def _load_image(self, item, reduce: bool = True):
+        """Load a single image from a path string or return a PIL Image as-is.
+
+        Paths are decoded like API uploads (src/data/decode.py): EXIF-upright
+        and, with reduce, at the smallest JPEG scale still covering the model input.
+        """
+        if isinstance(item, (str, Path)):
+            from src.data.decode import decode_image, processor_input_size
+            return decode_image(item, target_size=processor_input_size(self.processor), reduce=reduce,
+                                max_bytes=None, max_pixels=None)
         return item  # already a PIL Image
 
     @torch.no_grad()
@@ -81,6 +89,8 @@ class EmbeddingExtractor:
         cache_path: Path = None,
         transform=None,
         augmentation_config: dict = None,
+        profile: bool = None,
+        reduced: bool = True,
     ):
         """Extract embeddings for a full dataset with batching and caching.
 
@@ -93,6 +103,10 @@ class EmbeddingExtractor:
             cache_path: Path to cache embeddings (skips extraction if exists)
             transform: Optional augmentation transform (applied per-image before extraction)
             augmentation_config: If provided, hashed into cache filename to avoid stale caches
+            profile: Profile a window of batches (default: SKINTAG_PROFILE, see
+                src/utils/profiling.py)
+            reduced: Reduced decoding of image paths (config decode.reduced, as in
+                the API); always off with a transform, so crops keep their detail
 
         Returns:
             Tensor of shape (num_images, embedding_dim)
@@ -110,13 +124,17 @@ class EmbeddingExtractor:
             print(f"Loading cached embeddings from {effective_cache}")
             return torch.load(effective_cache)
 
+        from src.utils.profiling import BatchProfiler
+
         self.load_model()
         all_embeddings = []
+        profiler = BatchProfiler("extract", enabled=profile, model=self.model).start()
 
         for i in tqdm(range(0, len(images), batch_size), desc="Extracting embeddings"):
             batch_items = images[i : i + batch_size]
             # Lazy load: convert paths to PIL images per-batch
-            batch = [self._load_image(item) for item in batch_items]
+            with profiler.region("decode"):
+                batch = [self._load_image(item, reduce=reduced and transform is None) for item in batch_items]
 
             if transform is not None:
                 augmented = []
@@ -143,7 +161,9 @@ class EmbeddingExtractor:
             all_embeddings.append(embeddings)
             # Free batch images immediately (important for path-based loading)
             del batch
+            profiler.step()
 
+        profiler.stop()
         all_embeddings = torch.cat(all_embeddings, dim=0)
 
         if effective_cache:
@@ -157,7 +177,11 @@ class EmbeddingExtractor:
     def extract_text(self, texts):
         """Extract text embeddings for zero-shot classification."""
         self.load_model()
-        inputs = self.processor(text=texts, return_tensors="pt", padding=True).to(self.device)
+        if self.tokenizer is None:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # SigLIP was trained on max_length-padded text
+        inputs = self.tokenizer(texts, return_tensors="pt", padding="max_length", truncation=True).to(self.device)
         outputs = self.model.get_text_features(**inputs)
         return outputs.cpu()
 
@@ -0,0 +1,201 @@
+"""Concurrent training of independent classifier heads on shared embeddings.
+
+stage_train_models fits several heads on the same training rows (majority
+baseline, logistic, XGBoost, deep MLP, the condition heads and the multi-task
+head). They share no state and have very different CPU profiles, so they run
+side by side in a process pool:
+
+- The full embedding matrix and the per-job row indices / labels / weights
+  are written once to .npy files and memory-mapped read-only by each worker
+  (src/utils/parallel.py), so the pool holds one copy in the page cache.
+- The machine's threads are split between the jobs running at once by CPU
+  appetite (split_threads), and each worker caps BLAS/OpenMP/torch (and XGBoost's
+  n_jobs) to its share instead of every library assuming it owns all cores.
+- Workers pickle the fitted model to its final path and return the store
+  columns (one predict_all over all embeddings), so models never travel
+  back through the pool pipe. Metrics, the prediction store and the
+  summary tables stay in the parent.
+- Jobs with an incremental config fit their sklearn head out of core
+  (src/model/incremental.py) from a row view of the shared .npy file, and
+  predict chunk by chunk, instead of copying X[rows] into the worker.
+
+With one worker (or one job) everything runs in-process, in order.
+"""
+
+import pickle
+import tempfile
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from src.utils.parallel import (
+    attach_array,
+    default_workers,
+    limit_worker_threads,
+    release_arrays,
+    share_array,
+    split_threads,
+)
+
+# Relative CPU appetite of each model family, for splitting the thread budget
+FAMILY_WEIGHTS = {
+    "baseline": 0.25,
+    "logistic": 1.0,
+    "xgboost": 4.0,
+    "deep": 2.0,
+    "multitask": 2.0,
+}
+
+
+def build_head(family: str, embedding_dim: int, n_classes: int = 2, n_jobs: int = 1,
+               device: str = "cpu", incremental: dict = None, **kwargs):
+    """Construct an unfitted head as stage_train_models configures it.
+
+    incremental ({chunk_size, epochs}) makes the logistic / XGBoost heads
+    out-of-core SklearnClassifiers.
+    """
+    from src.model.baseline import MajorityClassBaseline
+    from src.model.classifier import SklearnClassifier
+    from src.model.deep_classifier import DeepClassifier, MultiTaskClassifier
+
+    if family == "baseline":
+        return MajorityClassBaseline()
+    streamed = {"incremental": True, **incremental} if incremental else {}
+    if family == "logistic":
+        return SklearnClassifier(classifier_type="logistic", **streamed)
+    if family == "xgboost":
+        return SklearnClassifier(classifier_type="xgboost", n_classes=n_classes, params={"n_jobs": n_jobs},
+                                 **streamed)
+    if family == "deep":
+        return DeepClassifier(embedding_dim=embedding_dim, n_classes=n_classes, device=device)
+    if family == "multitask":
+        return MultiTaskClassifier(embedding_dim=embedding_dim, device=device, **kwargs)
+    raise ValueError(f"Unknown model family: {family}")
+
+
+def _array(value):
+    """A task field: a shared .npy path (pool) or the array itself (in-process)."""
+    if value is None:
+        return None
+    return np.asarray(attach_array(value)) if isinstance(value, str) else value
+
+
+def _train_job(task: dict) -> dict:
+    """Worker: fit one head, pickle it, and predict every embedding once."""
+    from src.evaluation.prediction_store import predict_columns
+
+    outcome = {"name": task["name"], "threads": task["threads"]}
+    try:
+        if task["pooled"]:
+            limit_worker_threads(task["threads"])
+        X = _array(task["X"])
+        rows = _array(task["rows"])
+        y = _array(task["y"])
+        sample_weight = _array(task.get("sample_weight"))
+
+        incremental = task.get("incremental")
+        clf = build_head(task["family"], embedding_dim=X.shape[1], n_jobs=task["threads"],
+                         device=task["device"], incremental=incremental, **task.get("model_kwargs", {}))
+        fit_kwargs = {}
+        if task["family"] != "baseline":
+            fit_kwargs["sample_weight"] = sample_weight
+        if task.get("condition_labels") is not None:
+            fit_kwargs["condition_labels"] = _array(task["condition_labels"])
+
+        if incremental:
+            from src.model.incremental import EmbeddingChunks, predict_chunks
+
+            # The shared .npy path when pooled, so rows are read off the mapped file
+            source = task["X"] if task["pooled"] else X
+            chunk_size = incremental.get("chunk_size", 8192)
+            train_X = EmbeddingChunks(source, chunk_size=chunk_size, rows=rows)
+        else:
+            train_X = X[rows]
+
+        start = time.time()
+        clf.fit(train_X, y, **fit_kwargs)
+        outcome["fit_seconds"] = round(time.time() - start, 2)
+
+        with open(task["model_path"], "wb") as f:
+            pickle.dump(clf, f)
+        if incremental:
+            outcome["columns"] = predict_chunks(clf, EmbeddingChunks(source, chunk_size=chunk_size))
+        else:
+            outcome["columns"] = predict_columns(clf, X)
+    except Exception as exc:
+        outcome["error"] = f"{type(exc).__name__}: {exc}"
+        outcome["traceback"] = traceback.format_exc()
+    return outcome
+
+
+def train_heads(jobs: list, X, n_workers: int = None, total_threads: int = None,
+                device: str = "cpu", work_dir=None):
+    """Fit independent heads concurrently; yields outcomes as they finish.
+
+    Args:
+        jobs: dicts with name, family, model_path, rows (indices into X), y,
+            and optionally sample_weight, condition_labels, model_kwargs,
+            incremental ({chunk_size, epochs}: out-of-core logistic / XGBoost)
+        X: (N, D) embeddings for all samples (fit rows are X[rows]; the
+            returned columns cover all N)
+        n_workers: pool size (default: one per CPU, at most one per job;
+            1 = sequential in this process)
+        total_threads: thread budget of the n_workers jobs running at once
+            (default: all CPUs); every job gets at least one thread
+        device: torch device for deep / multi-task heads
+        work_dir: where to write shared arrays (default: a temp directory)
+
+    Yields:
+        dicts with name, threads, fit_seconds, columns (predict_all over X),
+        or error / traceback if the job failed
+    """
+    n_workers = min(n_workers or default_workers(len(jobs)), len(jobs)) if jobs else 1
+    pooled = n_workers > 1
+    total = total_threads or default_workers()
+    if pooled:
+        # Only n_workers jobs run at once: split a budget scaled up to all the
+        # jobs, so each running job gets its share of the machine, capped at all of it
+        budget = round(total * len(jobs) / n_workers)
+        weights = {j["name"]: FAMILY_WEIGHTS.get(j["family"], 1.0) for j in jobs}
+        threads = {name: min(n, total) for name, n in split_threads(weights, budget).items()}
+    else:
+        threads = {j["name"]: total for j in jobs}
+    # Heaviest first, so the long jobs start immediately and short ones fill in
+    jobs = sorted(jobs, key=lambda j: FAMILY_WEIGHTS.get(j["family"], 1.0), reverse=True)
+
+    own_dir = pooled and work_dir is None
+    tasks = []
+    if pooled:
+        work_dir = Path(work_dir or tempfile.mkdtemp(prefix="skintag_heads_"))
+        shared_X = share_array(X, work_dir, "X")
+    for job in jobs:
+        task = {**job, "threads": threads[job["name"]], "device": device, "pooled": pooled}
+        for key in ("rows", "y", "sample_weight", "condition_labels"):
+            if pooled and task.get(key) is not None:
+                task[key] = share_array(np.asarray(task[key]), work_dir, f"{job['name']}_{key}")
+        task["X"] = shared_X if pooled else X
+        tasks.append(task)
+
+    print(f"  Training {len(tasks)} heads with {n_workers} worker(s): "
+          + ", ".join(f"{t['name']}x{t['threads']}" for t in tasks))
+
+    if not pooled:
+        for task in tasks:
+            yield _train_job(task)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=n_workers, mp_context=get_context("spawn"))
+    try:
+        futures = [executor.submit(_train_job, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown()
+        release_arrays()
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
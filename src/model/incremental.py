@@ -0,0 +1,208 @@
+"""Out-of-core training for SklearnClassifier.
+
+When the (N, 1152) embedding matrix does not fit in RAM, SklearnClassifier
+with incremental=True trains from chunks streamed off disk:
+
+  1. one pass accumulates StandardScaler statistics (partial_fit)
+  2. logistic (SGD, log loss) and MLP heads train with partial_fit over
+     several epochs, visiting chunks and rows in a fresh order each epoch
+  3. XGBoost builds a QuantileDMatrix from a chunk iterator (quantile
+     sketch, ~1 byte per feature), or an external-memory matrix cached on
+     disk when cache_dir is given
+
+Only one chunk plus its scaled copy is in memory at a time. Labels and
+sample weights are (N,) vectors and stay in memory.
+
+Sources: numpy / torch arrays, .npy files (memory-mapped), .pt tensors
+(torch.load(mmap=True)), or a list of those as shards. rows selects a
+subset (e.g. the training split) by global row index, so a split is
+streamed from the full cache file without copying it out first.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import torch
+
+
+class EmbeddingChunks:
+    """Read-only chunked view over embeddings on disk or in memory.
+
+    With rows, the view is those rows of the concatenated shards, in that
+    order: position i is global row rows[i], and the indices yielded by
+    iter_chunks are positions (so labels aligned with rows index directly).
+    """
+
+    def __init__(self, source, chunk_size: int = 8192, rows=None):
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        self.shards = [self._open(s) for s in sources]
+        self.chunk_size = chunk_size
+        self.shard_offsets = np.cumsum([0] + [len(s) for s in self.shards])
+        dims = {s.shape[1] for s in self.shards}
+        if len(dims) != 1:
+            raise ValueError(f"Embedding shards have different widths: {sorted(dims)}")
+        self.n_features = dims.pop()
+        self.rows = None
+        if rows is not None:
+            self.rows = np.asarray(rows, dtype=np.int64)
+            if len(self.rows) and (self.rows.min() < 0 or self.rows.max() >= self.shard_offsets[-1]):
+                raise ValueError(f"Row indices out of range for {self.shard_offsets[-1]} embeddings")
+        # Chunks walk the selected rows as one virtual shard
+        self.offsets = self.shard_offsets if self.rows is None else np.array([0, len(self.rows)])
+
+    @staticmethod
+    def _open(source):
+        if isinstance(source, (str, Path)):
+            path = Path(source)
+            if path.suffix == ".npy":
+                return np.load(path, mmap_mode="r")
+            if path.suffix == ".pt":
+                return torch.load(path, mmap=True, weights_only=True)
+            raise ValueError(f"Unsupported embedding file: {path} (expected .npy or .pt)")
+        return source
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def chunk_bounds(self):
+        """(shard, start, stop) for every chunk, never spanning two shards."""
+        bounds = []
+        for k, length in enumerate(np.diff(self.offsets)):
+            for start in range(0, length, self.chunk_size):
+                bounds.append((k, start, min(start + self.chunk_size, length)))
+        return bounds
+
+    def read(self, shard: int, start: int, stop: int) -> np.ndarray:
+        """Materialize one chunk as a float32 array."""
+        if self.rows is None:
+            return self._as_float32(self.shards[shard][start:stop])
+        # Gather the chunk's rows in file order (sequential reads), then restore the view order
+        selected = self.rows[start:stop]
+        order = np.argsort(selected, kind="stable")
+        wanted = selected[order]
+        owner = np.searchsorted(self.shard_offsets, wanted, side="right") - 1
+        out = np.empty((len(selected), self.n_features), dtype=np.float32)
+        pos = 0
+        for k in np.unique(owner):
+            local = wanted[owner == k] - self.shard_offsets[k]
+            index = torch.from_numpy(local) if isinstance(self.shards[k], torch.Tensor) else local
+            out[order[pos:pos + len(local)]] = self._as_float32(self.shards[k][index])
+            pos += len(local)
+        return out
+
+    @staticmethod
+    def _as_float32(block) -> np.ndarray:
+        if isinstance(block, torch.Tensor):
+            block = block.numpy()
+        return np.asarray(block, dtype=np.float32)
+
+    def iter_chunks(self, shuffle: bool = False, rng=None):
+        """Yield (global_indices, X_chunk); optionally shuffled across and within chunks."""
+        bounds = self.chunk_bounds()
+        if shuffle:
+            rng = rng or np.random.default_rng()
+            bounds = [bounds[i] for i in rng.permutation(len(bounds))]
+        for shard, start, stop in bounds:
+            X = self.read(shard, start, stop)
+            idx = np.arange(start, stop) + self.offsets[shard]
+            if shuffle:
+                perm = rng.permutation(len(idx))
+                X, idx = X[perm], idx[perm]
+            yield idx, X
+
+
+def predict_chunks(clf, chunks: EmbeddingChunks) -> dict:
+    """Store columns (predict_columns) of every row, one chunk in memory at a time."""
+    from src.evaluation.prediction_store import predict_columns
+
+    parts = [predict_columns(clf, X) for _, X in chunks.iter_chunks()]
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]} if parts else {}
+
+
+def fit_scaler(chunks: EmbeddingChunks):
+    """StandardScaler fitted in one streaming pass."""
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    for _, X in chunks.iter_chunks():
+        scaler.partial_fit(X)
+    return scaler
+
+
+def fit_partial(clf, chunks: EmbeddingChunks, scaler, labels, sample_weight=None,
+                epochs: int = 5, seed: int = 42, verbose: bool = True):
+    """Train a partial_fit estimator (SGDClassifier / MLPClassifier) over chunks."""
+    labels = np.asarray(labels)
+    classes = np.unique(labels)
+    rng = np.random.default_rng(seed)
+    for epoch in range(epochs):
+        for idx, X in chunks.iter_chunks(shuffle=True, rng=rng):
+            kwargs = {"classes": classes}
+            if sample_weight is not None:
+                kwargs["sample_weight"] = sample_weight[idx]
+            clf.partial_fit(scaler.transform(X), labels[idx], **kwargs)
+        if verbose:
+            print(f"    Incremental epoch {epoch + 1}/{epochs} done")
+    return clf
+
+
+def _xgb_iterator(chunks: EmbeddingChunks, scaler, labels, sample_weight, cache_prefix=None):
+    import xgboost as xgb
+
+    class _ChunkIter(xgb.DataIter):
+        def __init__(self):
+            self._bounds = chunks.chunk_bounds()
+            self._pos = 0
+            kwargs = {"cache_prefix": cache_prefix} if cache_prefix else {}
+            super().__init__(**kwargs)
+
+        def next(self, input_data):
+            if self._pos >= len(self._bounds):
+                return False
+            shard, start, stop = self._bounds[self._pos]
+            idx = np.arange(start, stop) + chunks.offsets[shard]
+            batch = {"data": scaler.transform(chunks.read(shard, start, stop)), "label": labels[idx]}
+            if sample_weight is not None:
+                batch["weight"] = sample_weight[idx]
+            input_data(**batch)
+            self._pos += 1
+            return True
+
+        def reset(self):
+            self._pos = 0
+
+    return _ChunkIter()
+
+
+def fit_xgboost(clf, chunks: EmbeddingChunks, scaler, labels, sample_weight=None,
+                n_classes: int = 2, cache_dir=None):
+    """Train an XGBClassifier from a chunk iterator; returns the fitted clf.
+
+    The booster is trained with xgb.train on a QuantileDMatrix (or an
+    external-memory matrix when cache_dir is set) using the estimator's own
+    hyperparameters, then loaded back into clf so it predicts like a
+    normally fitted XGBClassifier.
+    """
+    import xgboost as xgb
+
+    labels = np.asarray(labels)
+    params = {k: v for k, v in clf.get_xgb_params().items() if v is not None}
+    if "n_jobs" in params:
+        params["nthread"] = params.pop("n_jobs")
+    if "random_state" in params:
+        params["seed"] = params.pop("random_state")
+    if n_classes > 2:
+        params["num_class"] = n_classes
+    max_bin = params.get("max_bin", 256)
+    params["max_bin"] = max_bin
+
+    if cache_dir is not None and hasattr(xgb, "ExtMemQuantileDMatrix"):
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        it = _xgb_iterator(chunks, scaler, labels, sample_weight, cache_prefix=str(Path(cache_dir) / "xgb"))
+        dtrain = xgb.ExtMemQuantileDMatrix(it, max_bin=max_bin)
+    else:
+        dtrain = xgb.QuantileDMatrix(_xgb_iterator(chunks, scaler, labels, sample_weight), max_bin=max_bin)
+
+    booster = xgb.train(params, dtrain, num_boost_round=clf.n_estimators)
+    clf.load_model(bytearray(booster.save_raw("json")))
+    return clf
@@ -0,0 +1,154 @@
+"""Batched SigLIP image preprocessing straight into a pixel_values tensor.
+
+The generic HF image processor handles each image on its own in NumPy: it
+resizes, converts to float64, rescales, normalizes, transposes, and only
+then stacks the results into a tensor. SiglipPreprocessor resizes each image
+with PIL (the same resampling as the HF processor) into one preallocated
+uint8 batch, moves that to the target device (a quarter of the float32
+bytes), and converts and normalizes it there with a single fused
+multiply-add, in float32 or the model's dtype.
+
+from_pretrained() reads the checkpoint's preprocessor config and checks
+the output against the HF processor on probe images. If the config needs a
+step not implemented here (e.g. crops), or the outputs disagree, it falls
+back to the HF processor with a warning.
+
+    preprocessor = SiglipPreprocessor.from_pretrained("google/siglip-so400m-patch14-384")
+    pixel_values = preprocessor(images, device="cuda", dtype=torch.float16)   # (N, 3, 384, 384)
+"""
+
+import numpy as np
+import torch
+from PIL import Image
+
+# Largest |difference| to the HF processor accepted by from_pretrained(), in
+# normalized units; matching resizes leave only float rounding (~1e-6)
+VALIDATION_ATOL = 1e-4
+
+
+class SiglipPreprocessor:
+    """Resize, rescale and normalize a batch of PIL images into (N, 3, H, W).
+
+    Args:
+        size: {"height": H, "width": W}
+        image_mean, image_std: per-channel normalization
+        rescale_factor: multiplies raw 0-255 values (1/255)
+        resample: PIL resampling filter
+    """
+
+    def __init__(self, size: dict, image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5),
+                 rescale_factor: float = 1 / 255, resample=Image.Resampling.BICUBIC,
+                 do_rescale: bool = True, do_normalize: bool = True):
+        self.size = {"height": int(size["height"]), "width": int(size["width"])}
+        self.resample = resample
+        mean = np.asarray(image_mean, dtype=np.float64) if do_normalize else np.zeros(3)
+        std = np.asarray(image_std, dtype=np.float64) if do_normalize else np.ones(3)
+        factor = rescale_factor if do_rescale else 1.0
+        # (x * factor - mean) / std == x * scale + shift
+        self._scale = torch.tensor(factor / std, dtype=torch.float64).view(1, 3, 1, 1)
+        self._shift = torch.tensor(-mean / std, dtype=torch.float64).view(1, 3, 1, 1)
+        self._affine = {}  # (device, dtype) -> (scale, shift)
+
+    @classmethod
+    def from_hf(cls, processor):
+        """Build from a loaded HF image processor; ValueError if its config needs steps not implemented here."""
+        size = processor.size
+        height, width = size.get("height"), size.get("width")
+        if not (height and width) or not getattr(processor, "do_resize", True):
+            raise ValueError(f"only fixed height/width resizing is supported (size={size})")
+        if getattr(processor, "do_center_crop", False) or getattr(processor, "do_pad", False):
+            raise ValueError("center crop / padding are not supported")
+        return cls(
+            size={"height": height, "width": width},
+            image_mean=processor.image_mean,
+            image_std=processor.image_std,
+            rescale_factor=processor.rescale_factor,
+            resample=Image.Resampling(int(processor.resample)),
+            do_rescale=processor.do_rescale,
+            do_normalize=processor.do_normalize,
+        )
+
+    @classmethod
+    def from_pretrained(cls, model_name: str, validate: bool = True):
+        """Preprocessor for a checkpoint, checked against its HF processor.
+
+        Returns the HF processor wrapped in HFPreprocessor if the config is
+        unsupported or the outputs disagree.
+        """
+        from transformers import AutoImageProcessor
+
+        processor = AutoImageProcessor.from_pretrained(model_name)
+        try:
+            preprocessor = cls.from_hf(processor)
+        except ValueError as e:
+            print(f"Using the HF image processor for {model_name}: {e}")
+            return HFPreprocessor(processor)
+        if validate:
+            diff = preprocessor.max_abs_diff(processor)
+            if diff > VALIDATION_ATOL:
+                print(f"WARNING: preprocessing differs from the HF image processor for {model_name} "
+                      f"(max |diff| {diff:.2e}); using the HF processor")
+                return HFPreprocessor(processor)
+        return preprocessor
+
+    def max_abs_diff(self, hf_processor, images=None) -> float:
+        """Largest |difference| to hf_processor on images (default: probe images, incl. non-RGB)."""
+        if images is None:
+            images = _probe_images()
+        ours = self(images)
+        theirs = hf_processor(images=images, return_tensors="pt")["pixel_values"]
+        return (ours.double() - theirs.double()).abs().max().item()
+
+    def _affine_for(self, device, dtype):
+        key = (str(device), dtype)
+        if key not in self._affine:
+            self._affine[key] = (self._scale.to(device=device, dtype=dtype),
+                                 self._shift.to(device=device, dtype=dtype))
+        return self._affine[key]
+
+    def __call__(self, images, device="cpu", dtype=torch.float32) -> torch.Tensor:
+        """pixel_values (N, 3, H, W) on device, in dtype.
+
+        Args:
+            images: PIL images (any mode) or (H, W, 3) uint8 arrays
+        """
+        device = torch.device(device)
+        height, width = self.size["height"], self.size["width"]
+        staging = torch.empty((len(images), height, width, 3), dtype=torch.uint8,
+                              pin_memory=device.type == "cuda")
+        batch = staging.numpy()
+        for i, image in enumerate(images):
+            if isinstance(image, np.ndarray):
+                image = Image.fromarray(image)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            if image.size != (width, height):
+                image = image.resize((width, height), self.resample)
+            batch[i] = np.asarray(image)
+
+        pixel_values = torch.empty((len(images), 3, height, width), dtype=dtype, device=device)
+        pixel_values.copy_(staging.to(device, non_blocking=True).permute(0, 3, 1, 2))
+        scale, shift = self._affine_for(device, dtype)
+        return pixel_values.mul_(scale).add_(shift)
+
+
+class HFPreprocessor:
+    """The HF image processor behind SiglipPreprocessor's call signature."""
+
+    def __init__(self, processor):
+        self.processor = processor
+        self.size = processor.size
+
+    def __call__(self, images, device="cpu", dtype=torch.float32) -> torch.Tensor:
+        pixel_values = self.processor(images=images, return_tensors="pt")["pixel_values"]
+        return pixel_values.to(device=device, dtype=dtype)
+
+
+def _probe_images() -> list:
+    """Small deterministic images covering down- and upscaling, odd sizes and non-RGB modes."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:301, 0:517]
+    smooth = np.stack([xx * 255 / 516, yy * 255 / 300, (xx + yy) % 256], axis=-1).astype(np.uint8)
+    noisy = rng.integers(0, 256, size=(97, 131, 3), dtype=np.uint8)
+    return [Image.fromarray(smooth), Image.fromarray(noisy), Image.fromarray(smooth).convert("L"),
+            Image.fromarray(noisy).convert("RGBA")]
@@ -0,0 +1,467 @@
+"""Hyperparameter sweep with successive halving over cached embeddings.
+
+Every configuration starts on a small budget. After each rung only the best
+1/eta are kept, and the survivors are re-trained with eta times more budget
+until the full budget is reached:
+
+  - logistic / mlp / deep: budget = fraction of the training set (nested
+    stratified subsets, so a larger rung always contains the smaller one)
+  - xgboost: budget = fraction of the boosting rounds on the full data
+
+The embeddings are written once to .npy files and memory-mapped by each
+worker (see src/utils/parallel.py), so a process pool does not copy them per
+trial. Deep configs at the same rung are trained together as one batched
+grid (src/model/batched_heads.py), split over the workers. Everything runs on
+CPU and offline.
+
+Usage:
+    from src.model.sweep import run_sweep
+    result = run_sweep(X_train, y_train, models=["logistic", "xgboost"], n_workers=4)
+    result["leaderboard"][0]  # best configuration
+"""
+
+import itertools
+import json
+import math
+import shutil
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from src.utils.parallel import (
+    attach_array,
+    default_workers,
+    limit_worker_threads,
+    release_arrays,
+    share_array,
+)
+
+# Default grids per model family. Keys are passed straight to the estimator
+# (SklearnClassifier params / DeepClassifier kwargs).
+DEFAULT_SEARCH_SPACE = {
+    "logistic": {
+        "C": [0.01, 0.1, 1.0, 10.0],
+    },
+    "mlp": {
+        "hidden_layer_sizes": [(128,), (256,), (512,)],
+        "alpha": [1e-4, 1e-3],
+    },
+    "xgboost": {
+        "max_depth": [3, 4, 6],
+        "learning_rate": [0.05, 0.1],
+        "min_child_weight": [1, 3],
+    },
+    "deep": {
+        "hidden_dim": [128, 256, 512],
+        "dropout": [0.2, 0.4],
+        "lr": [1e-3, 3e-4],
+    },
+}
+
+RANK_METRIC = "f1_macro"  # same primary metric as compare_models
+
+
+def expand_grid(search_space: dict, models=None):
+    """Cartesian product of each model's grid -> list of {"model", "params"}."""
+    configs = []
+    for model in models or search_space:
+        grid = search_space.get(model, {})
+        keys = list(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            configs.append({"model": model, "params": dict(zip(keys, values))})
+    return configs
+
+
+def config_name(config: dict) -> str:
+    """Stable readable name, e.g. 'xgboost[learning_rate=0.05,max_depth=4]'."""
+    params = ",".join(f"{k}={_fmt(v)}" for k, v in sorted(config["params"].items()))
+    return f"{config['model']}[{params}]" if params else config["model"]
+
+
+def _fmt(value):
+    if isinstance(value, (list, tuple)):
+        return "x".join(str(v) for v in value)
+    return str(value)
+
+
+def budget_schedule(min_budget: float, eta: int):
+    """Budgets per rung: min_budget, min_budget*eta, ... capped at 1.0."""
+    if not 0 < min_budget <= 1:
+        raise ValueError(f"min_budget must be in (0, 1], got {min_budget}")
+    n_rungs = int(math.floor(math.log(1.0 / min_budget, eta) + 1e-9)) + 1
+    budgets = [min(1.0, min_budget * eta ** r) for r in range(n_rungs)]
+    if budgets[-1] < 1.0:
+        budgets.append(1.0)
+    return budgets
+
+
+def nested_subset_order(labels, seed: int = 42):
+    """Permutation whose every prefix is (approximately) class-stratified.
+
+    Taking order[:k] for a growing k gives nested training subsets with the
+    full-data class ratio, which is what successive halving rungs train on.
+    """
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    keys = np.empty(len(labels))
+    for cls in np.unique(labels):
+        idx = np.flatnonzero(labels == cls)
+        rng.shuffle(idx)
+        # Spread each class evenly over [0, 1) so any prefix keeps the ratio
+        keys[idx] = (np.arange(len(idx)) + rng.random()) / len(idx)
+    return np.argsort(keys, kind="stable")
+
+
+def build_model(config: dict, budget: float = 1.0, embedding_dim: int = 1152, n_jobs: int = 1):
+    """Instantiate the classifier for a config at a given budget."""
+    model, params = config["model"], dict(config["params"])
+    if model in ("logistic", "mlp"):
+        from src.model.classifier import SklearnClassifier
+        return SklearnClassifier(classifier_type=model, params=params)
+    if model == "xgboost":
+        from src.model.classifier import SklearnClassifier
+        n_estimators = params.pop("n_estimators", 500)
+        params["n_estimators"] = max(10, int(round(n_estimators * budget)))
+        params["n_jobs"] = n_jobs
+        return SklearnClassifier(classifier_type="xgboost", params=params)
+    if model == "deep":
+        from src.model.deep_classifier import DeepClassifier
+        return DeepClassifier(embedding_dim=embedding_dim, device="cpu", **params)
+    raise ValueError(f"Unknown model type: {model}")
+
+
+def _score(y_true, y_pred, y_proba):
+    from sklearn.metrics import accuracy_score, balanced_accuracy_score, f1_score, roc_auc_score
+
+    metrics = {
+        "test_accuracy": float(accuracy_score(y_true, y_pred)),
+        "balanced_accuracy": float(balanced_accuracy_score(y_true, y_pred)),
+        "f1_macro": float(f1_score(y_true, y_pred, average="macro", zero_division=0)),
+        "f1_binary": float(f1_score(y_true, y_pred, pos_label=1, zero_division=0)),
+        "auc": float("nan"),
+    }
+    if y_proba is not None and len(np.unique(y_true)) == 2:
+        try:
+            metrics["auc"] = float(roc_auc_score(y_true, np.asarray(y_proba)[:, 1]))
+        except ValueError:
+            pass
+    return metrics
+
+
+def _fit_data(task: dict, model: str, budget: float):
+    """(X, y, sample_weight) of a trial's training subset at a budget."""
+    X = attach_array(task["X_train"])
+    y = attach_array(task["y_train"])
+    order = attach_array(task["order"])
+    sw = attach_array(task["sample_weight"]) if task.get("sample_weight") else None
+
+    if model == "xgboost":
+        idx = np.sort(order)  # budget goes to boosting rounds, not data
+    else:
+        n = max(task.get("min_samples", 50), int(round(budget * len(order))))
+        idx = np.sort(order[:min(n, len(order))])
+    return np.asarray(X[idx]), np.asarray(y[idx]), (np.asarray(sw[idx]) if sw is not None else None)
+
+
+def _run_trial(task: dict) -> dict:
+    """Worker: train one config at one budget and score it on the validation set."""
+    config, budget = task["config"], task["budget"]
+    record = {"name": config_name(config), "budget": budget}
+    try:
+        X_fit, y_fit, sw_fit = _fit_data(task, config["model"], budget)
+
+        clf = build_model(config, budget, embedding_dim=X_fit.shape[1], n_jobs=task.get("threads", 1))
+        start = time.time()
+        clf.fit(X_fit, y_fit, sample_weight=sw_fit)
+        record["fit_seconds"] = round(time.time() - start, 3)
+
+        X_val, y_val = np.asarray(attach_array(task["X_val"])), np.asarray(attach_array(task["y_val"]))
+        val_out = clf.predict_all(X_val)
+        y_pred, y_proba = val_out["pred"], val_out.get("proba")
+        record.update(_score(y_val, y_pred, y_proba))
+        record["n_train"] = int(len(y_fit))
+    except Exception as exc:
+        record["error"] = f"{type(exc).__name__}: {exc}"
+        record["traceback"] = traceback.format_exc(limit=3)
+    return record
+
+
+def _run_head_grid(task: dict) -> list:
+    """Worker: train several deep configs at one budget as one batched grid; a record per config.
+
+    fit_seconds is the batched fit time divided by the number of configs.
+    """
+    from src.model.batched_heads import DEFAULT_HEAD_CONFIG, fit_head_grid
+
+    configs, budget = task["configs"], task["budget"]
+    records = [{"name": config_name(c), "budget": budget} for c in configs]
+    try:
+        X_fit, y_fit, sw_fit = _fit_data(task, "deep", budget)
+        heads = [{k: v for k, v in c["params"].items() if k in DEFAULT_HEAD_CONFIG} for c in configs]
+        shared = {k: v for k, v in configs[0]["params"].items() if k not in DEFAULT_HEAD_CONFIG}
+        start = time.time()
+        classifiers = fit_head_grid(X_fit, y_fit, heads, sample_weight=sw_fit, device="cpu", **shared)
+        fit_seconds = round((time.time() - start) / len(configs), 3)
+
+        X_val, y_val = np.asarray(attach_array(task["X_val"])), np.asarray(attach_array(task["y_val"]))
+        for record, clf in zip(records, classifiers):
+            val_out = clf.predict_all(X_val)
+            record["fit_seconds"] = fit_seconds
+            record.update(_score(y_val, val_out["pred"], val_out.get("proba")))
+            record["n_train"] = int(len(y_fit))
+            record["batched_with"] = len(configs)
+    except Exception as exc:
+        for record in records:
+            record["error"] = f"{type(exc).__name__}: {exc}"
+            record["traceback"] = traceback.format_exc(limit=3)
+    return records
+
+
+def _rung_tasks(tasks_base: dict, state: dict, alive: list, budget: float, threads: int, n_workers: int):
+    """[(worker fn, task, names)] for one rung.
+
+    Deep configs that only differ in per-head settings (seed, dropout, lr)
+    are grouped into batched grids, split over the workers; every other
+    config is a trial of its own. hidden_dim stays part of the group key:
+    a grid zero-pads narrower heads to its widest one, wasting their compute.
+    """
+    from src.model.batched_heads import DEFAULT_HEAD_CONFIG
+
+    base = {**tasks_base, "budget": budget, "threads": threads}
+    tasks, deep_groups = [], {}
+    for name in alive:
+        config = state[name]["config"]
+        if config["model"] == "deep":
+            shared = {k: v for k, v in config["params"].items() if k not in DEFAULT_HEAD_CONFIG}
+            shared["hidden_dim"] = config["params"].get("hidden_dim")
+            deep_groups.setdefault(json.dumps(shared, sort_keys=True, default=str), []).append(name)
+        else:
+            tasks.append((_run_trial, {**base, "config": config}, [name]))
+    for names in deep_groups.values():
+        n_chunks = min(n_workers, len(names))
+        for chunk in np.array_split(np.array(names, dtype=object), n_chunks):
+            chunk = list(chunk)
+            tasks.append((_run_head_grid, {**base, "configs": [state[n]["config"] for n in chunk]}, chunk))
+    return tasks
+
+
+def successive_halving(tasks_base: dict, configs: list, budgets: list, eta: int,
+                       n_workers: int, threads_per_worker: int = 1, metric: str = RANK_METRIC):
+    """Run the rungs. Returns {name: {"config", "history", "rung"}}."""
+    state = {config_name(c): {"config": c, "history": [], "rung": -1} for c in configs}
+    alive = list(state)
+
+    executor = None
+    if n_workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=get_context("spawn"),
+            initializer=limit_worker_threads,
+            initargs=(threads_per_worker,),
+        )
+
+    try:
+        for rung, budget in enumerate(budgets):
+            print(f"  Rung {rung}: {len(alive)} configs at budget {budget:.3f}")
+            tasks = _rung_tasks(tasks_base, state, alive, budget, threads_per_worker, n_workers)
+            if executor:
+                futures = [executor.submit(fn, task) for fn, task, _ in tasks]
+                outputs = [f.result() for f in futures]
+            else:
+                outputs = [fn(task) for fn, task, _ in tasks]
+            by_name = {}
+            for (fn, _, names), output in zip(tasks, outputs):
+                by_name.update(zip(names, output if fn is _run_head_grid else [output]))
+            records = [by_name[name] for name in alive]
+
+            for name, record in zip(alive, records):
+                state[name]["history"].append(record)
+                state[name]["rung"] = rung
+                if "error" in record:
+                    print(f"    {name}: FAILED ({record['error']})")
+
+            ok = [n for n, r in zip(alive, records) if "error" not in r]
+            ok.sort(key=lambda n: _rank_value(state[n]["history"][-1], metric), reverse=True)
+            if rung == len(budgets) - 1:
+                break
+            n_keep = max(1, len(ok) // eta)
+            alive = ok[:n_keep]
+            best = state[alive[0]]["history"][-1] if alive else None
+            if best is not None:
+                print(f"    kept {len(alive)}; best so far {alive[0]} {metric}={best[metric]:.3f}")
+            if not alive:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return state
+
+
+def _rank_value(record: dict, metric: str) -> float:
+    value = record.get(metric, float("nan"))
+    return -math.inf if value is None or math.isnan(value) else value
+
+
+def build_leaderboard(state: dict, metric: str = RANK_METRIC):
+    """Rank configs: furthest rung reached first, then metric at that rung."""
+    rows = []
+    for name, entry in state.items():
+        history = [r for r in entry["history"] if "error" not in r]
+        last = history[-1] if history else (entry["history"][-1] if entry["history"] else {})
+        row = {
+            "name": name,
+            "model": entry["config"]["model"],
+            "params": entry["config"]["params"],
+            "rung": len(history) - 1,  # last rung it completed successfully
+            "budget": last.get("budget"),
+            "history": entry["history"],
+        }
+        row.update({k: v for k, v in last.items() if k not in ("name", "budget", "traceback")})
+        rows.append(row)
+
+    rows.sort(key=lambda r: (r["rung"], _rank_value(r, metric)), reverse=True)
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+    return rows
+
+
+def run_sweep(
+    X_train,
+    y_train,
+    X_val=None,
+    y_val=None,
+    sample_weight=None,
+    models=None,
+    search_space: dict = None,
+    eta: int = 3,
+    min_budget: float = 1 / 9,
+    n_workers: int = None,
+    threads_per_worker: int = 1,
+    seed: int = 42,
+    metric: str = RANK_METRIC,
+    work_dir=None,
+    output_path=None,
+):
+    """Successive-halving sweep over model families and hyperparameters.
+
+    Args:
+        X_train, y_train: training embeddings (N, D) and labels
+        X_val, y_val: validation set; if omitted a stratified 15% is held out
+        sample_weight: optional per-sample training weights
+        models: model families to include (default: every family in the search space)
+        search_space: {model: {param: [values]}} (default: DEFAULT_SEARCH_SPACE)
+        eta: keep the top 1/eta of configs per rung and grow the budget by eta
+        min_budget: budget of the first rung (fraction of data or boosting rounds)
+        n_workers: process pool size (default: one per CPU; 1 runs inline)
+        threads_per_worker: BLAS/OpenMP/torch threads per worker
+        seed: seed for the validation split and nested subsets
+        metric: ranking metric (default f1_macro, as in compare_models)
+        work_dir: where the shared .npy arrays are written (default: temp dir)
+        output_path: optional leaderboard JSON path
+
+    Returns:
+        dict with model_results / comparison (compare_models format),
+        leaderboard (ranked list) and sweep settings
+    """
+    from src.evaluation.metrics import compare_models
+
+    X_train = X_train.numpy() if hasattr(X_train, "numpy") else np.asarray(X_train)
+    y_train = np.asarray(y_train)
+    if sample_weight is not None:
+        sample_weight = np.asarray(sample_weight, dtype=np.float32)
+
+    if X_val is None or y_val is None:
+        from sklearn.model_selection import train_test_split
+        idx_train, idx_val = train_test_split(
+            np.arange(len(y_train)), test_size=0.15, random_state=seed, stratify=y_train
+        )
+        X_val, y_val = X_train[idx_val], y_train[idx_val]
+        X_train, y_train = X_train[idx_train], y_train[idx_train]
+        if sample_weight is not None:
+            sample_weight = sample_weight[idx_train]
+    X_val = X_val.numpy() if hasattr(X_val, "numpy") else np.asarray(X_val)
+    y_val = np.asarray(y_val)
+
+    search_space = search_space or DEFAULT_SEARCH_SPACE
+    configs = expand_grid(search_space, models)
+    if not configs:
+        raise ValueError("Sweep has no configurations (check models / search_space)")
+    budgets = budget_schedule(min_budget, eta)
+    n_workers = n_workers or default_workers(len(configs))
+
+    print(f"  Sweep: {len(configs)} configs, rungs {[round(b, 3) for b in budgets]}, "
+          f"{n_workers} worker(s) x {threads_per_worker} thread(s)")
+
+    # Write the arrays once; workers memory-map them
+    own_dir = work_dir is None
+    work_dir = Path(work_dir or tempfile.mkdtemp(prefix="skintag_sweep_"))
+    try:
+        tasks_base = {
+            "X_train": share_array(X_train, work_dir, "X_train"),
+            "y_train": share_array(y_train, work_dir, "y_train"),
+            "X_val": share_array(X_val, work_dir, "X_val"),
+            "y_val": share_array(y_val, work_dir, "y_val"),
+            "order": share_array(nested_subset_order(y_train, seed), work_dir, "order"),
+            "sample_weight": share_array(sample_weight, work_dir, "sample_weight") if sample_weight is not None else None,
+        }
+        start = time.time()
+        state = successive_halving(tasks_base, configs, budgets, eta, n_workers, threads_per_worker, metric)
+        elapsed = time.time() - start
+
+        leaderboard = build_leaderboard(state, metric)
+        final_rung = len(budgets) - 1
+        model_results = {
+            row["name"]: {k: row[k] for k in ("test_accuracy", "balanced_accuracy", "f1_macro", "f1_binary", "auc")}
+            for row in leaderboard
+            if row["rung"] == final_rung and "error" not in row
+        }
+
+        result = {
+            "model_results": model_results,
+            "comparison": compare_models(model_results) if model_results else None,
+            "leaderboard": leaderboard,
+            "sweep": {
+                "n_configs": len(configs),
+                "n_trials": sum(len(e["history"]) for e in state.values()),
+                "budgets": budgets,
+                "eta": eta,
+                "metric": metric,
+                "n_workers": n_workers,
+                "threads_per_worker": threads_per_worker,
+                "n_train": int(len(y_train)),
+                "n_val": int(len(y_val)),
+                "elapsed_seconds": round(elapsed, 2),
+            },
+        }
+    finally:
+        release_arrays()
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if output_path is not None:
+        save_leaderboard(result, output_path)
+    return result
+
+
+def save_leaderboard(result: dict, output_path):
+    """Write the sweep result as JSON (tuples/numpy values converted)."""
+    def convert(obj):
+        if isinstance(obj, np.integer):
+            return int(obj)
+        if isinstance(obj, np.floating):
+            return float(obj)
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return obj
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(json.loads(json.dumps(result, default=convert)), f, indent=2)
+    return output_path
@@ -72,8 +72,8 @@ def download_e2e_model_from_hf(
 
     Downloads all model files and returns the directory path.
 
-    v1 (main/v1-original): config.json, model_state.pt, head_state.pt
-    v2 (v2-field-augmented): v2/config.json, v2/siglip_finetuned.pt, v2/classifiers/*
+    v1 (main/v1-original): config.json, model.safetensors or model_state.pt, head weights
+    v2 (v2-field-augmented): v2/config.json, v2/siglip_finetuned.{safetensors,pt}, v2/classifiers/*
 
     Args:
         repo_id: Hugging Face repository ID (e.g., "skintaglabs/siglip-skin-lesion-classifier")
@@ -93,8 +93,8 @@ def download_e2e_model_from_hf(
         # v2 stores everything under the v2/ prefix
         patterns = ["v2/*"]
     else:
-        # v1 stores model files at the repo root
-        patterns = ["config.json", "model_state.pt", "head_state.pt"]
+        # v1 stores model files at the repo root; prefer safetensors weights
+        patterns = ["config.json", "model.safetensors", "head.safetensors"]
 
     model_dir = snapshot_download(
         repo_id=repo_id,
@@ -103,6 +103,14 @@ def download_e2e_model_from_hf(
         token=_get_token(token),
         allow_patterns=patterns,
     )
+    if not is_v2 and not (Path(model_dir) / "model.safetensors").exists():
+        model_dir = snapshot_download(
+            repo_id=repo_id,
+            revision=revision,
+            cache_dir=str(_get_cache_dir(cache_subdir)),
+            token=_get_token(token),
+            allow_patterns=["config.json", "model_state.pt", "head_state.pt"],
+        )
 
     print(f"Model downloaded to: {model_dir}")
     return Path(model_dir)
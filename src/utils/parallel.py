@@ -0,0 +1,131 @@
+"""Process-pool helpers for CPU-bound work over cached embeddings.
+
+Large arrays are written once to a .npy file and memory-mapped read-only by
+each worker, so N workers share one copy of the embeddings in the page cache
+instead of pickling it N times. Workers also cap their BLAS/OpenMP/torch
+threads so a pool of N processes does not oversubscribe the machine.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+_THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def default_workers(n_tasks: int = None) -> int:
+    """Number of pool workers to use: one per CPU, never more than there are tasks."""
+    n = os.cpu_count() or 1
+    if n_tasks is not None:
+        n = min(n, max(1, n_tasks))
+    return max(1, n)
+
+
+def share_array(array, directory=None, name: str = "array") -> str:
+    """Write an array to a .npy file that workers can memory-map.
+
+    Args:
+        array: numpy array or torch tensor
+        directory: where to write (default: a fresh temp directory)
+        name: file stem
+
+    Returns:
+        Path to the .npy file (pass this, not the array, to workers)
+    """
+    if hasattr(array, "numpy"):
+        array = array.detach().cpu().numpy()
+    directory = Path(directory or tempfile.mkdtemp(prefix="skintag_shm_"))
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.npy"
+    np.save(path, np.ascontiguousarray(array))
+    return str(path)
+
+
+_attached = {}
+
+
+def attach_array(path: str) -> np.ndarray:
+    """Memory-map a shared array read-only (cached per process)."""
+    if path not in _attached:
+        _attached[path] = np.load(path, mmap_mode="r")
+    return _attached[path]
+
+
+def share_object(obj, directory=None, name: str = "object") -> str:
+    """Pickle a small non-array object (e.g. a metadata DataFrame) for workers."""
+    import pickle
+
+    directory = Path(directory or tempfile.mkdtemp(prefix="skintag_shm_"))
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.pkl"
+    with open(path, "wb") as f:
+        pickle.dump(obj, f)
+    return str(path)
+
+
+def attach_object(path: str):
+    """Load a shared pickled object (cached per process)."""
+    import pickle
+
+    if path not in _attached:
+        with open(path, "rb") as f:
+            _attached[path] = pickle.load(f)
+    return _attached[path]
+
+
+def release_arrays():
+    """Drop this process's cached memory maps and objects (before deleting the files)."""
+    _attached.clear()
+
+
+def limit_worker_threads(n_threads: int = 1):
+    """Cap native thread pools in a worker process (use as a pool initializer)."""
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(n_threads)
+    except ImportError:
+        pass
+    try:
+        import torch
+        torch.set_num_threads(n_threads)
+    except ImportError:
+        pass
+
+
+def split_threads(weights: dict, total: int = None) -> dict:
+    """Divide a thread budget between concurrent tasks in proportion to their weights.
+
+    Every task gets at least one thread; the rest of `total` (default: all
+    CPUs) goes to the heaviest tasks first, so e.g. XGBoost and torch running
+    side by side do not each assume they own the whole machine.
+
+    Args:
+        weights: task name -> relative CPU appetite (> 0)
+        total: threads to hand out
+
+    Returns:
+        task name -> thread count
+    """
+    total = max(total or os.cpu_count() or 1, len(weights))
+    weight_sum = sum(weights.values()) or 1
+    threads = {name: max(1, int(total * w / weight_sum)) for name, w in weights.items()}
+    spare = total - sum(threads.values())
+    while spare < 0:  # the one-thread minimum overshot: trim the largest shares
+        name = max(threads, key=threads.get)
+        threads[name] -= 1
+        spare += 1
+    for name in sorted(weights, key=weights.get, reverse=True):
+        if spare <= 0:
+            break
+        threads[name] += 1
+        spare -= 1
+    return threads
@@ -0,0 +1,286 @@
+"""Opt-in operator-level profiling for extraction, fine-tuning and serving.
+
+Off by default. Enable with the SKINTAG_PROFILE environment variable (or
+`run_pipeline.py --profile`):
+
+    SKINTAG_PROFILE=1                     # every instrumented loop
+    SKINTAG_PROFILE=extract,finetune      # only these (extract, finetune, analyze)
+
+A BatchProfiler skips `wait` batches, warms up for `warmup` more, then records
+`active` batches with the torch profiler while a sampler thread collects the
+Python stacks of the profiled thread. Batches are steps of the instrumented
+loop (extraction batches, fine-tuning steps, /api/analyze requests). Window
+and output settings come from the environment:
+
+    SKINTAG_PROFILE_STEPS=wait,warmup,active   (default 2,1,5)
+    SKINTAG_PROFILE_TOP=30                      rows in the operator tables
+    SKINTAG_PROFILE_DIR=results/profiles
+    SKINTAG_PROFILE_INTERVAL_MS=5               Python sampling interval
+
+Each window writes, under SKINTAG_PROFILE_DIR:
+
+    <name>_<timestamp>.trace.json   Chrome trace (chrome://tracing, Perfetto)
+    <name>_<timestamp>_ops.txt      top-N operators by self CPU (and CUDA) time
+    <name>_<timestamp>_python.txt   top-N Python functions by sampled time
+
+Code regions are labelled with region("decode") etc., and attention / MLP
+submodules of a model are labelled by class name, so the tables separate
+image decoding, preprocessing, attention and MLP time.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+PROFILE_TARGETS = ("extract", "finetune", "analyze")
+
+# Submodules labelled in traces (matched against the end of the class name)
+_LABELLED_MODULES = ("Attention", "MLP")
+
+
+def profiling_enabled(name: str) -> bool:
+    """True if SKINTAG_PROFILE selects this target."""
+    value = os.getenv("SKINTAG_PROFILE", "").strip().lower()
+    if value in ("", "0", "false", "off", "no"):
+        return False
+    if value in ("1", "true", "on", "yes", "all"):
+        return True
+    return name in {v.strip() for v in value.split(",")}
+
+
+def _window_from_env():
+    try:
+        wait, warmup, active = (int(v) for v in os.getenv("SKINTAG_PROFILE_STEPS", "2,1,5").split(","))
+    except ValueError:
+        print("  SKINTAG_PROFILE_STEPS must be 'wait,warmup,active'; using 2,1,5")
+        wait, warmup, active = 2, 1, 5
+    return max(0, wait), max(0, warmup), max(1, active)
+
+
+class _StackSampler:
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.n_samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.n_samples += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                key = f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+                if leaf:
+                    self.self_counts[key] += 1
+                    leaf = False
+                if key not in seen:
+                    self.total_counts[key] += 1
+                    seen.add(key)
+                frame = frame.f_back
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="skintag-stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def table(self, top_n: int) -> str:
+        if not self.n_samples:
+            return "No Python samples collected.\n"
+        ms = self.interval * 1000
+        lines = [f"{self.n_samples} samples every {ms:.0f} ms "
+                 f"(~{self.n_samples * self.interval:.2f}s of the profiled thread)\n",
+                 f"{'self %':>7} {'total %':>8}  function"]
+        ranked = sorted(self.total_counts, key=lambda k: (self.self_counts[k], self.total_counts[k]), reverse=True)
+        for key in ranked[:top_n]:
+            total = self.total_counts[key]
+            lines.append(f"{100 * self.self_counts[key] / self.n_samples:>6.1f}% "
+                         f"{100 * total / self.n_samples:>7.1f}%  {key}")
+        return "\n".join(lines) + "\n"
+
+
+class BatchProfiler:
+    """Profile a window of batches of a loop; a no-op unless enabled.
+
+    Usage:
+        profiler = BatchProfiler("extract", model=vision_model)
+        with profiler:
+            for batch in batches:
+                with profiler.region("decode"):
+                    ...
+                profiler.step()
+
+    For code without one enclosing loop (a web handler), call start() once,
+    step() after each request and stop() when `done` becomes True.
+    """
+
+    def __init__(self, name: str, enabled: bool = None, model=None,
+                 wait: int = None, warmup: int = None, active: int = None,
+                 top_n: int = None, output_dir=None, sample_interval: float = None):
+        """
+        Args:
+            name: target name (extract, finetune, analyze); prefixes output files
+            enabled: force on/off (default: SKINTAG_PROFILE selects it)
+            model: optional nn.Module whose attention / MLP blocks are labelled
+            wait, warmup, active: batch window (default: SKINTAG_PROFILE_STEPS)
+            top_n: rows in the tables (default: SKINTAG_PROFILE_TOP or 30)
+            output_dir: default SKINTAG_PROFILE_DIR or results/profiles
+            sample_interval: Python sampling interval in seconds
+        """
+        self.name = name
+        self.enabled = profiling_enabled(name) if enabled is None else enabled
+        self.model = model
+        env_wait, env_warmup, env_active = _window_from_env()
+        self.wait = env_wait if wait is None else wait
+        self.warmup = env_warmup if warmup is None else warmup
+        self.active = env_active if active is None else active
+        self.top_n = top_n or int(os.getenv("SKINTAG_PROFILE_TOP", "30"))
+        self.output_dir = Path(output_dir or os.getenv("SKINTAG_PROFILE_DIR", PROJECT_ROOT / "results" / "profiles"))
+        self.sample_interval = sample_interval or float(os.getenv("SKINTAG_PROFILE_INTERVAL_MS", "5")) / 1000
+        self.outputs = []
+        self._profiler = None
+        self._sampler = None
+        self._hooks = []
+        self._steps = 0
+        self._done = False
+
+    @property
+    def done(self) -> bool:
+        """True once the recording window has been exported (or when disabled)."""
+        return not self.enabled or self._done
+
+    def region(self, label: str):
+        """Label a code region in the trace (nullcontext when not recording)."""
+        if self._profiler is None:
+            return nullcontext()
+        import torch
+        return torch.profiler.record_function(label)
+
+    def start(self):
+        if not self.enabled or self._done or self._profiler is not None:
+            return self
+        import torch
+        from torch.profiler import ProfilerActivity, profile, schedule
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        self._profiler = profile(
+            activities=activities,
+            schedule=schedule(wait=self.wait, warmup=self.warmup, active=self.active, repeat=1),
+            on_trace_ready=self._export,
+            record_shapes=True,
+            with_stack=False,
+        )
+        self._label_modules()
+        self._sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+        self._profiler.start()
+        if self.wait + self.warmup == 0:
+            self._sampler.start()
+        print(f"  [profile] {self.name}: recording batches {self.wait + self.warmup + 1}-"
+              f"{self.wait + self.warmup + self.active} -> {self.output_dir}")
+        return self
+
+    def step(self):
+        """Mark the end of one batch."""
+        if self._profiler is None:
+            return
+        self._steps += 1
+        if self._steps == self.wait + self.warmup:
+            self._sampler.start()
+        last = self._steps >= self.wait + self.warmup + self.active
+        if last:
+            self._sampler.stop()  # before export, so the export itself is not sampled
+        self._profiler.step()  # the last step closes the window and exports it
+        if last:
+            self.stop()
+
+    def stop(self):
+        """Finish profiling; exports whatever part of the window was recorded."""
+        if self._profiler is None:
+            return
+        profiler, self._profiler = self._profiler, None
+        if self._steps <= self.wait + self.warmup:
+            print(f"  [profile] {self.name}: only {self._steps} batches, window never opened; nothing exported")
+            self._done = True  # also suppresses _export below
+        self._sampler.stop()  # before export, so the export itself is not sampled
+        profiler.stop()  # exports a partially recorded window
+        for handle in self._hooks:
+            handle.remove()
+        self._hooks = []
+        self._done = True
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _label_modules(self):
+        """Wrap attention / MLP submodules in record_function ranges named by class."""
+        if self.model is None:
+            return
+        import torch
+
+        def pre_hook(module, args):
+            label = torch.profiler.record_function(type(module).__name__)
+            label.__enter__()
+            module._skintag_profile_labels = getattr(module, "_skintag_profile_labels", []) + [label]
+
+        def post_hook(module, args, output):
+            labels = getattr(module, "_skintag_profile_labels", None)
+            if labels:
+                labels.pop().__exit__(None, None, None)
+
+        for module in self.model.modules():
+            if type(module).__name__.endswith(_LABELLED_MODULES):
+                self._hooks.append(module.register_forward_pre_hook(pre_hook))
+                self._hooks.append(module.register_forward_hook(post_hook))
+
+    def _export(self, prof):
+        if self._done:
+            return
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stem = self.output_dir / f"{self.name}_{time.strftime('%Y%m%d-%H%M%S')}"
+        n = 1
+        while stem.with_name(stem.name + ".trace.json").exists():
+            n += 1
+            stem = self.output_dir / f"{self.name}_{time.strftime('%Y%m%d-%H%M%S')}_{n}"
+        trace_path = stem.with_name(stem.name + ".trace.json")
+        ops_path = stem.with_name(stem.name + "_ops.txt")
+        python_path = stem.with_name(stem.name + "_python.txt")
+
+        prof.export_chrome_trace(str(trace_path))
+        averages = prof.key_averages()
+        with open(ops_path, "w") as f:
+            f.write(f"{self.name}: {self.active} batches after {self.wait} skipped + {self.warmup} warmup\n\n")
+            f.write(averages.table(sort_by="self_cpu_time_total", row_limit=self.top_n))
+            if any(getattr(e, "self_device_time_total", 0) for e in averages):
+                f.write("\n\nBy self CUDA time:\n")
+                f.write(averages.table(sort_by="self_cuda_time_total", row_limit=self.top_n))
+        with open(python_path, "w") as f:
+            f.write(self._sampler.table(self.top_n))
+
+        self.outputs = [trace_path, ops_path, python_path]
+        print(f"  [profile] {self.name}: wrote {trace_path.name}, {ops_path.name}, {python_path.name}")
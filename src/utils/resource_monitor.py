@@ -0,0 +1,341 @@
+"""Per-stage resource accounting for run_pipeline.py.
+
+StageMonitor wraps one pipeline stage and records wall time, CPU time (this
+process plus finished child processes such as DataLoader workers), resident
+memory at start / end / peak, bytes read and written, and throughput for the
+items the stage reports through note_items().
+
+Peak RSS on Linux comes from the kernel's high-water mark (VmHWM), reset at the
+start of each stage via /proc/self/clear_refs so the peak belongs to that stage
+rather than to the whole process. Where the reset is not permitted, a sampler
+thread polls RSS instead. I/O counts come from /proc/self/io: "read"/"written"
+are bytes passed through read()/write() (including page-cache hits), "disk" is
+what actually hit storage. Without /proc, memory falls back to ru_maxrss and
+I/O is omitted. Only the standard library is used.
+
+Records are written as results/cache/pipeline_profile.json for the current run
+and appended to pipeline_profile_history.jsonl so runs can be compared.
+
+memory_breakdown() splits a process's memory into unique and shared pages,
+which the multi-worker server (scripts/serve.py) reports per worker.
+"""
+
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+_MB = 1024 * 1024
+_PROC_SELF = Path("/proc/self")
+
+_active = []
+
+
+def _rss_bytes():
+    """Current resident set size, or None when /proc is unavailable."""
+    try:
+        with open(_PROC_SELF / "statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _hwm_bytes():
+    """Peak RSS since the last reset (VmHWM), or None."""
+    try:
+        with open(_PROC_SELF / "status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _reset_hwm() -> bool:
+    """Reset VmHWM to the current RSS (Linux >= 4.0); False if not permitted."""
+    try:
+        with open(_PROC_SELF / "clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _maxrss_bytes():
+    """Lifetime peak RSS of this process from getrusage (KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _io_counters() -> dict:
+    """rchar / wchar / read_bytes / write_bytes from /proc/self/io (empty if unavailable)."""
+    try:
+        with open(_PROC_SELF / "io") as f:
+            return {k: int(v) for k, v in (line.split(":") for line in f)}
+    except (OSError, ValueError):
+        return {}
+
+
+def _cpu_seconds() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _mb(n):
+    return round(n / _MB, 1) if n is not None else None
+
+
+class StageMonitor:
+    """Context manager recording the resources one stage used.
+
+    Usage:
+        with StageMonitor("4. Train Models") as mon:
+            train(...)          # may call note_items(n, "samples")
+        mon.record             # dict, see _finish()
+    """
+
+    def __init__(self, name: str, sample_interval: float = 0.05):
+        self.name = name
+        self.sample_interval = sample_interval
+        self.items = None
+        self.item_unit = None
+        self.record = None
+        self._stop = threading.Event()
+        self._sampler = None
+        self._sampled_peak = 0
+
+    def add_items(self, n: int, unit: str = "items"):
+        self.items = (self.items or 0) + int(n)
+        self.item_unit = unit
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            rss = _rss_bytes()
+            if rss is not None and rss > self._sampled_peak:
+                self._sampled_peak = rss
+
+    def __enter__(self):
+        self._rss_start = _rss_bytes()
+        self._maxrss_start = _maxrss_bytes()
+        self._hwm_reset = self._rss_start is not None and _reset_hwm()
+        if self._rss_start is not None and not self._hwm_reset:
+            self._sampled_peak = self._rss_start
+            self._sampler = threading.Thread(target=self._sample, name=f"rss-{self.name}", daemon=True)
+            self._sampler.start()
+        self._gpu = _gpu_reset()
+        self._io_start = _io_counters()
+        self._cpu_start = _cpu_seconds()
+        self._t0 = time.perf_counter()
+        _active.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._t0
+        cpu = _cpu_seconds() - self._cpu_start
+        io_end = _io_counters()
+        _active.remove(self)
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        self._finish(wall, cpu, io_end, failed=exc_type is not None)
+        return False
+
+    def _finish(self, wall, cpu, io_end, failed):
+        rss_end = _rss_bytes()
+        if self._hwm_reset:
+            peak, source = _hwm_bytes(), "vmhwm"
+        elif self._sampler is not None:
+            peak, source = max(self._sampled_peak, rss_end or 0), "sampled"
+        else:
+            # Lifetime peak only tells us something if it grew during this stage
+            maxrss = _maxrss_bytes()
+            peak, source = (maxrss, "ru_maxrss") if maxrss > self._maxrss_start else (None, None)
+
+        io = {k: io_end[k] - self._io_start.get(k, 0) for k in io_end}
+        self.record = {
+            "stage": self.name,
+            "status": "failed" if failed else "ok",
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(cpu, 3),
+            "cpu_utilization": round(cpu / wall, 2) if wall > 0 else None,
+            "rss_start_mb": _mb(self._rss_start),
+            "rss_end_mb": _mb(rss_end),
+            "peak_rss_mb": _mb(peak),
+            "peak_rss_source": source,
+            "io_read_mb": _mb(io.get("rchar")),
+            "io_write_mb": _mb(io.get("wchar")),
+            "disk_read_mb": _mb(io.get("read_bytes")),
+            "disk_write_mb": _mb(io.get("write_bytes")),
+            "items": self.items,
+            "item_unit": self.item_unit,
+            "items_per_second": round(self.items / wall, 2) if self.items and wall > 0 else None,
+        }
+        if self._gpu:
+            import torch
+            self.record["gpu_peak_mb"] = _mb(torch.cuda.max_memory_allocated())
+
+
+def memory_breakdown(pid="self"):
+    """Unique vs shared memory of a process from /proc/<pid>/smaps_rollup (bytes).
+
+    unique is what the process alone holds (private pages, freed if it exits);
+    shared is mapped by other processes too (forked copy-on-write pages,
+    memory-mapped weight files); pss charges shared pages proportionally, so
+    summing pss over processes gives their real combined footprint.
+    Returns None where smaps_rollup is unavailable (non-Linux, kernel < 4.14).
+    """
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except (OSError, ValueError):
+        return None
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "unique": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "anonymous": fields.get("Anonymous", 0),
+        "swap": fields.get("Swap", 0),
+    }
+
+
+def child_pids(pid) -> list:
+    """Direct children of a process (Linux), e.g. the workers of a preforking server."""
+    children = []
+    try:
+        for task in Path(f"/proc/{pid}/task").iterdir():
+            children.extend(int(c) for c in (task / "children").read_text().split())
+    except OSError:
+        pass
+    return children
+
+
+def _gpu_reset() -> bool:
+    """Reset the CUDA peak-memory counter if torch is already loaded with a GPU."""
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return False
+    torch.cuda.reset_peak_memory_stats()
+    return True
+
+
+def note_items(n: int, unit: str = "items"):
+    """Report work done by the running stage (used for items/sec)."""
+    if _active:
+        _active[-1].add_items(n, unit)
+
+
+def skipped_record(name: str, reason: str = "cached") -> dict:
+    """Profile entry for a stage that did not run."""
+    return {"stage": name, "status": reason, "wall_seconds": 0.0}
+
+
+def format_profile_table(records) -> str:
+    """Fixed-width table of stage records for the pipeline summary."""
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    lines = [f"    {'Stage':<35} {'wall s':>8} {'cpu s':>8} {'peak MB':>9} "
+             f"{'read MB':>9} {'write MB':>9} {'items/s':>9}"]
+    for r in records:
+        if r["status"] not in ("ok", "failed"):
+            lines.append(f"    {r['stage']:<35} {'(' + r['status'] + ')':>8}")
+            continue
+        lines.append(
+            f"    {r['stage']:<35} {r['wall_seconds']:>8.1f} {fmt(r.get('cpu_seconds'), '>8.1f')} "
+            f"{fmt(r.get('peak_rss_mb'), '>9.0f')} {fmt(r.get('io_read_mb'), '>9.0f')} "
+            f"{fmt(r.get('io_write_mb'), '>9.0f')} {fmt(r.get('items_per_second'), '>9.1f')}"
+            + (" FAILED" if r["status"] == "failed" else "")
+        )
+    return "\n".join(lines)
+
+
+def load_history(history_path, limit: int = 20) -> list:
+    """The most recent runs from a history file (oldest first)."""
+    history_path = Path(history_path)
+    if not history_path.exists():
+        return []
+    runs = []
+    with open(history_path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    runs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return runs[-limit:]
+
+
+# Absolute increase below which a change is treated as noise
+_REGRESSION_FLOOR = {"wall_seconds": 2.0, "peak_rss_mb": 64.0}
+
+
+def find_regressions(records, history, tolerance: float = 0.25, min_runs: int = 1,
+                     metrics=("wall_seconds", "peak_rss_mb")) -> list:
+    """Compare stages against the median of earlier runs.
+
+    Pass only comparable runs (same flags / sample size) as history. A stage regresses when a metric exceeds the historical median by more than
+    `tolerance` (relative) and by more than a small absolute floor (2 s, 64 MB),
+    so short stages do not flag scheduling noise. Skipped or failed runs are
+    ignored on both sides.
+
+    Returns:
+        list of dicts: stage, metric, value, baseline, change (relative), n_runs
+    """
+    import statistics
+
+    regressions = []
+    for r in records:
+        if r["status"] != "ok":
+            continue
+        past = [
+            s for run in history for s in run.get("stages", [])
+            if s["stage"] == r["stage"] and s.get("status") == "ok"
+        ]
+        if len(past) < min_runs:
+            continue
+        for metric in metrics:
+            values = [s[metric] for s in past if s.get(metric) is not None]
+            if not values or r.get(metric) is None:
+                continue
+            baseline = statistics.median(values)
+            if (baseline > 0 and r[metric] > baseline * (1 + tolerance)
+                    and r[metric] - baseline > _REGRESSION_FLOOR.get(metric, 0.0)):
+                regressions.append({
+                    "stage": r["stage"], "metric": metric, "value": r[metric],
+                    "baseline": baseline, "change": round(r[metric] / baseline - 1, 3),
+                    "n_runs": len(values),
+                })
+    return regressions
+
+
+def write_profile(records, profile_path, history_path=None, run_info: dict = None) -> dict:
+    """Write this run's profile and append it to the history file.
+
+    Returns:
+        the run dict that was written
+    """
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {"cpu_count": os.cpu_count(), "platform": sys.platform, "python": sys.version.split()[0]},
+        **(run_info or {}),
+        "stages": list(records),
+    }
+    profile_path = Path(profile_path)
+    profile_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(profile_path, "w") as f:
+        json.dump(run, f, indent=2)
+    if history_path is not None:
+        with open(history_path, "a") as f:
+            f.write(json.dumps(run) + "\n")
+    return run
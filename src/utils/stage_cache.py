@@ -0,0 +1,160 @@
+"""Fingerprinted stage cache for run_pipeline.py.
+
+Each pipeline stage declares what it depends on: config sections, extra
+parameters (e.g. --quick sample size), source files, input artifacts and the
+stages upstream of it. Its fingerprint is a hash of all of those. After a
+stage succeeds, its fingerprint and the digests of its outputs are recorded
+in results/cache/pipeline_state.json; a later --resume run skips every stage
+whose fingerprint still matches and whose outputs are still on disk, and
+resumes from the first stage that was invalidated.
+
+File digests are content hashes (sha256), memoized by (size, mtime) in the
+state file so large artifacts like embeddings.pt are only re-read when they
+actually change.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Records stage fingerprints and decides which stages can be skipped."""
+
+    def __init__(self, state_path, root, resume: bool = False, force=()):
+        """
+        Args:
+            state_path: JSON file holding recorded runs
+            root: project root; relative paths are resolved against it
+            resume: skip stages whose fingerprint matches a recorded run
+            force: stage names to re-run even when fresh
+        """
+        self.state_path = Path(state_path)
+        self.root = Path(root)
+        self.resume = resume
+        self.force = set(force or ())
+        self.state = {"stages": {}, "files": {}}
+        if self.state_path.exists():
+            try:
+                with open(self.state_path) as f:
+                    self.state = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                print(f"  Unreadable stage cache {self.state_path}, starting fresh")
+        self._fingerprints = {}
+
+    # -- digests --------------------------------------------------------
+
+    def _resolve(self, path) -> Path:
+        path = Path(path)
+        return path if path.is_absolute() else self.root / path
+
+    def file_digest(self, path) -> str:
+        """Content digest of a file (None if missing), memoized by size and mtime."""
+        path = self._resolve(path)
+        if not path.is_file():
+            return None
+        stat = path.stat()
+        key = str(path)
+        memo = self.state["files"].get(key)
+        if memo and memo["size"] == stat.st_size and memo["mtime_ns"] == stat.st_mtime_ns:
+            return memo["sha256"]
+        sha = _sha256_file(path)
+        self.state["files"][key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha}
+        return sha
+
+    def tree_digest(self, path, pattern: str = "*.py") -> dict:
+        """Digests of every file under a directory matching pattern (or of one file)."""
+        path = self._resolve(path)
+        if path.is_file():
+            return {path.name: self.file_digest(path)}
+        if not path.is_dir():
+            return {}
+        return {
+            str(p.relative_to(path)): self.file_digest(p)
+            for p in sorted(path.rglob(pattern))
+            if "__pycache__" not in p.parts
+        }
+
+    # -- fingerprints ---------------------------------------------------
+
+    def fingerprint(self, name: str, config: dict = None, params: dict = None,
+                    code=(), inputs=(), upstream=()) -> str:
+        """Fingerprint a stage from its declared dependencies.
+
+        Args:
+            name: stage name
+            config: the config sections the stage reads
+            params: other arguments (CLI flags) that change its output
+            code: source files / directories whose contents matter
+            inputs: input files (dataset manifests, upstream artifacts)
+            upstream: names of stages whose fingerprints feed into this one
+        """
+        payload = {
+            "stage": name,
+            "config": config or {},
+            "params": params or {},
+            "code": {str(c): self.tree_digest(c) for c in code},
+            "inputs": {str(p): self.file_digest(p) for p in inputs},
+            "upstream": {u: self._fingerprints.get(u) or self.recorded(u).get("fingerprint") for u in upstream},
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str).encode()
+        fp = hashlib.sha256(blob).hexdigest()[:16]
+        self._fingerprints[name] = fp
+        return fp
+
+    def recorded(self, name: str) -> dict:
+        return self.state["stages"].get(name, {})
+
+    def is_fresh(self, name: str, fingerprint: str, outputs=()) -> bool:
+        """True if --resume may skip this stage."""
+        if not self.resume or name in self.force:
+            return False
+        record = self.recorded(name)
+        if record.get("fingerprint") != fingerprint:
+            return False
+        return all(self._resolve(p).exists() for p in outputs)
+
+    def explain(self, name: str, fingerprint: str, outputs=()) -> str:
+        """Why a stage will run (for the log)."""
+        if not self.resume:
+            return "no --resume"
+        if name in self.force:
+            return "forced"
+        record = self.recorded(name)
+        if not record:
+            return "no recorded run"
+        if record.get("fingerprint") != fingerprint:
+            return "inputs, config or code changed"
+        missing = [str(p) for p in outputs if not self._resolve(p).exists()]
+        return f"missing outputs: {', '.join(missing)}" if missing else "fresh"
+
+    def record(self, name: str, fingerprint: str, outputs=(), elapsed: float = None):
+        """Record a successful run and persist the state file."""
+        self.state["stages"][name] = {
+            "fingerprint": fingerprint,
+            "completed": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+            "outputs": {str(p): self.file_digest(p) for p in outputs},
+        }
+        self.save()
+
+    def invalidate(self, name: str):
+        """Forget a stage's recorded run (e.g. after it failed)."""
+        if self.state["stages"].pop(name, None) is not None:
+            self.save()
+
+    def save(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        tmp.replace(self.state_path)
@@ -0,0 +1,173 @@
+"""Offline stand-ins for benchmarks: a tiny random SigLIP and synthetic lesion images.
+
+Nothing here touches the network. build_tiny_siglip() writes a randomly
+initialized SigLIP (same architecture family as
+google/siglip-so400m-patch14-384, just narrow and shallow) plus a matching
+image processor to a local directory that EmbeddingExtractor / AutoModel can
+load by path. synthetic_lesion_images() draws dermoscopy-like pictures: a
+skin-toned background with a darker, irregular, variegated blob, hair-like
+strokes and sensor noise, so JPEG decode, resizing and normalization do
+realistic work. The embeddings they produce are meaningless; only timings
+are.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+DEFAULT_TINY_DIR = PROJECT_ROOT / "results" / "benchmarks" / "tiny_siglip"
+
+# Vision tower defaults: 6x6 patches, 2 layers, 64-wide (a few MB of weights)
+TINY_VISION = dict(hidden_size=64, intermediate_size=256, num_hidden_layers=2,
+                   num_attention_heads=4, image_size=96, patch_size=16)
+TINY_TEXT = dict(hidden_size=64, intermediate_size=256, num_hidden_layers=1, num_attention_heads=4,
+                 vocab_size=512, max_position_embeddings=64, pad_token_id=1, bos_token_id=2, eos_token_id=3)
+
+# Approximate skin tones, light to dark (Fitzpatrick I-VI), RGB
+SKIN_TONES = np.array([
+    [241, 214, 196], [229, 189, 160], [204, 160, 120],
+    [170, 120, 85], [120, 80, 55], [75, 50, 35],
+], dtype=np.float32)
+
+
+def build_tiny_siglip(out_dir=None, seed: int = 0, overwrite: bool = False, **vision_overrides) -> Path:
+    """Write a randomly initialized small SigLIP + image processor; returns its directory.
+
+    Reuses an existing directory with the same settings unless overwrite=True.
+
+    Args:
+        out_dir: target directory (default results/benchmarks/tiny_siglip)
+        seed: torch seed for the random weights
+        overwrite: rebuild even if present
+        **vision_overrides: e.g. num_hidden_layers=4, image_size=224
+    """
+    import torch
+    from transformers import SiglipConfig, SiglipImageProcessor, SiglipModel
+
+    out_dir = Path(out_dir or DEFAULT_TINY_DIR)
+    vision = {**TINY_VISION, **vision_overrides}
+    spec = {"vision": vision, "text": TINY_TEXT, "seed": seed}
+    spec_path = out_dir / "tiny_spec.json"
+    if not overwrite and spec_path.exists() and json.loads(spec_path.read_text()) == spec:
+        return out_dir
+
+    torch.manual_seed(seed)
+    config = SiglipConfig(vision_config=vision, text_config=TINY_TEXT)
+    model = SiglipModel(config)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model.save_pretrained(out_dir)
+    size = vision["image_size"]
+    SiglipImageProcessor(size={"height": size, "width": size}).save_pretrained(out_dir)
+    spec_path.write_text(json.dumps(spec, indent=2))
+    return out_dir
+
+
+def synthetic_lesion_array(rng: np.random.Generator, size=(256, 256)) -> np.ndarray:
+    """One lesion-like RGB image as a (H, W, 3) uint8 array."""
+    h, w = size
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+
+    tone = SKIN_TONES[rng.integers(len(SKIN_TONES))]
+    # Uneven illumination (vignetting, as with a dermatoscope)
+    cy, cx = h / 2, w / 2
+    vignette = 1.0 - 0.35 * (((yy - cy) / h) ** 2 + ((xx - cx) / w) ** 2) * 4
+    img = tone[None, None, :] * vignette[..., None]
+
+    # Irregular blob: ellipse radius modulated by a few angular harmonics
+    ly, lx = cy + rng.normal(0, h * 0.08), cx + rng.normal(0, w * 0.08)
+    radius = min(h, w) * rng.uniform(0.15, 0.32)
+    angle = np.arctan2(yy - ly, xx - lx)
+    border = radius * (1 + sum(rng.uniform(0, 0.12) * np.sin(k * angle + rng.uniform(0, 2 * np.pi))
+                               for k in range(2, 7)))
+    dist = np.hypot((yy - ly) * rng.uniform(0.8, 1.2), xx - lx)
+    mask = np.clip((border - dist) / (0.08 * radius), 0, 1)
+
+    # Variegated pigment: darker centre, 2-3 color blotches
+    pigment = np.array([90, 55, 40], dtype=np.float32) * rng.uniform(0.4, 1.0)
+    lesion = np.broadcast_to(pigment, img.shape).copy()
+    for _ in range(rng.integers(2, 4)):
+        by, bx = ly + rng.normal(0, radius * 0.4), lx + rng.normal(0, radius * 0.4)
+        blotch = np.exp(-((yy - by) ** 2 + (xx - bx) ** 2) / (2 * (radius * rng.uniform(0.15, 0.4)) ** 2))
+        lesion += blotch[..., None] * rng.uniform(-40, 40, size=3).astype(np.float32)
+    img = img * (1 - mask[..., None]) + lesion * mask[..., None]
+
+    # A few hair-like dark strokes
+    for _ in range(rng.integers(0, 6)):
+        x0, y0 = rng.uniform(0, w), rng.uniform(0, h)
+        theta = rng.uniform(0, np.pi)
+        d = np.abs((xx - x0) * np.sin(theta) - (yy - y0) * np.cos(theta))
+        img *= 1 - 0.6 * np.exp(-(d ** 2) / 1.5)[..., None]
+
+    img += rng.normal(0, 4, size=img.shape)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def synthetic_lesion_images(n: int, size=(256, 256), seed: int = 0) -> list:
+    """n lesion-like PIL images."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    return [Image.fromarray(synthetic_lesion_array(rng, size)) for _ in range(n)]
+
+
+def write_synthetic_images(out_dir, n: int, size=(256, 256), seed: int = 0, quality: int = 90) -> list:
+    """Write n synthetic lesions as JPEGs (reused when already present); returns paths."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(n):
+        path = out_dir / f"lesion_{seed}_{size[0]}x{size[1]}_{i:05d}.jpg"
+        arr = synthetic_lesion_array(rng, size)  # always drawn, so image i is the same either way
+        if not path.exists():
+            from PIL import Image
+            Image.fromarray(arr).save(path, quality=quality)
+        paths.append(str(path))
+    return paths
+
+
+def synthetic_labels_and_groups(n: int, seed: int = 0):
+    """Binary labels, a correlated malignancy score and demographic groups.
+
+    Returns:
+        (labels, proba, groups) where proba is (n, 2) and groups maps
+        fitzpatrick / domain to per-sample values, as get_demographic_groups does
+    """
+    rng = np.random.default_rng(seed)
+    labels = (rng.random(n) < 0.3).astype(int)
+    score = np.clip(rng.normal(0.3 + 0.35 * labels, 0.2), 0, 1)
+    proba = np.stack([1 - score, score], axis=1)
+    groups = {
+        "fitzpatrick": rng.integers(1, 7, n).astype(str),
+        "domain": rng.choice(["dermoscopic", "clinical", "smartphone"], n),
+    }
+    return labels, proba, groups
+
+
+def build_tiny_serving_cache(cache_dir=None, seed: int = 0, **vision_overrides):
+    """Tiny SigLIP plus a fitted logistic head laid out like results/cache.
+
+    The app serves it with SKINTAG_CACHE_DIR=<cache_dir> and
+    SKINTAG_EMBEDDING_MODEL=<model_dir>.
+
+    Returns:
+        (cache_dir, model_dir)
+    """
+    import pickle
+
+    from src.model.classifier import SklearnClassifier
+
+    cache_dir = Path(cache_dir or DEFAULT_TINY_DIR.parent / "tiny_cache")
+    model_dir = build_tiny_siglip(cache_dir / "tiny_siglip", seed=seed, **vision_overrides)
+    head_path = cache_dir / "classifier.pkl"
+    if not head_path.exists() or head_path.stat().st_mtime < (model_dir / "tiny_spec.json").stat().st_mtime:
+        dim = json.loads((model_dir / "tiny_spec.json").read_text())["vision"]["hidden_size"]
+        rng = np.random.default_rng(seed)
+        X = rng.normal(size=(400, dim)).astype(np.float32)
+        head = SklearnClassifier("logistic").fit(X, (X[:, 0] > 0).astype(int))
+        with open(head_path, "wb") as f:
+            pickle.dump(head, f)
+    return cache_dir, model_dir
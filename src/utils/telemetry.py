@@ -0,0 +1,218 @@
+"""Pre-aggregated serving metrics in the Prometheus text format.
+
+Counters, gauges and histograms keep one shard per thread: a request thread
+only ever writes its own shard (a plain dict, no lock on the hot path), and a
+scrape sums the shards. Recording a histogram sample is a bisect and two
+additions, so instrumenting every request costs microseconds and nothing is
+logged per request.
+
+Model code marks its phases with stage("preprocess") etc.; those are free
+(one global read) until a server installs an observer with
+set_stage_observer(), which app/main.py does to feed its stage histogram.
+
+    registry = MetricsRegistry()
+    latency = registry.histogram("skintag_stage_seconds", "Stage latency", ["stage"])
+    latency.observe(0.012, "decode")
+    registry.render()   # text for GET /metrics
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; covers sub-millisecond decodes up to slow CPU forwards
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_stage_observer = None
+
+
+def set_stage_observer(observer):
+    """Install observer(stage_name, seconds) for stage() blocks (None disables)."""
+    global _stage_observer
+    _stage_observer = observer
+
+
+class stage:
+    """Time a block and report it to the stage observer, if one is installed."""
+
+    __slots__ = ("name", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._start = None
+
+    def __enter__(self):
+        if _stage_observer is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._start is not None and _stage_observer is not None:
+            _stage_observer(self.name, time.perf_counter() - self._start)
+        return False
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Shared shard bookkeeping: one dict per writing thread."""
+
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()  # only taken when a thread writes for the first time
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self) -> list:
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]  # dict.copy() is atomic under the GIL
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label combination."""
+
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def values(self) -> dict:
+        totals = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self) -> list:
+        lines = self._header()
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Up/down value (e.g. in-flight requests); inc and dec may come from different threads."""
+
+    kind = "gauge"
+
+    def dec(self, *labelvalues, amount: float = 1):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class CallbackGauge(_Metric):
+    """Gauge computed at scrape time, e.g. process RSS."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn):
+        super().__init__(name, help_text)
+        self.fn = fn
+
+    def render(self) -> list:
+        value = self.fn()
+        if value is None:
+            return []
+        return self._header() + [f"{self.name} {_number(value)}"]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket latency histogram per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        shard = self._shard()
+        entry = shard.get(labelvalues)
+        if entry is None:
+            entry = shard[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def values(self) -> dict:
+        """{labelvalues: (per-bucket counts incl. +Inf, sum)}, not cumulative."""
+        totals = {}
+        for shard in self._snapshots():
+            for key, (counts, total) in shard.items():
+                if key not in totals:
+                    totals[key] = ([0] * len(counts), 0.0)
+                merged, merged_sum = totals[key]
+                totals[key] = ([a + b for a, b in zip(merged, counts)], merged_sum + total)
+        return totals
+
+    def render(self) -> list:
+        lines = self._header()
+        for key, (counts, total) in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them for a /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()) -> Gauge:
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def callback_gauge(self, name, help_text, fn) -> CallbackGauge:
+        return self._add(CallbackGauge(name, help_text, fn))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"